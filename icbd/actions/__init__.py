@@ -59,27 +59,64 @@ class Injected(di.Injected):
     def resolve(self, T):
         return di.default_container.resolve(T)
 
-def cache():
-    m = {}
+    async def is_admin(self, nick):
+        return await self.nickdb_connection.run(lambda scope: self.nickdb.exists(scope, nick) and self.nickdb.is_admin(scope, nick),
+                                                readonly=True)
 
-    return lambda T: m.get(T, T())
+    def write_behind(self, connection, fn):
+        future = connection.submit(fn)
+
+        future.add_done_callback(self.__write_behind_done__)
+
+    def __write_behind_done__(self, future):
+        ex = future.exception()
+
+        if ex:
+            self.log.warning("Deferred database write failed: %s", ex)
+
+def cache(container=di.default_container):
+    def resolve(T):
+        if not container.registered(T):
+            container.register_factory(T, T, lifetime=di.Lifetime.SINGLETON)
+
+        return container.resolve(T)
+
+    return resolve
 
 class UserStatus(di.Injected):
     def inject(self, nickdb_connection: nickdb.Connection, nickdb: nickdb.NickDb):
         self.nickdb_connection = nickdb_connection
         self.nickdb = nickdb
 
-    def get_flags(self, state, scope=None):
+    async def get_flags(self, state):
+        flags = await self.get_flags_bulk([state])
+
+        return flags[0]
+
+    async def get_flags_bulk(self, states):
+        records = {}
+
+        nicks = [state.nick.lower() if state.authenticated else None for state in states]
+
+        registered = [nick for nick in nicks if nick]
+
+        if registered:
+            records = await self.nickdb_connection.run(lambda scope: self.nickdb.load_many(scope, registered), readonly=True)
+
+        return [self.__flags__(state, records.get(nick)) for state, nick in zip(states, nicks)]
+
+    @staticmethod
+    def __flags__(state, record):
         flags = []
 
-        if state.authenticated:
+        if state.authenticated and record:
             flags.append("r")
 
-            if scope:
-                flags.extend(self.__lookup_flags__(scope, state.nick))
-            else:
-                with self.nickdb_connection.enter_scope() as scope:
-                    flags.extend(self.__lookup_flags__(scope, state.nick))
+            if record.admin:
+                flags.append("a")
+
+            if not record.details.real_name:
+                flags.append("nr")
         else:
             flags.append("nr")
 
@@ -91,17 +128,4 @@ class UserStatus(di.Injected):
 
         return flags
 
-    def __lookup_flags__(self, scope, nick):
-        flags = []
-
-        user = self.nickdb.lookup(scope, nick)
-
-        if self.nickdb.is_admin(scope, nick):
-            flags.append("a")
-
-        if not user.real_name:
-            flags.append("nr")
-
-        return flags
-
 ACTION = cache()
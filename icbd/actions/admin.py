@@ -23,6 +23,7 @@
     ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
     OTHER DEALINGS IN THE SOFTWARE.
 """
+import inspect
 from actions import Injected
 import ltd
 from core import Verbosity
@@ -30,14 +31,20 @@ import validate
 import log
 import shutdown
 import ipfilter
+import metrics
 import dateutils
 from exception import LtdErrorException, LtdStatusException
 
 def isadmin(fn):
-    def wrapper(*args, **kwds):
-        args[0].__test_admin__(args[1])
+    async def wrapper(*args, **kwds):
+        await args[0].__test_admin__(args[1])
 
-        return fn(*args, **kwds)
+        result = fn(*args, **kwds)
+
+        if inspect.isawaitable(result):
+            result = await result
+
+        return result
 
     return wrapper
 
@@ -49,6 +56,7 @@ class Admin(Injected):
         self.__shutdown = self.resolve(shutdown.Shutdown)
         self.__ipfilter_connection = self.resolve(ipfilter.Connection)
         self.__ipfilters = self.resolve(ipfilter.Storage)
+        self.__metrics = self.resolve(metrics.Metrics)
 
     @isadmin
     def get_reputation(self, session_id, nick, msgid=""):
@@ -93,57 +101,90 @@ class Admin(Injected):
 
         self.broker.deliver(session_id, ltd.encode_co_output("The log level is %d." % verbosity.value, msgid))
 
+    @isadmin
+    def metrics(self, session_id, msgid=""):
+        self.broker.deliver(session_id, ltd.encode_co_output("Messages received:", msgid))
+
+        for type_id, (count, size) in self.__metrics.messages:
+            self.broker.deliver(session_id, ltd.encode_co_output("  %s: %d (%d bytes)" % (type_id, count, size), msgid))
+
+        self.broker.deliver(session_id, ltd.encode_co_output("Handler latency (p50/p99):", msgid))
+
+        for (type_id, command), histogram in self.__metrics.handlers:
+            self.broker.deliver(session_id,
+                                ltd.encode_co_output("  %s%s: %.2f/%.2f ms (%d)"
+                                                     % (type_id,
+                                                        "/" + command if command else "",
+                                                        histogram.quantile(0.5) * 1000.0,
+                                                        histogram.quantile(0.99) * 1000.0,
+                                                        histogram.count),
+                                                     msgid))
+
+        fanouts = self.__metrics.fanouts
+
+        self.broker.deliver(session_id,
+                            ltd.encode_co_output("Fan-out (p50/p99): %d/%d receivers (%d messages, %.1f avg)"
+                                                 % (fanouts.quantile(0.5),
+                                                    fanouts.quantile(0.99),
+                                                    fanouts.count,
+                                                    fanouts.sum / fanouts.count if fanouts.count else 0.0),
+                                                 msgid))
+
+        for label, histogram in (("Database scopes", self.__metrics.db_scopes), ("Loop lag", self.__metrics.loop_lags)):
+            self.broker.deliver(session_id,
+                                ltd.encode_co_output("%s (p50/p99): %.2f/%.2f ms (%d)"
+                                                     % (label,
+                                                        histogram.quantile(0.5) * 1000.0,
+                                                        histogram.quantile(0.99) * 1000.0,
+                                                        histogram.count),
+                                                     msgid))
+
     @isadmin
     def drop(self, session_id, nicks):
         state = self.session.get(session_id)
 
-        with self.statsdb_connection.enter_scope() as scope:
-            for nick in nicks:
-                victim_id = self.session.find_nick(nick)
-
-                if victim_id:
-                    self.broker.deliver(session_id, ltd.encode_status_msg("Drop", "You have dropped %s." % nick))
-                    self.broker.deliver(victim_id, ltd.encode_status_msg("Drop", "You have been disconnected by %s." % state.nick))
-                    self.broker.deliver(victim_id, ltd.encode_empty_cmd("g"))
+        for nick in nicks:
+            victim_id = self.session.find_nick(nick)
 
-                    self.statsdb.add_drop(scope)
-                else:
-                    self.broker.deliver(session_id, ltd.encode_str("e", "%s not found." % nick))
+            if victim_id:
+                self.broker.deliver(session_id, ltd.encode_status_msg("Drop", "You have dropped %s." % nick))
+                self.broker.deliver(victim_id, ltd.encode_status_msg("Drop", "You have been disconnected by %s." % state.nick))
+                self.broker.deliver(victim_id, ltd.encode_empty_cmd("g"))
 
-                scope.complete()
+                self.write_behind(self.statsdb_connection, lambda scope: self.statsdb.add_drop(scope))
+            else:
+                self.broker.deliver(session_id, ltd.encode_str("e", "%s not found." % nick))
 
-    def change_password(self, session_id, nick, password):
+    async def change_password(self, session_id, nick, password):
         state = self.session.get(session_id)
 
         if state.nick.lower() == nick.lower():
             if not state.authenticated:
                 raise LtdErrorException("You must be registered to change your password.")
         else:
-            self.__test_admin__(session_id)
+            await self.__test_admin__(session_id)
 
         self.log.debug("Changing password of user %s." % nick)
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if not self.nickdb.exists(scope, nick):
-                raise LtdErrorException("%s not found." % nick)
+        await self.nickdb_connection.run(lambda scope: self.__set_password__(scope, nick, password))
 
-            self.log.debug("Nick found, changing password.")
+        self.broker.deliver(session_id, ltd.encode_status_msg("Pass", "Password changed."))
 
-            if not validate.is_valid_password(password):
-                raise LtdStatusException("Password",
-                                         "Password format not valid. Password length must be between %d and %d characters."
-                                         % (validate.PASSWORD_MIN, validate.PASSWORD_MAX))
+    def __set_password__(self, scope, nick, password):
+        if not self.nickdb.exists(scope, nick):
+            raise LtdErrorException("%s not found." % nick)
 
-            self.nickdb.set_password(scope, nick, password)
+        self.log.debug("Nick found, changing password.")
 
-            self.broker.deliver(session_id, ltd.encode_status_msg("Pass", "Password changed."))
+        if not validate.is_valid_password(password):
+            raise LtdStatusException("Password",
+                                     "Password format not valid. Password length must be between %d and %d characters."
+                                     % (validate.PASSWORD_MIN, validate.PASSWORD_MAX))
 
-            scope.complete()
+        self.nickdb.set_password(scope, nick, password)
 
     @isadmin
     def shutdown(self, session_id, delay, restart):
-        self.__test_admin__(session_id)
-
         msg = "Server %s in %s." % ("restarting" if restart else "shutting down", dateutils.elapsed_time(delay))
 
         if restart:
@@ -160,8 +201,6 @@ class Admin(Injected):
 
     @isadmin
     def cancel_shutdown(self, session_id):
-        self.__test_admin__(session_id)
-
         self.__shutdown.cancel()
 
         e = ltd.Encoder("f")
@@ -172,7 +211,7 @@ class Admin(Injected):
         self.broker.broadcast(e.encode())
 
     @isadmin
-    def ipfilter(self, session_id, fields):
+    async def ipfilter(self, session_id, fields):
         action, argv = fields[0], fields[1:]
 
         fn = None
@@ -190,9 +229,9 @@ class Admin(Injected):
         else:
             raise LtdErrorException("Unsupported action.")
 
-        fn(session_id, argv)
+        await fn(session_id, argv)
 
-    def __deny_login__(self, session_id, argv):
+    async def __deny_login__(self, session_id, argv):
         usage = "Usage: ipfilter deny {filter} {seconds}"
 
         if not argv or len(argv) > 2:
@@ -216,19 +255,16 @@ class Admin(Injected):
         except:
             raise LtdErrorException(usage)
 
-        with self.__ipfilter_connection.enter_scope() as scope:
-            self.__ipfilters.deny(scope, filter, ttl)
+        await self.__ipfilter_connection.run(lambda scope: self.__ipfilters.deny(scope, filter, ttl))
 
-            lifetime = "forever"
+        lifetime = "forever"
 
-            if ttl > -1:
-                lifetime = dateutils.elapsed_time(ttl)
+        if ttl > -1:
+            lifetime = dateutils.elapsed_time(ttl)
 
-            self.broker.deliver(session_id, ltd.encode_status_msg("IP-Filter", "%s denied (%s)." % (argv[0], lifetime)))
+        self.broker.deliver(session_id, ltd.encode_status_msg("IP-Filter", "%s denied (%s)." % (argv[0], lifetime)))
 
-            scope.complete()
-
-    def __drop_ip_filter__(self, session_id, argv):
+    async def __drop_ip_filter__(self, session_id, argv):
         if len(argv) != 1:
             raise LtdErrorException("Usage: ipfilter drop {filter}")
 
@@ -239,42 +275,38 @@ class Admin(Injected):
         except:
             raise LtdErrorException("Filter is malformed.")
 
-        with self.__ipfilter_connection.enter_scope() as scope:
-            if not self.__ipfilters.deny_filter_exists(scope, filter.expression):
-                raise LtdErrorException("Filter not found.")
+        await self.__ipfilter_connection.run(lambda scope: self.__remove_ip_filter__(scope, filter.expression))
 
-            self.__ipfilters.remove(scope, filter.expression)
+        self.broker.deliver(session_id, ltd.encode_status_msg("IP-Filter", "%s dropped." % (argv[0],)))
 
-            self.broker.deliver(session_id, ltd.encode_status_msg("IP-Filter", "%s dropped." % (argv[0],)))
+    def __remove_ip_filter__(self, scope, expression):
+        if not self.__ipfilters.deny_filter_exists(scope, expression):
+            raise LtdErrorException("Filter not found.")
 
-            scope.complete()
+        self.__ipfilters.remove(scope, expression)
 
-    def __flush_ip_filters__(self, session_id, argv):
+    async def __flush_ip_filters__(self, session_id, argv):
         if argv:
             raise LtdErrorException("Usage: ipfilter flush")
 
-        with self.__ipfilter_connection.enter_scope() as scope:
-            self.__ipfilters.flush(scope)
-
-            scope.complete()
+        await self.__ipfilter_connection.run(lambda scope: self.__ipfilters.flush(scope))
 
         self.broker.deliver(session_id, ltd.encode_status_msg("IP-Filter", "Flushed."))
 
-    def __show_ip_filters__(self, session_id, argv):
+    async def __show_ip_filters__(self, session_id, argv):
         if argv:
             raise LtdErrorException("Usage: ipfilter show")
 
         filters = []
 
-        with self.__ipfilter_connection.enter_scope() as scope:
-            for f, l in self.__ipfilters.load_deny_filters(scope):
-                lifetime = "forever"
+        for f, l in await self.__ipfilter_connection.run(lambda scope: self.__ipfilters.load_deny_filters(scope)):
+            lifetime = "forever"
 
-                if l > -1:
-                    time_left = max(1, l - dateutils.timestamp())
-                    lifetime = dateutils.elapsed_time(time_left)
+            if l > -1:
+                time_left = max(1, l - dateutils.timestamp())
+                lifetime = dateutils.elapsed_time(time_left)
 
-                filters.append((f.expression, lifetime))
+            filters.append((f.expression, lifetime))
 
         if filters:
             for entry in sorted(filters, key=lambda e: "@".join(reversed(e[0].split("@", 1))).lower()):
@@ -282,14 +314,15 @@ class Admin(Injected):
         else:
             self.broker.deliver(session_id, ltd.encode_status_msg("IP-Filter", "List is empty."))
 
-    def __test_admin__(self, session_id):
+    async def __test_admin__(self, session_id):
         is_admin = False
 
         state = self.session.get(session_id)
 
         if state.authenticated:
-            with self.nickdb_connection.enter_scope() as scope:
-                is_admin = self.nickdb.is_admin(scope, state.nick)
+            nick = state.nick
+
+            is_admin = await self.nickdb_connection.run(lambda scope: self.nickdb.is_admin(scope, nick), readonly=True)
 
         if not is_admin:
             self.reputation.critical(session_id)
@@ -33,8 +33,8 @@ import group
 from exception import LtdErrorException
 
 class Group(Injected):
-    def set_topic(self, session_id, topic):
-        info = self.__get_group_if_can_moderate__(session_id, allow_public=True)
+    async def set_topic(self, session_id, topic):
+        info = await self.__get_group_if_can_moderate__(session_id, allow_public=True)
 
         if not validate.is_valid_topic(topic):
             raise LtdErrorException("Topic must consist of at least %d and at most %d characters."
@@ -57,9 +57,13 @@ class Group(Injected):
         else:
             self.broker.deliver(session_id, ltd.encode_co_output("The topic is not set.", msgid))
 
-    def change_status(self, session_id, opts):
+    async def change_status(self, session_id, opts):
+        info = await self.__get_group_if_can_moderate__(session_id)
+
+        self.apply_status(session_id, info, opts)
+
+    def apply_status(self, session_id, info, opts):
         state = self.session.get(session_id)
-        info = self.__get_group_if_can_moderate__(session_id)
 
         opt = None
         arg_required = False
@@ -277,11 +281,17 @@ class Group(Injected):
             for part in parts[1:]:
                 self.broker.deliver(session_id, ltd.encode_co_output("%s%s" % (" " * len(prefix), part), msgid))
 
-    def invite(self, session_id, invitee, mode="n", quiet=None, registered=None):
+    async def invite(self, session_id, invitee, mode="n", quiet=None, registered=None):
         quiet = bool(quiet)
         registered = bool(registered)
 
-        info = self.__get_group_if_can_moderate__(session_id)
+        info = await self.__get_group_if_can_moderate__(session_id)
+
+        if mode == "n" and registered:
+            if not await self.nickdb_connection.run(lambda scope: self.nickdb.exists(scope, invitee), readonly=True):
+                raise LtdErrorException("User not found.")
+
+            info = self.__get_group__(session_id)
 
         if not info.control == group.Control.RESTRICTED:
             raise LtdErrorException("The group isn't restricted.")
@@ -291,11 +301,6 @@ class Group(Injected):
 
         try:
             if mode == "n":
-                if registered:
-                    with self.nickdb_connection.enter_scope() as scope:
-                        if not self.nickdb.exists(scope, invitee):
-                            raise LtdErrorException("User not found.")
-
                 loggedin_session = self.session.find_nick(invitee)
 
                 if not registered and not loggedin_session:
@@ -323,10 +328,10 @@ class Group(Injected):
 
         self.groups.update(info)
 
-    def cancel(self, session_id, invitee, mode="n", quiet=None):
+    async def cancel(self, session_id, invitee, mode="n", quiet=None):
         quiet = bool(quiet)
 
-        info = self.__get_group_if_can_moderate__(session_id)
+        info = await self.__get_group_if_can_moderate__(session_id)
 
         if not info.control == group.Control.RESTRICTED:
             raise LtdErrorException("The group isn't restricted.")
@@ -352,12 +357,18 @@ class Group(Injected):
 
         self.groups.update(info)
 
-    def talk(self, session_id, talker, mode="n", delete=None, quiet=None, registered=None):
+    async def talk(self, session_id, talker, mode="n", delete=None, quiet=None, registered=None):
         quiet = bool(quiet)
         delete = bool(delete)
         registered = bool(registered)
 
-        info = self.__get_group_if_can_moderate__(session_id)
+        info = await self.__get_group_if_can_moderate__(session_id)
+
+        if not delete and mode == "n" and registered:
+            if not await self.nickdb_connection.run(lambda scope: self.nickdb.exists(scope, talker), readonly=True):
+                raise LtdErrorException("User not found.")
+
+            info = self.__get_group__(session_id)
 
         if not info.control == group.Control.CONTROLLED:
             raise LtdErrorException("The group isn't controlled.")
@@ -386,11 +397,6 @@ class Group(Injected):
                 loggedin_session = None
 
                 if mode == "n":
-                    if registered:
-                        with self.nickdb_connection.enter_scope() as scope:
-                            if not self.nickdb.exists(scope, talker):
-                                raise LtdErrorException("User not found.")
-
                     loggedin_session = self.session.find_nick(talker)
 
                     if not registered and not loggedin_session:
@@ -419,31 +425,25 @@ class Group(Injected):
 
         self.groups.update(info)
 
-    def boot(self, session_id, nick):
-        info = self.__get_group_if_can_moderate__(session_id)
-
-        loggedin_session = self.session.find_nick(nick)
+    async def boot(self, session_id, nick):
+        info = await self.__get_group_if_can_moderate__(session_id)
 
-        if loggedin_session == session_id:
-            raise LtdErrorException("You cannot boot yourself.")
+        loggedin_session, loggedin_state = self.__find_boot_target__(session_id, nick)
 
-        if not loggedin_session:
-            raise LtdErrorException("%s is not signed on." % nick)
+        if loggedin_state.authenticated:
+            if await self.is_admin(loggedin_state.nick):
+                state = self.session.get(session_id)
 
-        state = self.session.get(session_id)
-        loggedin_state = self.session.get(loggedin_session)
+                self.broker.deliver(loggedin_session, ltd.encode_status_msg("Boot", "%s tried to boot you." % state.nick))
 
-        if loggedin_state.group.lower() != state.group.lower():
-            raise LtdErrorException("%s is not in your group." % nick)
+                self.reputation.fatal(session_id)
 
-        if loggedin_state.authenticated:
-            with self.nickdb_connection.enter_scope() as scope:
-                if self.nickdb.is_admin(scope, state.nick):
-                    self.broker.deliver(loggedin_session, ltd.encode_status_msg("Boot", "%s tried to boot you." % state.nick))
+                raise LtdErrorException("You cannot boot an admin.")
 
-                    self.reputation.fatal(session_id)
+            info = self.__get_group__(session_id)
+            loggedin_session, loggedin_state = self.__find_boot_target__(session_id, nick)
 
-                    raise LtdErrorException("You cannot boot an admin.")
+        state = self.session.get(session_id)
 
         try:
             info.cancel_nick(loggedin_state.nick)
@@ -457,18 +457,34 @@ class Group(Injected):
             self.broker.deliver(session_id, ltd.encode_status_msg("FYI", "%s removed from talker list." % nick))
         except KeyError: pass
 
+        self.groups.update(info)
+
         self.broker.to_channel(info.key, ltd.encode_status_msg("Boot", "%s was booted." % nick))
         self.broker.deliver(loggedin_session, ltd.encode_status_msg("Boot", "%s booted you." % state.nick))
 
-        ACTION(actions.usersession.UserSession).join(loggedin_session, core.BOOT_GROUP)
+        ACTION(actions.usersession.UserSession).enter_group(loggedin_session, core.BOOT_GROUP)
+
+        self.write_behind(self.statsdb_connection, lambda scope: self.statsdb.add_boot(scope))
+
+    def __find_boot_target__(self, session_id, nick):
+        loggedin_session = self.session.find_nick(nick)
 
-        with self.statsdb_connection.enter_scope() as scope:
-            self.statsdb.add_boot(scope)
+        if loggedin_session == session_id:
+            raise LtdErrorException("You cannot boot yourself.")
 
-            scope.complete()
+        if not loggedin_session:
+            raise LtdErrorException("%s is not signed on." % nick)
 
-    def pass_over(self, session_id, nick):
-        info = self.__get_group_if_can_moderate__(session_id)
+        state = self.session.get(session_id)
+        loggedin_state = self.session.get(loggedin_session)
+
+        if loggedin_state.group.lower() != state.group.lower():
+            raise LtdErrorException("%s is not in your group." % nick)
+
+        return loggedin_session, loggedin_state
+
+    async def pass_over(self, session_id, nick):
+        info = await self.__get_group_if_can_moderate__(session_id)
 
         loggedin_session = self.session.find_nick(nick)
 
@@ -498,8 +514,8 @@ class Group(Injected):
                                                                    "%s has passed moderation to %s."
                                                                    % (state.nick, loggedin_state.nick)))
 
-    def relinquish(self, session_id):
-        info = self.__get_group_if_can_moderate__(session_id)
+    async def relinquish(self, session_id):
+        info = await self.__get_group_if_can_moderate__(session_id)
 
         info.moderator = None
 
@@ -523,13 +539,10 @@ class Group(Injected):
 
         return self.groups.get(state.group)
 
-    def __get_group_if_can_moderate__(self, session_id, allow_public=False):
+    async def __get_group_if_can_moderate__(self, session_id, allow_public=False):
         info = self.__get_group__(session_id)
 
-        if self.__is_protected_group__(info.key):
-            self.reputation.critical(session_id)
-
-            raise LtdErrorException("You aren't the moderator.")
+        self.__test_protected_group__(session_id, info)
 
         if not (allow_public and info.control == group.Control.PUBLIC):
             if info.moderator:
@@ -538,16 +551,25 @@ class Group(Injected):
                 if info.moderator != session_id:
                     self.log.debug("User isn't moderator, testing administrative privileges.")
 
-                    with self.nickdb_connection.enter_scope() as scope:
-                        state = self.session.get(session_id)
+                    state = self.session.get(session_id)
+
+                    if not await self.is_admin(state.nick):
+                        self.reputation.critical(session_id)
 
-                        if not self.nickdb.exists(scope, state.nick) or not self.nickdb.is_admin(scope, state.nick):
-                            self.reputation.critical(session_id)
+                        raise LtdErrorException("You aren't the moderator.")
 
-                            raise LtdErrorException("You aren't the moderator.")
+                    info = self.__get_group__(session_id)
+
+                    self.__test_protected_group__(session_id, info)
 
         return info
 
+    def __test_protected_group__(self, session_id, info):
+        if self.__is_protected_group__(info.key):
+            self.reputation.critical(session_id)
+
+            raise LtdErrorException("You aren't the moderator.")
+
     @staticmethod
     def __is_protected_group__(name):
         return name.lower() in [p.lower() for p in [core.DEFAULT_GROUP, core.IDLE_GROUP, core.BOOT_GROUP]]
@@ -69,29 +69,30 @@ class Info(Injected):
 
         self.broker.deliver(session_id, ltd.encode_co_output("-" * 64, msgid))
 
-    def stats(self, session_id, timeframe="s", msgid=""):
-        nickserv_id = self.session.find_nick(core.NICKSERV)
-        nickserv_state = self.session.get(nickserv_id)
-
-        stats = None
+    async def stats(self, session_id, timeframe="s", msgid=""):
+        query = None
         description = None
 
-        with self.statsdb_connection.enter_scope() as scope:
-            if timeframe == "s":
-                stats = self.statsdb.start(scope)
-                description = "since start"
-            elif timeframe == "t":
-                stats = self.statsdb.today(scope)
-                description = "today"
-            elif timeframe == "m":
-                stats = self.statsdb.month(scope)
-                description = "this month"
-            elif timeframe == "y":
-                stats = self.statsdb.year(scope)
-                description = "this year"
-            elif timeframe == "a":
-                stats = self.statsdb.all(scope)
-                description = "overall"
+        if timeframe == "s":
+            query = self.statsdb.start
+            description = "since start"
+        elif timeframe == "t":
+            query = self.statsdb.today
+            description = "today"
+        elif timeframe == "m":
+            query = self.statsdb.month
+            description = "this month"
+        elif timeframe == "y":
+            query = self.statsdb.year
+            description = "this year"
+        elif timeframe == "a":
+            query = self.statsdb.all
+            description = "overall"
+
+        stats = await self.statsdb_connection.run(query, readonly=True)
+
+        nickserv_id = self.session.find_nick(core.NICKSERV)
+        nickserv_state = self.session.get(nickserv_id)
 
         users_n = self.session.count_logins()
         groups_n = len(self.groups)
@@ -24,62 +24,85 @@
     OTHER DEALINGS IN THE SOFTWARE.
 """
 from textwrap import wrap
-from actions import Injected, UserStatus
+from actions import Injected, ACTION, UserStatus
 import group
 import ltd
 import core
 from exception import LtdErrorException
 
 class List(Injected):
-    def list_and_quit(self, session_id, msgid=""):
-        self.list(session_id, msgid)
+    def __init__(self):
+        super().__init__()
 
-        self.broker.deliver(session_id, ltd.encode_empty_cmd("g"))
+        self.__rows = {}
 
-    def list(self, session_id, msgid=""):
-        is_admin = False
+    async def list_and_quit(self, session_id, msgid=""):
+        await self.list(session_id, msgid)
+
+        self.broker.deliver(session_id, ltd.encode_empty_cmd("g"))
 
+    async def list(self, session_id, msgid=""):
         state = self.session.get(session_id)
 
-        if state.authenticated:
-            with self.nickdb_connection.enter_scope() as scope:
-                is_admin = self.nickdb.is_admin(scope, state.nick)
+        is_admin = await self.__is_admin__(state)
+
+        status_flags = await self.__status_flags__(self.groups.get_groups())
 
         logins = self.session.get_nicks()
 
         available_groups = self.groups.get_groups()
 
+        for key in self.__rows.keys() - set(info.key for info in available_groups):
+            del self.__rows[key]
+
         if available_groups:
             for info in available_groups[:-1]:
-                if self.__show_group__(session_id, state, info, logins, is_admin, False, msgid):
+                if self.__show_group__(session_id, state, info, logins, status_flags, is_admin, False, msgid):
                     self.broker.deliver(session_id, ltd.encode_co_output("", msgid))
 
-            self.__show_group__(session_id, state, available_groups[-1], logins, is_admin, False, msgid)
+            self.__show_group__(session_id, state, available_groups[-1], logins, status_flags, is_admin, False, msgid)
 
         self.__show_summary__(session_id, logins, available_groups, msgid)
 
-    def list_group(self, session_id, group_name, msgid=""):
-        is_admin = False
-
+    async def list_group(self, session_id, group_name, msgid=""):
         state = self.session.get(session_id)
 
         if group_name == ".":
             group_name = state.group
 
+        is_admin = await self.__is_admin__(state)
+
+        status_flags = await self.__status_flags__([self.groups.get(group_name)])
+
         if not self.groups.exists(group_name):
             raise LtdErrorException("Group %s not found." % group_name)
 
+        info = self.groups.get(group_name)
+
+        logins = self.session.get_nicks()
+
+        self.__show_group__(session_id, state, info, logins, status_flags, is_admin, True, msgid)
+
+    async def __is_admin__(self, state):
+        is_admin = False
+
         if state.authenticated:
-            with self.nickdb_connection.enter_scope() as scope:
-                is_admin = self.nickdb.is_admin(scope, state.nick)
+            nick = state.nick
 
-        info = self.groups.get(group_name)
+            is_admin = await self.nickdb_connection.run(lambda scope: self.nickdb.is_admin(scope, nick), readonly=True)
+
+        return is_admin
 
+    async def __status_flags__(self, groups):
         logins = self.session.get_nicks()
 
-        self.__show_group__(session_id, state, info, logins, is_admin, True, msgid)
+        sub_ids = [sub_id for info in groups for _, sub_id in self.session.get_roster(info.key)]
 
-    def __show_group__(self, session_id, state, info, logins, is_admin, ignore_visibility, msgid):
+        status_flags = await ACTION(UserStatus).get_flags_bulk([logins[sub_id] for sub_id in sub_ids])
+
+        return dict(zip(sub_ids, status_flags))
+
+    def __show_group__(self, session_id, state, info, logins, status_flags, is_admin, ignore_visibility, msgid):
         show_group = True
         display_name = str(info)
 
@@ -102,34 +125,46 @@ class List(Injected):
             self.broker.deliver(session_id,
                                 ltd.encode_co_output("   Nickname         Idle Sign-On  Account", msgid))
 
-            subscribers = sorted([[sub_id, logins[sub_id]] for sub_id in self.broker.get_subscribers(info.key)],
-                                 key=lambda arg: arg[1].nick.lower())
+            cached_rows = self.__rows.get(info.key, {})
+            rows = {}
 
-            status_util = UserStatus()
+            for _, sub_id in self.session.get_roster(info.key):
+                flags = status_flags.get(sub_id)
 
-            for sub_id, sub_state in subscribers:
-                admin_flag = core.MODERATOR_FLAG if info.moderator == sub_id else " "
+                if flags is None:
+                    continue
+
+                sub_state = logins[sub_id]
 
-                status_flags = status_util.get_flags(sub_state)
+                key = (sub_state.nick, sub_state.signon, sub_state.loginid, sub_state.host)
 
-                status = "(%s)" %  ", ".join(status_flags) if status_flags else ""
+                row = cached_rows.get(sub_id)
 
+                if not row or row[0] != key:
+                    head = ("\1%s\1" % sub_state.nick).encode("UTF-8", "backslashreplace")
+                    tail = "\1".join(("",
+                                       "0",
+                                       str(int(sub_state.signon.timestamp())),
+                                       sub_state.loginid,
+                                       sub_state.host,
+                                       "")).encode("UTF-8", "backslashreplace")
+
+                    row = (key, head, tail)
+
+                rows[sub_id] = row
+
+                admin_flag = core.MODERATOR_FLAG if info.moderator == sub_id else " "
                 idle = int(sub_state.t_recv.elapsed()) if sub_state.t_recv else 0
-                signon = int(sub_state.signon.timestamp())
+                status = "(%s)" % ", ".join(flags) if flags else ""
 
-                e = ltd.Encoder("i")
+                data = b"wl\1" + admin_flag.encode() + row[1] + str(idle).encode() + row[2] + status.encode() + b"\0"
 
-                e.add_field_str("wl", append_null=False)
-                e.add_field_str(admin_flag, append_null=False)
-                e.add_field_str(sub_state.nick, append_null=False)
-                e.add_field_str(str(idle), append_null=False)
-                e.add_field_str("0", append_null=False)
-                e.add_field_str(str(signon), append_null=False)
-                e.add_field_str(sub_state.loginid, append_null=False)
-                e.add_field_str(sub_state.host, append_null=False)
-                e.add_field_str(status, append_null=True)
+                if len(data) >= 255:
+                    raise OverflowError
 
-                self.broker.deliver(session_id, e.encode())
+                self.broker.deliver(session_id, ltd.Frame(bytes((len(data) + 1, ord("i"))) + data, "i"))
+
+            self.__rows[info.key] = rows
 
         return show_group
 
@@ -144,14 +179,10 @@ class List(Injected):
                             ltd.encode_co_output("Total: %d user%s in %d group%s." % (logins_n, logins_suffix, groups_n, groups_suffix),
                                                  msgid))
 
-    def shortlist(self, session_id, with_members=False, msgid=""):
-        is_admin = False
-
+    async def shortlist(self, session_id, with_members=False, msgid=""):
         state = self.session.get(session_id)
 
-        if state.authenticated:
-            with self.nickdb_connection.enter_scope() as scope:
-                is_admin = self.nickdb.is_admin(scope, state.nick)
+        is_admin = await self.__is_admin__(state)
 
         logins = self.session.get_nicks()
 
@@ -187,8 +218,7 @@ class List(Injected):
                                                      % (display_name, flags, moderator, topic), msgid))
 
             if with_members:
-                subscribers = ", ".join(sorted([logins[sub_id].nick for sub_id in self.broker.get_subscribers(info.key)],
-                                               key=lambda n: n.lower()))
+                subscribers = ", ".join(logins[sub_id].nick for _, sub_id in self.session.get_roster(info.key))
                 lines = wrap(subscribers, 64)
 
                 if lines:
@@ -43,7 +43,7 @@ class MessageBox(Injected):
 
         self.__template = self.resolve(template.Template)
 
-    def send_message(self, session_id, receiver, text):
+    async def send_message(self, session_id, receiver, text):
         state = self.session.get(session_id)
 
         if not state.authenticated:
@@ -56,77 +56,97 @@ class MessageBox(Injected):
             raise LtdErrorException("Message text not valid. Length has to be between %d and %d characters."
                                     % (validate.MESSAGE_MIN, validate.MESSAGE_MAX))
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if not self.nickdb.exists(scope, receiver):
-                raise LtdErrorException("%s is not registered." % receiver)
+        sender = state.nick
 
-            count = self.nickdb.count_messages(scope, receiver) + 1
-            limit = self.nickdb.get_mbox_limit(scope, receiver)
+        count, limit, uuid = await self.nickdb_connection.run(lambda scope: self.__store_message__(scope, receiver, sender, text))
 
-            loggedin_session = self.session.find_nick(receiver)
+        loggedin_session = self.session.find_nick(receiver)
 
-            if count > limit:
-                if loggedin_session and not self.__notification_table.is_alive(loggedin_session, "mbox_full"):
-                    self.broker.deliver(loggedin_session, ltd.encode_str("e", "User mailbox is full."))
-                    self.__notification_table.set_alive(loggedin_session, "mbox_full", self.config.timeouts_mbox_full_message)
+        if count > limit:
+            if loggedin_session and not self.__notification_table.is_alive(loggedin_session, "mbox_full"):
+                self.broker.deliver(loggedin_session, ltd.encode_str("e", "User mailbox is full."))
+                self.__notification_table.set_alive(loggedin_session, "mbox_full", self.config.timeouts_mbox_full_message)
 
-                raise LtdErrorException("User mailbox full.")
+            raise LtdErrorException("User mailbox full.")
 
-            uuid = self.nickdb.add_message(scope, receiver, state.nick, text)
+        self.broker.deliver(session_id, ltd.encode_status_msg("Message", "Message '%s' saved." % uuid))
 
-            self.broker.deliver(session_id, ltd.encode_status_msg("Message", "Message '%s' saved." % uuid))
+        if loggedin_session:
+            self.broker.deliver(session_id, ltd.encode_status_msg("Warning", "%s is logged in now." % receiver))
+            self.broker.deliver(loggedin_session,
+                                ltd.encode_status_msg("Message", "You have %d message%s." % (count, "" if count == 1 else "s")))
 
-            if loggedin_session:
-                self.broker.deliver(session_id, ltd.encode_status_msg("Warning", "%s is logged in now." % receiver))
-                self.broker.deliver(loggedin_session,
-                                    ltd.encode_status_msg("Message", "You have %d message%s." % (count, "" if count == 1 else "s")))
+            if count == limit and not self.__notification_table.is_alive(loggedin_session, "mbox_full"):
+                self.broker.deliver(loggedin_session, ltd.encode_str("e", "User mailbox is full."))
+                self.__notification_table.set_alive(loggedin_session, "mbox_full", self.config.timeouts_mbox_full_message)
 
-                if count == limit and not self.__notification_table.is_alive(loggedin_session, "mbox_full"):
-                    self.broker.deliver(loggedin_session, ltd.encode_str("e", "User mailbox is full."))
-                    self.__notification_table.set_alive(loggedin_session, "mbox_full", self.config.timeouts_mbox_full_message)
+        await self.__forward_message__(sender, receiver, text)
 
-            scope.complete()
+    def __store_message__(self, scope, receiver, sender, text):
+        if not self.nickdb.exists(scope, receiver):
+            raise LtdErrorException("%s is not registered." % receiver)
 
-        self.__forward_message__(state.nick, receiver, text)
+        count = self.nickdb.count_messages(scope, receiver) + 1
+        limit = self.nickdb.get_mbox_limit(scope, receiver)
+        uuid = None
 
-    def __forward_message__(self, sender, receiver, text):
-        email = None
+        if count <= limit:
+            uuid = self.nickdb.add_message(scope, receiver, sender, text)
+
+        return count, limit, uuid
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if self.nickdb.is_email_confirmed(scope, receiver) and self.nickdb.is_message_forwarding_enabled(scope, receiver):
-                email = self.nickdb.lookup(scope, receiver).email
+    async def __forward_message__(self, sender, receiver, text):
+        email = await self.nickdb_connection.run(lambda scope: self.__lookup_forward_address__(scope, receiver), readonly=True)
 
         if email:
-            with self.__mail_sink_connection.enter_scope() as scope:
-                tpl = Template(self.__template.load("forward_message"))
-                body = tpl.substitute(sender=sender, receiver=receiver, text=text)
+            tpl = Template(self.__template.load("forward_message"))
+            body = tpl.substitute(sender=sender, receiver=receiver, text=text)
+
+            await self.__mail_sink_connection.run(lambda scope: self.__mail_sink.put(scope, email, "Message received", body))
+
+    def __lookup_forward_address__(self, scope, receiver):
+        email = None
 
-                self.__mail_sink.put(scope, email, "Message received", body)
+        if self.nickdb.is_email_confirmed(scope, receiver) and self.nickdb.is_message_forwarding_enabled(scope, receiver):
+            email = self.nickdb.lookup(scope, receiver).email
 
-                scope.complete()
+        return email
 
-    def read_messages(self, session_id, msgid=""):
+    async def read_messages(self, session_id, msgid=""):
         state = self.session.get(session_id)
 
         if not state.authenticated:
             raise LtdErrorException("You must be registered to read any messages.")
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if self.nickdb.count_messages(scope, state.nick) == 0:
-                raise LtdErrorException("No messages.")
+        nick = state.nick
+
+        messages = await self.nickdb_connection.run(lambda scope: self.nickdb.get_messages(scope, nick), readonly=True)
+
+        if not messages:
+            raise LtdErrorException("No messages.")
+
+        try:
+            state = self.session.get(session_id)
+        except KeyError:
+            return
+
+        if state.nick != nick or not state.authenticated:
+            return
 
-            for msg in self.nickdb.get_messages(scope, state.nick):
-                self.broker.deliver(session_id, ltd.encode_co_output("Message left at %s (UTC)." % msg.date, msgid))
+        for msg in messages:
+            self.broker.deliver(session_id, ltd.encode_co_output("Message left at %s (UTC)." % msg.date, msgid))
 
-                e = ltd.Encoder("c")
+            e = ltd.Encoder("c")
 
-                e.add_field_str(msg.sender, append_null=False)
-                e.add_field_str(msg.text, append_null=True)
+            e.add_field_str(msg.sender, append_null=False)
+            e.add_field_str(msg.text, append_null=True)
 
-                self.broker.deliver(session_id, e.encode())
+            self.broker.deliver(session_id, e.encode())
 
-                self.nickdb.delete_message(scope, msg.uuid)
+        self.write_behind(self.nickdb_connection, lambda scope: self.__delete_messages__(scope, messages))
 
-            scope.complete()
+        self.__notification_table.remove_entry(session_id, "mbox_full")
 
-            self.__notification_table.remove_entry(session_id, "mbox_full")
+    def __delete_messages__(self, scope, messages):
+        for msg in messages:
+            self.nickdb.delete_message(scope, msg.uuid)
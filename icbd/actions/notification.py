@@ -84,16 +84,14 @@ class Notify(Injected):
         if state.group:
             info = self.groups.get(state.group)
 
-        status_name = "Notify-%s" % ("On" if signed_on else "Off")
+        if info and info.visibility != group.Visibility.INVISIBLE:
+            status_name = "Notify-%s" % ("On" if signed_on else "Off")
 
-        for k, v in self.session:
-            if k != session_id and v.nick != core.NICKSERV and not v.notifylist.empty():
-                hidden = not info or info.visibility == group.Visibility.INVISIBLE
-                same_group = v.group and v.group.lower() == info.key
+            for watchers, name in ((self.session.get_nick_watchers(state.nick), state.nick),
+                                   (self.session.get_site_watchers(state.address), state.address)):
+                for k in list(watchers):
+                    if k != session_id:
+                        v = self.session.get(k)
 
-                if not hidden or same_group:
-                    if v.notifylist.nick_watched(state.nick) and not same_group:
-                        self.broker.deliver(k, ltd.encode_status_msg(status_name, state.nick))
-
-                    if v.notifylist.site_watched(state.address) and not same_group:
-                        self.broker.deliver(k, ltd.encode_status_msg(status_name, state.address))
+                        if v.nick != core.NICKSERV and not (v.group and v.group.lower() == info.key):
+                            self.broker.deliver(k, ltd.encode_status_msg(status_name, name))
@@ -47,13 +47,13 @@ class OpenMessage(Injected):
 
                 raise LtdErrorException("You do not have permission to talk in this group.")
 
-        if len(self.broker.get_subscribers(state.group)) == 1:
+        if self.broker.subscriber_count(state.group) == 1:
             raise LtdErrorException("No one else in group.")
 
         max_len = 254 - validate.NICK_MAX - 2
 
         for part in wrap(message, max_len):
-            e = ltd.Encoder("b")
+            e = ltd.Encoder("b", origin=session_id)
 
             e.add_field_str(state.nick, append_null=False)
             e.add_field_str(part, append_null=True)
@@ -45,7 +45,7 @@ class PrivateMessage(Injected):
             max_len = 254 - validate.NICK_MAX - 5
 
             for part in wrap(message, max_len):
-                e = ltd.Encoder("c")
+                e = ltd.Encoder("c", origin=session_id)
 
                 e.add_field_str(state.nick, append_null=False)
                 e.add_field_str(part, append_null=True)
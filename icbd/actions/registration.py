@@ -59,130 +59,145 @@ class Registration(Injected):
 
         self.template = self.resolve(template.Template)
 
-    def register(self, session_id, password):
+    async def register(self, session_id, password):
         self.log.debug("Starting user registration.")
 
         state = self.session.get(session_id)
+        nick = state.nick
 
-        registered = False
+        registered = await self.nickdb_connection.run(lambda scope: self.__register_nick__(scope, nick, password))
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if self.nickdb.exists(scope, state.nick):
-                self.log.debug("Nick found, validating password.")
+        if not registered:
+            self.reputation.fatal(session_id)
 
-                if not self.nickdb.check_password(scope, state.nick, password):
-                    self.reputation.fatal(session_id)
+            raise LtdErrorException("Authorization failure.")
 
-                    raise LtdErrorException("Authorization failure.")
+        self.mark_registered(session_id)
+        await self.notify_messagebox(session_id)
 
-                registered = True
-            else:
-                self.log.debug("Creating new user profile for %s.", state.nick)
+    def __register_nick__(self, scope, nick, password):
+        if self.nickdb.exists(scope, nick):
+            self.log.debug("Nick found, validating password.")
 
-                if not validate.is_valid_password(password):
-                    raise LtdStatusException("Register",
-                                             "Password format not valid. Password length must be between %d and %d characters."
-                                             % (validate.PASSWORD_MIN, validate.PASSWORD_MAX))
+            return self.nickdb.check_password(scope, nick, password)
 
-                self.nickdb.create(scope, state.nick)
-                self.nickdb.set_secure(scope, state.nick, True)
-                self.nickdb.set_admin(scope, state.nick, False)
-                self.nickdb.set_password(scope, state.nick, password)
-                self.nickdb.set_mbox_limit(scope, state.nick, self.config.mbox_limit)
+        self.log.debug("Creating new user profile for %s.", nick)
 
-                registered = True
+        if not validate.is_valid_password(password):
+            raise LtdStatusException("Register",
+                                     "Password format not valid. Password length must be between %d and %d characters."
+                                     % (validate.PASSWORD_MIN, validate.PASSWORD_MAX))
 
-                scope.complete()
+        self.nickdb.create(scope, nick)
+        self.nickdb.set_secure(scope, nick, True)
+        self.nickdb.set_admin(scope, nick, False)
+        self.nickdb.set_password(scope, nick, password)
+        self.nickdb.set_mbox_limit(scope, nick, self.config.mbox_limit)
 
-        if registered:
-            self.mark_registered(session_id)
-            self.notify_messagebox(session_id)
+        return True
 
     def mark_registered(self, session_id):
-        with self.nickdb_connection.enter_scope() as scope:
-            state = self.session.get(session_id)
+        state = self.session.get(session_id)
+
+        nick, loginid, host = state.nick, state.loginid, state.host
+        now = dateutils.now()
+
+        def set_signon(scope):
+            self.nickdb.set_lastlogin(scope, nick, loginid, host)
+            self.nickdb.set_signon(scope, nick, now)
+
+        self.write_behind(self.nickdb_connection, set_signon)
 
-            self.nickdb.set_lastlogin(scope, state.nick, state.loginid, state.host)
+        self.session.update(session_id, signon=now, authenticated=True)
 
-            now = dateutils.now()
+        self.broker.deliver(session_id, ltd.encode_status_msg("Register", "Nick registered."))
 
-            self.nickdb.set_signon(scope, state.nick, now)
+        self.reputation.good(session_id)
 
-            self.session.update(session_id, signon=now, authenticated=True)
+    async def notify_messagebox(self, session_id):
+        nick = self.session.get(session_id).nick
 
-            self.broker.deliver(session_id, ltd.encode_status_msg("Register", "Nick registered."))
+        mbox = await self.nickdb_connection.run(lambda scope: self.__count_messages__(scope, nick), readonly=True)
 
-            self.reputation.good(session_id)
+        if mbox:
+            count, limit = mbox
 
-            scope.complete()
+            if count > 0:
+                self.broker.deliver(session_id,
+                                    ltd.encode_status_msg("Message", "You have %d message%s." % (count, "" if count == 1 else "s")))
 
-    def notify_messagebox(self, session_id):
-        with self.nickdb_connection.enter_scope() as scope:
-            state = self.session.get(session_id)
+            if count >= limit:
+                self.broker.deliver(session_id, ltd.encode_status_msg("Message", "User mailbox is full."))
 
-            if self.nickdb.exists(scope, state.nick):
-                count = self.nickdb.count_messages(scope, state.nick)
-                limit = self.nickdb.get_mbox_limit(scope, state.nick)
+    def __count_messages__(self, scope, nick):
+        mbox = None
 
-                if count > 0:
-                    self.broker.deliver(session_id,
-                                        ltd.encode_status_msg("Message", "You have %d message%s." % (count, "" if count == 1 else "s")))
+        if self.nickdb.exists(scope, nick):
+            mbox = self.nickdb.count_messages(scope, nick), self.nickdb.get_mbox_limit(scope, nick)
 
-                if count >= limit:
-                    self.broker.deliver(session_id, ltd.encode_status_msg("Message", "User mailbox is full."))
+        return mbox
 
     def whoami(self, session_id, msgid=""):
         state = self.session.get(session_id)
 
         self.broker.deliver(session_id, ltd.encode_co_output(state.nick, msgid))
 
-    def change_password(self, session_id, old_pwd, new_pwd):
+    async def change_password(self, session_id, old_pwd, new_pwd):
         self.log.debug("Changing user password.")
 
         state = self.session.get(session_id)
 
-        is_reset_code = False
+        nick, authenticated = state.nick, state.authenticated
+        expiry = self.config.timeouts_password_reset_code
 
-        with self.password_reset_connection.enter_scope() as scope:
-            is_reset_code = self.password_reset.has_pending_request(scope, state.nick, old_pwd, self.config.timeouts_password_reset_code)
+        is_reset_code = await self.password_reset_connection.run(lambda scope: self.password_reset.has_pending_request(scope,
+                                                                                                                     nick,
+                                                                                                                     old_pwd,
+                                                                                                                     expiry),
+                                                                 readonly=True)
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if not self.nickdb.exists(scope, state.nick):
-                raise LtdErrorException("Authorization failure.")
-
-            if not is_reset_code:
-                self.log.debug("Validating password.")
+        if not is_reset_code:
+            self.log.debug("Validating password.")
 
-                if not state.authenticated:
-                    self.reputation.critical(session_id)
+            valid = await self.nickdb_connection.run(lambda scope: self.__check_password__(scope, nick, old_pwd), readonly=True)
 
-                    raise LtdErrorException("You must be registered to change your password.")
+            if not authenticated:
+                self.reputation.critical(session_id)
 
-                if not self.nickdb.check_password(scope, state.nick, old_pwd):
-                    self.reputation.fatal(session_id)
+                raise LtdErrorException("You must be registered to change your password.")
 
-                    raise LtdErrorException("Authorization failure.")
-            else:
-                self.log.debug("Password reset code found: %s", old_pwd)
+            if not valid:
+                self.reputation.fatal(session_id)
 
-            if not validate.is_valid_password(new_pwd):
-                raise LtdStatusException("Pass",
-                                         "Password format not valid. Password length must be between %d and %d characters."
-                                         % (validate.PASSWORD_MIN, validate.PASSWORD_MAX))
+                raise LtdErrorException("Authorization failure.")
+        else:
+            self.log.debug("Password reset code found: %s", old_pwd)
 
-            self.nickdb.set_password(scope, state.nick, new_pwd)
+        if not validate.is_valid_password(new_pwd):
+            raise LtdStatusException("Pass",
+                                     "Password format not valid. Password length must be between %d and %d characters."
+                                     % (validate.PASSWORD_MIN, validate.PASSWORD_MAX))
 
-            self.broker.deliver(session_id, ltd.encode_status_msg("Pass", "Password changed."))
+        await self.nickdb_connection.run(lambda scope: self.__set_password__(scope, nick, new_pwd))
 
-            scope.complete()
+        self.broker.deliver(session_id, ltd.encode_status_msg("Pass", "Password changed."))
 
         if is_reset_code:
-            with self.password_reset_connection.enter_scope() as scope:
-                self.password_reset.delete_requests(scope, state.nick)
+            await self.password_reset_connection.run(lambda scope: self.password_reset.delete_requests(scope, nick))
+
+    def __check_password__(self, scope, nick, password):
+        if not self.nickdb.exists(scope, nick):
+            raise LtdErrorException("Authorization failure.")
+
+        return self.nickdb.check_password(scope, nick, password)
 
-                scope.complete()
+    def __set_password__(self, scope, nick, password):
+        if not self.nickdb.exists(scope, nick):
+            raise LtdErrorException("Authorization failure.")
 
-    def reset_password(self, session_id, email):
+        self.nickdb.set_password(scope, nick, password)
+
+    async def reset_password(self, session_id, email):
         self.log.debug("Resetting user password.")
 
         if not email:
@@ -191,87 +206,92 @@ class Registration(Injected):
         if not validate.is_valid_email(email):
             raise LtdErrorException("Wrong email address.")
 
-        state = self.session.get(session_id)
-        details = None
+        nick = self.session.get(session_id).nick
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if not self.nickdb.exists(scope, state.nick):
-                self.reputation.warning(session_id)
+        confirmed, details = await self.nickdb_connection.run(lambda scope: self.__lookup_details__(scope, nick), readonly=True)
 
-                raise LtdErrorException("Nick not registered.")
+        if not details:
+            self.reputation.warning(session_id)
 
-            if not self.nickdb.is_email_confirmed(scope, state.nick):
-                self.reputation.warning(session_id)
+            raise LtdErrorException("Nick not registered.")
 
-                raise LtdErrorException("Wrong email address.")
+        if not confirmed:
+            self.reputation.warning(session_id)
 
-            details = self.nickdb.lookup(scope, state.nick)
+            raise LtdErrorException("Wrong email address.")
 
-            if details.email.lower() != email.lower():
-                self.reputation.critical(session_id)
+        if details.email.lower() != email.lower():
+            self.reputation.critical(session_id)
 
-                raise LtdErrorException("Wrong email address.")
+            raise LtdErrorException("Wrong email address.")
 
-        code = None
+        expiry = self.config.timeouts_password_reset_request
 
-        with self.password_reset_connection.enter_scope() as scope:
-            pending = self.password_reset.count_pending_requests(scope, state.nick, self.config.timeouts_password_reset_request)
+        code = await self.password_reset_connection.run(lambda scope: self.__create_reset_request__(scope, nick, expiry))
 
-            if pending > 0:
-                self.reputation.critical(session_id)
+        if not code:
+            self.reputation.critical(session_id)
 
-                raise LtdStatusException("Pass", "Password reset pending, please check your inbox.")
+            raise LtdStatusException("Pass", "Password reset pending, please check your inbox.")
 
-            code = self.password_reset.create_request(scope, state.nick)
+        self.log.debug("Reset code generated: %s", code)
 
-            scope.complete()
+        text = self.template.load("password_reset_email")
+        tpl = Template(text)
+        body = tpl.substitute(nick=nick, code=code)
 
-        self.log.debug("Reset code generated: %s", code)
+        await self.mail_sink_connection.run(lambda scope: self.mail_sink.put(scope, details.email, "Password reset", body))
+
+        self.broker.deliver(session_id, ltd.encode_co_output("Email sent."))
+
+    def __lookup_details__(self, scope, nick):
+        confirmed = details = None
+
+        if self.nickdb.exists(scope, nick):
+            confirmed = self.nickdb.is_email_confirmed(scope, nick)
+            details = self.nickdb.lookup(scope, nick)
 
-        with self.mail_sink_connection.enter_scope() as scope:
-            text = self.template.load("password_reset_email")
-            tpl = Template(text)
-            body = tpl.substitute(nick=state.nick, code=code)
+        return confirmed, details
 
-            self.mail_sink.put(scope, details.email, "Password reset", body)
+    def __create_reset_request__(self, scope, nick, expiry):
+        code = None
 
-            self.broker.deliver(session_id, ltd.encode_co_output("Email sent."))
+        if self.password_reset.count_pending_requests(scope, nick, expiry) == 0:
+            code = self.password_reset.create_request(scope, nick)
 
-            scope.complete()
+        return code
 
-    def set_security_mode(self, session_id, enabled, msgid=""):
+    async def set_security_mode(self, session_id, enabled, msgid=""):
         state = self.session.get(session_id)
 
         if not state.authenticated:
             raise LtdErrorException("You must be registered to change your security.")
 
-        with self.nickdb_connection.enter_scope() as scope:
-            self.nickdb.set_secure(scope, state.nick, enabled)
+        nick = state.nick
 
-            if enabled:
-                self.broker.deliver(session_id, ltd.encode_co_output("Security set to password required.", msgid))
-            else:
-                self.broker.deliver(session_id, ltd.encode_co_output("Security set to automatic.", msgid))
+        await self.nickdb_connection.run(lambda scope: self.nickdb.set_secure(scope, nick, enabled))
 
-            scope.complete()
+        if enabled:
+            self.broker.deliver(session_id, ltd.encode_co_output("Security set to password required.", msgid))
+        else:
+            self.broker.deliver(session_id, ltd.encode_co_output("Security set to automatic.", msgid))
 
-    def set_protected(self, session_id, protected, msgid=""):
+    async def set_protected(self, session_id, protected, msgid=""):
         state = self.session.get(session_id)
 
         if not state.authenticated:
             raise LtdErrorException("You must be registered to change your protection level.")
 
-        with self.nickdb_connection.enter_scope() as scope:
-            self.nickdb.set_protected(scope, state.nick, protected)
+        nick = state.nick
 
-            if protected:
-                self.broker.deliver(session_id, ltd.encode_co_output("Protection enabled.", msgid))
-            else:
-                self.broker.deliver(session_id, ltd.encode_co_output("Protection disabled.", msgid))
+        await self.nickdb_connection.run(lambda scope: self.nickdb.set_protected(scope, nick, protected))
 
-            scope.complete()
+        if protected:
+            self.broker.deliver(session_id, ltd.encode_co_output("Protection enabled.", msgid))
+        else:
+            self.broker.deliver(session_id, ltd.encode_co_output("Protection disabled.", msgid))
 
-    def change_field(self, session_id, field, text, msgid=""):
+    async def change_field(self, session_id, field, text, msgid=""):
         state = self.session.get(session_id)
 
         if not state.authenticated:
@@ -281,39 +301,48 @@ class Registration(Injected):
             raise LtdResponseException("Invalid attribute.",
                                        ltd.encode_co_output("'%s' format not valid." % self.__map_field__(field), msgid))
 
-        with self.nickdb_connection.enter_scope() as scope:
-            details = self.nickdb.lookup(scope, state.nick)
+        nick = state.nick
 
-            old_val = getattr(details, field)
+        revoked = await self.nickdb_connection.run(lambda scope: self.__update_field__(scope, nick, field, text))
 
-            if not old_val:
-                old_val = ""
+        if text:
+            self.broker.deliver(session_id, ltd.encode_co_output("%s set to '%s'." % (self.__map_field__(field), text), msgid))
+        else:
+            self.broker.deliver(session_id, ltd.encode_co_output("%s unset." % self.__map_field__(field), msgid))
 
-            setattr(details, field, text)
+        if revoked:
+            self.broker.deliver(session_id, ltd.encode_co_output("Email confirmation revoked.", msgid))
 
-            self.nickdb.update(scope, state.nick, details)
+        if field == "avatar":
+            await self.avatar_connection.run(lambda scope: self.__update_avatar__(scope, nick, text))
 
-            if text:
-                self.broker.deliver(session_id, ltd.encode_co_output("%s set to '%s'." % (self.__map_field__(field), text), msgid))
-            else:
-                self.broker.deliver(session_id, ltd.encode_co_output("%s unset." % self.__map_field__(field), msgid))
+    def __update_field__(self, scope, nick, field, text):
+        details = self.nickdb.lookup(scope, nick)
 
-            if field == "email" and old_val.lower() != text.lower() and self.nickdb.is_email_confirmed(scope, state.nick):
-                self.broker.deliver(session_id, ltd.encode_co_output("Email confirmation revoked.", msgid))
+        old_val = getattr(details, field)
 
-                self.nickdb.set_email_confirmed(scope, state.nick, False)
-                self.nickdb.enable_message_forwarding(scope, state.nick, False)
+        if not old_val:
+            old_val = ""
 
-            scope.complete()
+        setattr(details, field, text)
 
-        if field == "avatar":
-            with self.avatar_connection.enter_scope() as scope:
-                if text:
-                    self.avatar_writer.put(scope, state.nick, text)
-                else:
-                    self.avatar_writer.clear(scope, state.nick)
+        self.nickdb.update(scope, nick, details)
 
-                scope.complete()
+        revoked = False
+
+        if field == "email" and old_val.lower() != text.lower() and self.nickdb.is_email_confirmed(scope, nick):
+            self.nickdb.set_email_confirmed(scope, nick, False)
+            self.nickdb.enable_message_forwarding(scope, nick, False)
+
+            revoked = True
+
+        return revoked
+
+    def __update_avatar__(self, scope, nick, text):
+        if text:
+            self.avatar_writer.put(scope, nick, text)
+        else:
+            self.avatar_writer.clear(scope, nick)
 
     @staticmethod
     def __map_field__(field):
@@ -361,96 +390,116 @@ class Registration(Injected):
 
         return valid
 
-    def enable_forwarding(self, session_id, enabled, msgid=""):
+    async def enable_forwarding(self, session_id, enabled, msgid=""):
         state = self.session.get(session_id)
 
         if not state.authenticated:
             raise LtdErrorException("You must be registered to change forwarding.")
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if not self.nickdb.is_email_confirmed(scope, state.nick):
-                raise LtdErrorException("Please confirm your email address first.")
+        nick = state.nick
 
-            self.nickdb.enable_message_forwarding(scope, state.nick, enabled)
+        await self.nickdb_connection.run(lambda scope: self.__enable_forwarding__(scope, nick, enabled))
 
-            if enabled:
-                self.broker.deliver(session_id, ltd.encode_co_output("Message forwarding enabled.", msgid))
-            else:
-                self.broker.deliver(session_id, ltd.encode_co_output("Message forwarding disabled.", msgid))
+        if enabled:
+            self.broker.deliver(session_id, ltd.encode_co_output("Message forwarding enabled.", msgid))
+        else:
+            self.broker.deliver(session_id, ltd.encode_co_output("Message forwarding disabled.", msgid))
 
-            scope.complete()
+    def __enable_forwarding__(self, scope, nick, enabled):
+        if not self.nickdb.is_email_confirmed(scope, nick):
+            raise LtdErrorException("Please confirm your email address first.")
 
-    def request_confirmation(self, session_id):
-        self.log.debug("Requesting email confirmation.")
+        self.nickdb.enable_message_forwarding(scope, nick, enabled)
 
-        nick, details = self.__load_details_if_confirmed__(session_id)
-        code = None
+    async def request_confirmation(self, session_id):
+        self.log.debug("Requesting email confirmation.")
 
-        with self.confirmation_connection.enter_scope() as scope:
-            pending = self.confirmation.count_pending_requests(scope, nick, details.email, self.config.timeouts_confirmation_request)
+        nick, details = await self.__load_details_if_confirmed__(session_id)
 
-            if pending > 0:
-                self.reputation.warning(session_id)
+        expiry = self.config.timeouts_confirmation_request
 
-                raise LtdStatusException("Confirmation", "Confirmation request pending, please check your inbox.")
+        code = await self.confirmation_connection.run(lambda scope: self.__create_confirmation_request__(scope,
+                                                                                                        nick,
+                                                                                                        details.email,
+                                                                                                        expiry))
 
-            code = self.confirmation.create_request(scope, nick, details.email)
+        if not code:
+            self.reputation.warning(session_id)
 
-            scope.complete()
+            raise LtdStatusException("Confirmation", "Confirmation request pending, please check your inbox.")
 
         self.log.debug("Confirmation code generated: %s", code)
 
-        with self.mail_sink_connection.enter_scope() as scope:
-            text = self.template.load("confirm_email")
-            tpl = Template(text)
-            body = tpl.substitute(nick=nick, code=code)
+        text = self.template.load("confirm_email")
+        tpl = Template(text)
+        body = tpl.substitute(nick=nick, code=code)
 
-            self.mail_sink.put(scope, details.email, "Email confirmation", body)
+        await self.mail_sink_connection.run(lambda scope: self.mail_sink.put(scope, details.email, "Email confirmation", body))
 
-            self.broker.deliver(session_id, ltd.encode_co_output("Confirmation mail sent."))
+        self.broker.deliver(session_id, ltd.encode_co_output("Confirmation mail sent."))
 
-            scope.complete()
+    def __create_confirmation_request__(self, scope, nick, email, expiry):
+        code = None
 
-    def confirm(self, session_id, code):
-        nick, details = self.__load_details_if_confirmed__(session_id)
+        if self.confirmation.count_pending_requests(scope, nick, email, expiry) == 0:
+            code = self.confirmation.create_request(scope, nick, email)
 
-        with self.confirmation_connection.enter_scope() as scope:
-            if not self.confirmation.has_pending_request(scope, nick, code, details.email, self.config.timeouts_confirmation_code):
-                self.reputation.fatal(session_id)
+        return code
 
-                raise LtdStatusException("Confirmation", "Confirmation failed.")
+    async def confirm(self, session_id, code):
+        nick, details = await self.__load_details_if_confirmed__(session_id)
 
-            self.confirmation.delete_requests(scope, nick)
+        expiry = self.config.timeouts_confirmation_code
+
+        confirmed = await self.confirmation_connection.run(lambda scope: self.__delete_confirmation_request__(scope,
+                                                                                                             nick,
+                                                                                                             code,
+                                                                                                             details.email,
+                                                                                                             expiry))
 
-            scope.complete()
+        if not confirmed:
+            self.reputation.fatal(session_id)
 
-        with self.nickdb_connection.enter_scope() as scope:
-            self.nickdb.set_email_confirmed(scope, nick, True)
+            raise LtdStatusException("Confirmation", "Confirmation failed.")
 
-            scope.complete()
+        await self.nickdb_connection.run(lambda scope: self.nickdb.set_email_confirmed(scope, nick, True))
 
         self.broker.deliver(session_id,
                             ltd.encode_status_msg("Confirmation", "Email address confirmed. Enable message forwarding with /forward."))
 
-    def __load_details_if_confirmed__(self, session_id):
+    def __delete_confirmation_request__(self, scope, nick, code, email, expiry):
+        confirmed = self.confirmation.has_pending_request(scope, nick, code, email, expiry)
+
+        if confirmed:
+            self.confirmation.delete_requests(scope, nick)
+
+        return confirmed
+
+    async def __load_details_if_confirmed__(self, session_id):
         state = self.session.get(session_id)
 
         if not state.authenticated:
             raise LtdErrorException("You must be registered to confirm your email address.")
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if self.nickdb.is_email_confirmed(scope, state.nick):
-                raise LtdResponseException("Already already confirmed.",
-                                           ltd.encode_co_output("Email address already confirmed."))
+        nick = state.nick
 
-            details = self.nickdb.lookup(scope, state.nick)
+        details = await self.nickdb_connection.run(lambda scope: self.__lookup_unconfirmed_details__(scope, nick), readonly=True)
 
-            if not details.email:
-                raise LtdStatusException("Confirmation", "No email address set.")
+        return nick, details
 
-            return state.nick, details
+    def __lookup_unconfirmed_details__(self, scope, nick):
+        if self.nickdb.is_email_confirmed(scope, nick):
+            raise LtdResponseException("Already already confirmed.",
+                                       ltd.encode_co_output("Email address already confirmed."))
 
-    def delete(self, session_id, password, msgid=""):
+        details = self.nickdb.lookup(scope, nick)
+
+        if not details.email:
+            raise LtdStatusException("Confirmation", "No email address set.")
+
+        return details
+
+    async def delete(self, session_id, password, msgid=""):
         state = self.session.get(session_id)
 
         if not state.authenticated:
@@ -462,34 +511,28 @@ class Registration(Injected):
         if state.nick.lower() == core.ADMIN.lower():
             raise LtdErrorException("Cannot delete default admin account.")
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if not self.nickdb.check_password(scope, state.nick, password):
-                raise LtdErrorException("Password incorrect.")
+        nick = state.nick
 
-            self.nickdb.delete(scope, state.nick)
+        await self.nickdb_connection.run(lambda scope: self.__delete_nick__(scope, nick, password))
 
-            self.broker.deliver(session_id, ltd.encode_co_output("Record deleted.", msgid))
+        self.broker.deliver(session_id, ltd.encode_co_output("Record deleted.", msgid))
 
-            self.session.update(session_id, authentication=False)
+        self.session.update(session_id, authentication=False)
 
-            scope.complete()
+    def __delete_nick__(self, scope, nick, password):
+        if not self.nickdb.check_password(scope, nick, password):
+            raise LtdErrorException("Password incorrect.")
 
-    def whois(self, session_id, nick, msgid=""):
+        self.nickdb.delete(scope, nick)
+
+    async def whois(self, session_id, nick, msgid=""):
         if not nick:
             raise LtdErrorException("Usage: /whois {nick}")
 
-        state = self.session.get(session_id)
+        signon, signoff, protected, details = await self.nickdb_connection.run(lambda scope: self.__lookup_profile__(scope, nick),
+                                                                               readonly=True)
 
-        signon = signoff = protected = details = None
-
-        with self.nickdb_connection.enter_scope() as scope:
-            if not self.nickdb.exists(scope, nick):
-                raise LtdErrorException("%s not found." % nick)
-
-            signon = self.nickdb.get_signon(scope, nick)
-            signoff = self.nickdb.get_signoff(scope, nick)
-            protected = self.nickdb.is_protected(scope, nick)
-            details = self.nickdb.lookup(scope, nick)
+        state = self.session.get(session_id)
 
         login = idle = away = None
 
@@ -562,23 +605,24 @@ class Registration(Injected):
             for part in parts[1:]:
                 msgs.extend(ltd.encode_co_output("                %s" % part, msgid))
 
-        self.broker.deliver(session_id, msgs)
+        self.broker.deliver(session_id, ltd.Frame(msgs, "i"))
 
-    def display_avatar(self, session_id, nick, msgid=""):
-        if not nick:
-            raise LtdErrorException("Usage: /whois {nick}")
+    def __lookup_profile__(self, scope, nick):
+        if not self.nickdb.exists(scope, nick):
+            raise LtdErrorException("%s not found." % nick)
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if not self.nickdb.exists(scope, nick):
-                raise LtdErrorException("%s not found." % nick)
+        return (self.nickdb.get_signon(scope, nick),
+                self.nickdb.get_signoff(scope, nick),
+                self.nickdb.is_protected(scope, nick),
+                self.nickdb.lookup(scope, nick))
 
-            details = self.nickdb.lookup(scope, nick)
+    async def display_avatar(self, session_id, nick, msgid=""):
+        if not nick:
+            raise LtdErrorException("Usage: /whois {nick}")
 
-            if not details.avatar:
-                raise LtdErrorException("%s has no avatar." % nick)
+        await self.nickdb_connection.run(lambda scope: self.__test_avatar__(scope, nick), readonly=True)
 
-        with self.avatar_connection.enter_scope() as scope:
-            key = self.avatar_reader.lookup_key(scope, nick)
+        key = await self.avatar_connection.run(lambda scope: self.avatar_reader.lookup_key(scope, nick), readonly=True)
 
         if not key:
             raise LtdErrorException("Preview not available.")
@@ -593,4 +637,13 @@ class Registration(Injected):
         for l in lines:
             msgs.extend(ltd.encode_co_output(l, msgid))
 
-        self.broker.deliver(session_id, msgs)
+        self.broker.deliver(session_id, ltd.Frame(msgs, "i"))
+
+    def __test_avatar__(self, scope, nick):
+        if not self.nickdb.exists(scope, nick):
+            raise LtdErrorException("%s not found." % nick)
+
+        details = self.nickdb.lookup(scope, nick)
+
+        if not details.avatar:
+            raise LtdErrorException("%s has no avatar." % nick)
@@ -26,7 +26,7 @@
 from datetime import datetime
 import secrets
 import re
-import socket
+import asyncio
 import ipaddress
 import traceback
 from actions import Injected, ACTION, UserStatus
@@ -40,6 +40,7 @@ import validate
 import ltd
 import shutdown
 import ipfilter
+import resolver
 import dateutils
 from textutils import hide_chars
 from exception import LtdErrorException, LtdStatusException
@@ -50,8 +51,9 @@ class UserSession(Injected):
 
         self.__ipfilter_connection = self.resolve(ipfilter.Connection)
         self.__ipfilters = self.resolve(ipfilter.Storage)
+        self.__resolver = self.resolve(resolver.Resolver)
 
-    def login(self, session_id, loginid, nick, password, group_name, status="", remote_address=""):
+    async def login(self, session_id, loginid, nick, password, group_name, status="", remote_address=""):
         self.log.debug("User login: loginid=%s, nick=%s, password=%s", loginid, nick, hide_chars(password))
 
         if not validate.is_valid_loginid(loginid):
@@ -71,13 +73,13 @@ class UserSession(Injected):
 
         ACTION(Motd).receive(session_id)
 
-        registered = self.config.server_unsecure_login and self.__try_login_unsecure__(session_id, loginid, nick)
+        registered = self.config.server_unsecure_login and await self.__try_login_unsecure__(session_id, loginid, nick)
 
         if not registered:
             if not password:
-                self.__login_no_password__(session_id, loginid, nick)
+                await self.__login_no_password__(session_id, loginid, nick)
             else:
-                registered = self.__login_password__(session_id, loginid, nick, password)
+                registered = await self.__login_password__(session_id, loginid, nick, password)
 
         self.session.update(session_id, signon=dateutils.now())
 
@@ -86,15 +88,15 @@ class UserSession(Injected):
         if registered:
             registration.mark_registered(session_id)
 
-        self.__test_connection_limit__(session_id)
-        self.__test_ip__(session_id)
+        await self.__test_connection_limit__(session_id)
+        await self.__test_ip__(session_id)
 
-        registration.notify_messagebox(session_id)
+        await registration.notify_messagebox(session_id)
 
         if not group_name:
             group_name = core.DEFAULT_GROUP
 
-        self.join(session_id, group_name, status)
+        await self.join(session_id, group_name, status)
 
         ACTION(Notify).notify_signon(session_id)
 
@@ -107,11 +109,13 @@ class UserSession(Injected):
 
             self.broker.deliver(session_id, ltd.encode_status_msg("Shutdown", msg))
 
-        with self.statsdb_connection.enter_scope() as scope:
+        logins = self.session.count_logins()
+
+        def update_stats(scope):
             self.statsdb.add_signon(scope)
-            self.statsdb.set_max_logins(scope, self.session.count_logins())
+            self.statsdb.set_max_logins(scope, logins)
 
-            scope.complete()
+        self.write_behind(self.statsdb_connection, update_stats)
 
     def __resolve_bridged_user__(self, session_id, loginid, remote_address):
         if remote_address:
@@ -121,60 +125,85 @@ class UserSession(Injected):
                 state = self.session.get(session_id)
 
                 if self.__find_bridge_full__(loginid, state.ip) or self.__find_bridge__(state.ip):
-                    fqdn = socket.getfqdn(str(addr))
+                    self.log.info("Bridged user, overwriting remote address: %s", addr)
+
+                    self.session.update(session_id, ip=str(addr), host=str(addr))
 
-                    self.log.info("Bridged user, overwriting remote address: %s (%s)", fqdn, addr)
+                    loop = asyncio.get_running_loop()
 
-                    self.session.update(session_id, ip=str(addr), host=fqdn)
+                    loop.create_task(self.__resolve_bridged_host__(session_id, str(addr)))
             except Exception as ex:
                 self.log.warning(traceback.format_exc())
 
+    async def __resolve_bridged_host__(self, session_id, ip):
+        host = await self.__resolver.resolve(ip)
+
+        if host:
+            try:
+                state = self.session.get(session_id)
+
+                if state.ip == ip:
+                    self.log.debug("Host name of bridged user resolved: %s (%s)", host, ip)
+
+                    self.session.update(session_id, host=host)
+            except KeyError:
+                pass
+
     def __find_bridge_full__(self, loginid, ip):
         return [m for m in self.config.server_bridges if "loginid" in m and m["loginid"] == loginid and m["address"] == ip]
 
     def __find_bridge__(self, ip):
         return [m for m in self.config.server_bridges if "loginid" not in m and m["address"] == ip]
 
-    def __try_login_unsecure__(self, session_id, loginid, nick):
+    async def __try_login_unsecure__(self, session_id, loginid, nick):
         self.log.debug("Testing unsecure authentication.")
 
         registered = False
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if self.nickdb.exists(scope, nick):
-                self.log.debug("Nick found, testing security level.")
+        lastlogin = await self.nickdb_connection.run(lambda scope: self.__find_unsecure_lastlogin__(scope, nick), readonly=True)
 
-                if not self.nickdb.is_secure(scope, nick):
-                    self.log.debug("Nick allows auto-register.")
+        if lastlogin:
+            self.log.debug("Last login: %s@%s", lastlogin[0], lastlogin[1])
 
-                    if not self.nickdb.is_admin(scope, nick):
-                        lastlogin = self.nickdb.get_lastlogin(scope, nick)
-
-                        if lastlogin:
-                            self.log.debug("Last login: %s@%s", lastlogin[0], lastlogin[1])
-
-                            state = self.session.get(session_id)
-                            registered = (lastlogin[0] == loginid and lastlogin[1] == state.host)
-                        else:
-                            self.log.debug("First login, skipping auto-register.")
-                    else:
-                        self.log.debug("Cannot auto-register administrative users.")
-                else:
-                    self.log.debug("Nick doesn't allow auto-register.")
+            state = self.session.get(session_id)
+            registered = (lastlogin[0] == loginid and lastlogin[1] in (state.host, state.ip))
 
         if registered:
             loggedin_session = self.session.find_nick(nick)
 
             if loggedin_session:
-                self.__auto_rename__(loggedin_session)
+                await self.__auto_rename__(loggedin_session)
 
             self.session.update(session_id, loginid=loginid, nick=nick)
 
         return registered
 
-    def __login_no_password__(self, session_id, loginid, nick):
+    def __find_unsecure_lastlogin__(self, scope, nick):
+        lastlogin = None
+
+        if self.nickdb.exists(scope, nick):
+            self.log.debug("Nick found, testing security level.")
+
+            if not self.nickdb.is_secure(scope, nick):
+                self.log.debug("Nick allows auto-register.")
+
+                if not self.nickdb.is_admin(scope, nick):
+                    lastlogin = self.nickdb.get_lastlogin(scope, nick)
+
+                    if not lastlogin:
+                        self.log.debug("First login, skipping auto-register.")
+                else:
+                    self.log.debug("Cannot auto-register administrative users.")
+            else:
+                self.log.debug("Nick doesn't allow auto-register.")
+
+        return lastlogin
+
+    async def __login_no_password__(self, session_id, loginid, nick):
         self.log.debug("No password given, skipping authentication.")
 
+        exists, is_admin = await self.nickdb_connection.run(lambda scope: self.__lookup_nick__(scope, nick), readonly=True)
+
         loggedin_session = self.session.find_nick(nick)
 
         if loggedin_session:
@@ -182,44 +211,43 @@ class UserSession(Injected):
 
             raise LtdStatusException("Register", "Nick already in use.")
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if self.nickdb.exists(scope, nick):
-                if self.nickdb.is_admin(scope, nick):
-                    raise LtdErrorException("You need a password to login as administrator.")
+        if exists:
+            if is_admin:
+                raise LtdErrorException("You need a password to login as administrator.")
 
-                self.broker.deliver(session_id, ltd.encode_status_msg("Register",
-                                                                      "Send password to authenticate your nickname."))
-            else:
-                self.broker.deliver(session_id, ltd.encode_status_msg("No-Pass",
-                                                                      "Your nickname does not have a password."))
+            self.broker.deliver(session_id, ltd.encode_status_msg("Register",
+                                                                  "Send password to authenticate your nickname."))
+        else:
+            self.broker.deliver(session_id, ltd.encode_status_msg("No-Pass",
+                                                                  "Your nickname does not have a password."))
 
-                self.broker.deliver(session_id, ltd.encode_status_msg("No-Pass",
-                                                                      "For help type /m server ?"))
+            self.broker.deliver(session_id, ltd.encode_status_msg("No-Pass",
+                                                                  "For help type /m server ?"))
 
         self.session.update(session_id, loginid=loginid, nick=nick)
 
-    def __login_password__(self, session_id, loginid, nick, password):
-        self.log.debug("Password set, trying to authenticate %s.", nick)
+    def __lookup_nick__(self, scope, nick):
+        exists = self.nickdb.exists(scope, nick)
 
-        registered = False
-        is_admin = False
+        return exists, exists and self.nickdb.is_admin(scope, nick)
 
-        with self.nickdb_connection.enter_scope() as scope:
-            if self.nickdb.exists(scope, nick):
-                registered = self.nickdb.check_password(scope, nick, password)
-                is_admin = self.nickdb.is_admin(scope, nick)
+    async def __login_password__(self, session_id, loginid, nick, password):
+        self.log.debug("Password set, trying to authenticate %s.", nick)
 
-            if not registered:
-                self.log.debug("Password is invalid.")
+        registered, is_admin = await self.nickdb_connection.run(lambda scope: self.__check_password__(scope, nick, password),
+                                                                readonly=True)
 
-                self.reputation.critical(session_id)
+        if not registered:
+            self.log.debug("Password is invalid.")
+
+            self.reputation.critical(session_id)
 
-                self.broker.deliver(session_id, ltd.encode_str("e", "Authorization failure."))
-                self.broker.deliver(session_id, ltd.encode_status_msg("Register",
-                                                                      "Send password to authenticate your nickname."))
+            self.broker.deliver(session_id, ltd.encode_str("e", "Authorization failure."))
+            self.broker.deliver(session_id, ltd.encode_status_msg("Register",
+                                                                  "Send password to authenticate your nickname."))
 
-                if is_admin:
-                    raise LtdErrorException("You need a password to login as administrator.")
+            if is_admin:
+                raise LtdErrorException("You need a password to login as administrator.")
 
         loggedin_session = self.session.find_nick(nick)
 
@@ -229,13 +257,23 @@ class UserSession(Injected):
             raise LtdStatusException("Register", "Nick already in use.")
 
         if loggedin_session:
-            self.__auto_rename__(loggedin_session)
+            await self.__auto_rename__(loggedin_session)
 
         self.session.update(session_id, loginid=loginid, nick=nick)
 
         return registered
 
-    def __auto_rename__(self, session_id):
+    def __check_password__(self, scope, nick, password):
+        registered = False
+        is_admin = False
+
+        if self.nickdb.exists(scope, nick):
+            registered = self.nickdb.check_password(scope, nick, password)
+            is_admin = self.nickdb.is_admin(scope, nick)
+
+        return registered, is_admin
+
+    async def __auto_rename__(self, session_id):
         state = self.session.get(session_id)
 
         self.log.debug("Renaming logged in user: %s", state.nick)
@@ -255,7 +293,7 @@ class UserSession(Injected):
             if self.session.find_nick(new_nick):
                 new_nick = None
 
-        self.rename(session_id, new_nick)
+        await self.rename(session_id, new_nick)
 
     @staticmethod
     def __split_name__(name):
@@ -284,32 +322,31 @@ class UserSession(Injected):
 
         return guessed
 
-    def __test_connection_limit__(self, session_id):
+    async def __test_connection_limit__(self, session_id):
         if self.session.count_logins() > self.config.server_max_logins:
             self.log.warning("Connection limit (%d) reached.", self.config.server_max_logins)
 
             state = self.session.get(session_id)
 
             if state.authenticated:
-                with self.nickdb_connection.enter_scope() as scope:
-                    if not self.nickdb.is_admin(scope, state.nick):
-                        raise LtdErrorException("Connection limit reached.")
+                nick = state.nick
+
+                if not await self.nickdb_connection.run(lambda scope: self.nickdb.is_admin(scope, nick), readonly=True):
+                    raise LtdErrorException("Connection limit reached.")
             else:
                 raise LtdErrorException("Connection limit reached.")
 
-    def __test_ip__(self, session_id):
+    async def __test_ip__(self, session_id):
         state = self.session.get(session_id)
 
-        login = "%s@%s" % (state.loginid, state.ip)
+        loginid, ip = state.loginid, state.ip
 
-        with self.__ipfilter_connection.enter_scope() as scope:
-            for f, _ in self.__ipfilters.load_deny_filters(scope):
-                if f.matches(login):
-                    self.log.info("Blocking IP address: %s", login)
+        if await self.__ipfilter_connection.run(lambda scope: self.__ipfilters.is_denied(scope, loginid, ip)):
+            self.log.info("Blocking IP address: %s@%s", loginid, ip)
 
-                    raise LtdErrorException("Access denied.")
+            raise LtdErrorException("Access denied.")
 
-    def rename(self, session_id, nick):
+    async def rename(self, session_id, nick):
         if not validate.is_valid_nick(nick):
             raise LtdErrorException("Nickname is invalid.")
 
@@ -342,33 +379,35 @@ class UserSession(Injected):
 
             self.session.update(session_id, nick=nick, authenticated=False)
 
-            registered = False
-            is_admin = False
-
-            with self.nickdb_connection.enter_scope() as scope:
+            def switch_nick(scope):
                 if was_authenticated and self.nickdb.exists(scope, old_nick):
                     self.nickdb.set_signoff(scope, old_nick)
 
                 if self.nickdb.exists(scope, nick):
-                    is_admin = self.nickdb.is_admin(scope, nick)
+                    return True, self.nickdb.is_admin(scope, nick), self.nickdb.is_secure(scope, nick), self.nickdb.get_lastlogin(scope, nick)
 
-                    if self.nickdb.is_secure(scope, nick):
-                        self.broker.deliver(session_id,
-                                            ltd.encode_status_msg("Register",
-                                                                  "Send password to authenticate your nickname."))
-                    else:
-                        self.log.debug("Nick not secure, trying to register automatically.")
+                return False, False, False, None
 
-                        lastlogin = self.nickdb.get_lastlogin(scope, nick)
+            exists, is_admin, secure, lastlogin = await self.nickdb_connection.run(switch_nick)
 
-                        if lastlogin:
-                            self.log.debug("Last login: %s@%s", lastlogin[0], lastlogin[1])
+            registered = False
 
-                            registered = (lastlogin[0] == state.loginid and lastlogin[1] == state.host)
-                else:
+            if exists:
+                if secure:
                     self.broker.deliver(session_id,
-                                        ltd.encode_status_msg("No-Pass",
-                                                              "To register your nickname type /m server p password."))
+                                        ltd.encode_status_msg("Register",
+                                                              "Send password to authenticate your nickname."))
+                else:
+                    self.log.debug("Nick not secure, trying to register automatically.")
+
+                    if lastlogin:
+                        self.log.debug("Last login: %s@%s", lastlogin[0], lastlogin[1])
+
+                        registered = (lastlogin[0] == state.loginid and lastlogin[1] in (state.host, state.ip))
+            else:
+                self.broker.deliver(session_id,
+                                    ltd.encode_status_msg("No-Pass",
+                                                          "To register your nickname type /m server p password."))
 
             registration = ACTION(Registration)
 
@@ -381,9 +420,9 @@ class UserSession(Injected):
 
                 self.reputation.fatal(session_id)
 
-                self.__auto_rename__(session_id)
+                await self.__auto_rename__(session_id)
             else:
-                registration.notify_messagebox(session_id)
+                await registration.notify_messagebox(session_id)
                 self.session.update(session_id, signon=dateutils.now())
 
     def sign_off(self, session_id):
@@ -393,10 +432,9 @@ class UserSession(Injected):
             self.log.debug("Dropping session: %s", session_id)
 
             if state.authenticated:
-                with self.nickdb_connection.enter_scope() as scope:
-                    self.nickdb.set_signoff(scope, state.nick)
+                nick = state.nick
 
-                    scope.complete()
+                self.write_behind(self.nickdb_connection, lambda scope: self.nickdb.set_signoff(scope, nick))
 
             ACTION(Notify).notify_signoff(session_id)
 
@@ -423,24 +461,18 @@ class UserSession(Injected):
     def idle_mod(self, session_id):
         self.broker.deliver(session_id, ltd.encode_status_msg("Idle-Mod", "You were booted."))
 
-        self.join(session_id, core.BOOT_GROUP)
+        self.enter_group(session_id, core.BOOT_GROUP)
         self.drop_moderator(session_id, "Idle-Mod", "Your group moderator idled away.")
 
-        with self.statsdb_connection.enter_scope() as scope:
-            self.statsdb.add_idlemod(scope)
-
-            scope.complete()
+        self.write_behind(self.statsdb_connection, lambda scope: self.statsdb.add_idlemod(scope))
 
     def idle_boot(self, session_id):
         self.broker.deliver(session_id, ltd.encode_status_msg("Idle-Boot", "You were booted."))
 
-        self.join(session_id, core.BOOT_GROUP)
+        self.enter_group(session_id, core.BOOT_GROUP)
         self.drop_moderator(session_id, "Idle-Boot", "Your group moderator idled away.")
 
-        with self.statsdb_connection.enter_scope() as scope:
-            self.statsdb.add_idleboot(scope)
-
-            scope.complete()
+        self.write_behind(self.statsdb_connection, lambda scope: self.statsdb.add_idleboot(scope))
 
     def drop_moderator(self, session_id, category, message):
         for info in self.groups.get_groups():
@@ -479,7 +511,26 @@ class UserSession(Injected):
 
                 self.groups.update(info)
 
-    def join(self, session_id, group_name, status=""):
+    async def join(self, session_id, group_name, status=""):
+        is_admin = False
+
+        if self.__is_group_full__(session_id, group_name):
+            state = self.session.get(session_id)
+
+            is_admin = await self.is_admin(state.nick)
+
+        self.enter_group(session_id, group_name, status, is_admin)
+
+    def __is_group_full__(self, session_id, group_name):
+        _, group_name = self.__extract_visibility_from_groupname__(self.__resolve_user_group_name__(group_name))
+
+        info = self.groups.get(group_name)
+
+        return (info.group_limit > 0
+                and info.moderator != session_id
+                and self.broker.subscriber_count(str(info)) >= info.group_limit)
+
+    def enter_group(self, session_id, group_name, status="", is_admin=False):
         state = self.session.get(session_id)
 
         self.log.debug("%s joins group %s.", state.nick, group_name)
@@ -498,16 +549,13 @@ class UserSession(Injected):
 
         info = self.groups.get(group_name)
 
-        if info.group_limit > 0 and len(self.broker.get_subscribers(str(info))) >= info.group_limit:
-            with self.nickdb_connection.enter_scope() as scope:
-                is_admin = self.nickdb.exists(scope, state.nick) and self.nickdb.is_admin(scope, state.nick)
-
-                if info.moderator != session_id and not is_admin:
-                    if info.volume == group.Volume.LOUD:
-                        self.broker.to_channel(str(info),
-                                               ltd.encode_status_msg("Probe", "%s tried to enter the group, but it's full." % state.nick))
+        if info.group_limit > 0 and self.broker.subscriber_count(str(info)) >= info.group_limit:
+            if info.moderator != session_id and not is_admin:
+                if info.volume == group.Volume.LOUD:
+                    self.broker.to_channel(str(info),
+                                           ltd.encode_status_msg("Probe", "%s tried to enter the group, but it's full." % state.nick))
 
-                    raise LtdErrorException("Group is full.")
+                raise LtdErrorException("Group is full.")
 
         if info.control == group.Control.RESTRICTED:
             if (info.moderator != session_id
@@ -580,12 +628,11 @@ class UserSession(Injected):
         self.session.update(session_id, group=info.key)
 
         if new_status:
-            ACTION(Group).change_status(session_id, new_status)
+            ACTION(Group).apply_status(session_id, info, new_status)
 
-        with self.statsdb_connection.enter_scope() as scope:
-            self.statsdb.set_max_groups(scope, len(self.groups))
+        groups = len(self.groups)
 
-            scope.complete()
+        self.write_behind(self.statsdb_connection, lambda scope: self.statsdb.set_max_groups(scope, groups))
 
         if old_group:
             info = self.groups.get(old_group)
@@ -630,14 +677,14 @@ class UserSession(Injected):
 
         return visibility, name
 
-    def whereis(self, session_id, nick, mode="", msgid=""):
+    async def whereis(self, session_id, nick, mode="", msgid=""):
         loggedin_session = self.session.find_nick(nick)
 
         if loggedin_session:
             state = self.session.get(loggedin_session)
 
             if mode == "a":
-                status_flags = UserStatus().get_flags(state)
+                status_flags = await ACTION(UserStatus).get_flags(state)
 
                 status = " (%s)" %  ", ".join(status_flags) if status_flags else ""
 
@@ -0,0 +1,569 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import getopt
+import sys
+import os
+import asyncio
+import signal
+import json
+import random
+import socket
+import subprocess
+import tempfile
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import List
+import ltd
+import eventloop
+
+STATS_MODES = {"enabled": {"enabled": True},
+               "writethrough": {"enabled": True, "flushInterval": 0},
+               "disabled": {"enabled": False}}
+
+@dataclass
+class Stats:
+    connected: int = 0
+    failed: int = 0
+    errors: int = 0
+    disconnected: int = 0
+    open_sent: int = 0
+    open_expected: int = 0
+    private_sent: int = 0
+    db_sent: int = 0
+    open_latencies: List[float] = field(default_factory=list)
+    private_latencies: List[float] = field(default_factory=list)
+
+class Client(asyncio.BufferedProtocol):
+    def __init__(self, nick, group, stats):
+        asyncio.BufferedProtocol.__init__(self)
+
+        loop = asyncio.get_running_loop()
+
+        self.__nick = nick
+        self.__group = group
+        self.__stats = stats
+        self.__transport = None
+        self.__decoder = ltd.Decoder()
+        self.__logged_in = loop.create_future()
+        self.__closed = False
+
+        self.__decoder.add_listener(self.__packet_received__)
+
+    @property
+    def nick(self):
+        return self.__nick
+
+    @property
+    def group(self):
+        return self.__group
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    def connection_made(self, transport):
+        self.__transport = transport
+
+        e = ltd.Encoder("a")
+
+        e.add_field_str(self.__nick, append_null=False)
+        e.add_field_str(self.__nick, append_null=False)
+        e.add_field_str(self.__group, append_null=False)
+        e.add_field_str("login", append_null=False)
+        e.add_field_str("", append_null=True)
+
+        self.__transport.write(e.encode())
+
+    def get_buffer(self, sizehint):
+        return self.__decoder.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        self.__decoder.buffer_updated(nbytes)
+
+    def __packet_received__(self, type_id, payload):
+        if type_id == "b":
+            self.__message_received__(payload, self.__stats.open_latencies)
+        elif type_id == "c":
+            self.__message_received__(payload, self.__stats.private_latencies)
+        elif type_id == "a":
+            if not self.__logged_in.done():
+                self.__logged_in.set_result(None)
+        elif type_id == "e":
+            self.__stats.errors += 1
+
+            if not self.__logged_in.done():
+                self.__logged_in.set_exception(Exception(bytes(payload).rstrip(b"\0").decode()))
+        elif type_id == "l":
+            self.__transport.write(ltd.encode_empty_cmd("m"))
+
+    def __message_received__(self, payload, latencies):
+        fields = ltd.split(payload)
+
+        if len(fields) == 2 and fields[1].startswith(b"bench "):
+            sent = float(fields[1].split(b" ")[1].rstrip(b"\0"))
+
+            latencies.append(time.perf_counter() - sent)
+
+    def connection_lost(self, ex):
+        self.__closed = True
+
+        if not self.__logged_in.done():
+            self.__logged_in.set_exception(ex or ConnectionResetError("Connection closed by server."))
+        else:
+            self.__stats.disconnected += 1
+
+    async def wait_login(self):
+        await self.__logged_in
+
+    def send_open(self, text):
+        self.__transport.write(ltd.encode_str("b", text))
+
+    def send_private(self, receiver, text):
+        self.send_command("m", "%s %s" % (receiver, text))
+
+    def send_command(self, command, text=""):
+        e = ltd.Encoder("h")
+
+        e.add_field_str(command, append_null=False)
+        e.add_field_str(text, append_null=True)
+
+        self.__transport.write(e.encode())
+
+    def close(self):
+        if self.__transport:
+            self.__transport.close()
+
+class Server:
+    def __init__(self, opts, policy, stats):
+        self.__opts = opts
+        self.__policy = policy
+        self.__stats = stats
+        self.__dir = tempfile.TemporaryDirectory(prefix="icbd-benchmark-")
+        self.__process = None
+        self.__log = None
+
+    def start(self):
+        m = {}
+
+        if self.__opts.get("config"):
+            with open(self.__opts["config"]) as f:
+                m = json.load(f)
+
+        server = m.setdefault("server", {})
+
+        server["maxLogins"] = self.__opts["clients"] + self.__opts["db_clients"] + 16
+        server["loop"] = {"policy": self.__policy}
+        server.setdefault("ipc", {})["binding"] = "unix://%s" % os.path.join(self.__dir.name, "ipc.sock")
+        server["cluster"] = {"workers": self.__opts["workers"],
+                             "binding": "unix://%s" % os.path.join(self.__dir.name, "cluster.sock")}
+
+        m["bindings"] = ["tcp://127.0.0.1:%d" % self.__opts["port"]]
+        m.setdefault("logging", {})["verbosity"] = 1
+        m.setdefault("metrics", {})["binding"] = "unix://%s" % os.path.join(self.__dir.name, "metrics.sock")
+        m.setdefault("database", {})["filename"] = os.path.join(self.__dir.name, "icbd.db")
+        m.setdefault("avatar", {})["directory"] = os.path.join(self.__dir.name, "avatars")
+        m.setdefault("timeouts", {})["timeBetweenMessages"] = 0.0
+        m.setdefault("stats", {}).update(STATS_MODES[self.__stats])
+
+        filename = os.path.join(self.__dir.name, "config.json")
+
+        with open(filename, "w") as f:
+            json.dump(m, f)
+
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icbd.py")
+
+        self.__log = open(os.path.join(self.__dir.name, "icbd.log"), "w")
+        self.__process = subprocess.Popen([sys.executable, script, "--config", filename, "--data-dir", self.__opts["data_dir"]],
+                                          stdout=subprocess.DEVNULL,
+                                          stderr=self.__log,
+                                          start_new_session=True)
+
+    async def wait_ready(self, timeout=30.0):
+        deadline = time.monotonic() + timeout
+
+        while True:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.__opts["port"])
+
+                writer.close()
+
+                break
+            except OSError:
+                if time.monotonic() > deadline or self.__process.poll() is not None:
+                    raise Exception("Server didn't start, see log file.")
+
+                await asyncio.sleep(0.1)
+
+        if self.__opts["workers"] > 1:
+            await asyncio.sleep(1.0)
+
+    def rss(self):
+        pids = process_tree(self.__process.pid)
+
+        return sum(read_rss(pid) for pid in pids), len(pids)
+
+    def stop(self):
+        if self.__process.poll() is None:
+            os.killpg(self.__process.pid, signal.SIGINT)
+
+            try:
+                self.__process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.__process.pid, signal.SIGKILL)
+
+                self.__process.wait()
+
+        self.__log.close()
+        self.__dir.cleanup()
+
+def process_tree(root):
+    children = {}
+
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            try:
+                with open("/proc/%s/stat" % name) as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+
+                children.setdefault(ppid, []).append(int(name))
+            except (OSError, IndexError, ValueError): pass
+
+    pids = []
+    pending = [root]
+
+    while pending:
+        pid = pending.pop()
+
+        pids.append(pid)
+        pending.extend(children.get(pid, []))
+
+    return pids
+
+def read_rss(pid):
+    rss = 0
+
+    try:
+        with open("/proc/%d/status" % pid) as f:
+            for l in f:
+                if l.startswith("VmRSS:"):
+                    rss = int(l.split()[1]) * 1024
+    except OSError: pass
+
+    return rss
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+
+        return s.getsockname()[1]
+
+def raise_fd_limit():
+    try:
+        import resource
+
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+        if soft != resource.RLIM_INFINITY and (hard == resource.RLIM_INFINITY or soft < hard):
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError): pass
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000.0 if values else 0.0
+
+async def connect_clients(opts, stats):
+    loop = asyncio.get_running_loop()
+
+    semaphore = asyncio.Semaphore(opts["concurrency"])
+
+    async def connect(i):
+        async with semaphore:
+            client = Client("b%d" % i, "bench%d" % (i % opts["groups"]), stats)
+
+            try:
+                await loop.create_connection(lambda: client, "127.0.0.1", opts["port"])
+                await asyncio.wait_for(client.wait_login(), 30.0)
+
+                stats.connected += 1
+
+                return client
+            except Exception:
+                stats.failed += 1
+
+                client.close()
+
+    clients = await asyncio.gather(*[connect(i) for i in range(opts["clients"])])
+
+    return [c for c in clients if c]
+
+async def connect_db_clients(opts):
+    loop = asyncio.get_running_loop()
+
+    clients = []
+
+    for i in range(opts["db_clients"]):
+        client = Client("d%d" % i, "benchdb", Stats())
+
+        await loop.create_connection(lambda: client, "127.0.0.1", opts["port"])
+        await asyncio.wait_for(client.wait_login(), 30.0)
+
+        client.send_command("p", "secret%d" % i)
+
+        clients.append(client)
+
+    return clients
+
+async def drive_db_load(opts, stats, clients):
+    started = time.perf_counter()
+
+    while True:
+        elapsed = time.perf_counter() - started
+
+        while stats.db_sent < int(elapsed * opts["db_rate"]):
+            c = random.choice(clients)
+
+            if not c.closed:
+                c.send_command("write", "%s load %d" % (c.nick, stats.db_sent))
+                c.send_command("read")
+
+            stats.db_sent += 1
+
+        await asyncio.sleep(0.005)
+
+async def drive_traffic(opts, stats, clients):
+    members = {}
+
+    for c in clients:
+        members[c.group] = members.get(c.group, 0) + 1
+
+    started = time.perf_counter()
+    deadline = started + opts["duration"]
+
+    while True:
+        now = time.perf_counter()
+
+        if now >= deadline:
+            break
+
+        elapsed = now - started
+
+        while stats.open_sent < int(elapsed * opts["open_rate"]):
+            c = random.choice(clients)
+
+            if not c.closed:
+                c.send_open("bench %.6f" % time.perf_counter())
+
+                stats.open_expected += members[c.group] - 1
+
+            stats.open_sent += 1
+
+        while stats.private_sent < int(elapsed * opts["private_rate"]):
+            sender, receiver = random.sample(clients, 2)
+
+            if not sender.closed:
+                sender.send_private(receiver.nick, "bench %.6f" % time.perf_counter())
+
+            stats.private_sent += 1
+
+        await asyncio.sleep(0.005)
+
+    return time.perf_counter() - started
+
+async def drain(stats, timeout=10.0):
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        received = len(stats.open_latencies) + len(stats.private_latencies)
+
+        await asyncio.sleep(0.5)
+
+        if len(stats.open_latencies) + len(stats.private_latencies) == received:
+            break
+
+def summarize(stats, login_time, traffic_time, rss):
+    open_latencies = sorted(stats.open_latencies)
+    private_latencies = sorted(stats.private_latencies)
+
+    return [("Clients", "%d/%d/%d" % (stats.connected, stats.failed, stats.disconnected)),
+            ("Logins/s", "%.1f" % (stats.connected / login_time if login_time else 0.0)),
+            ("Open msgs/s", "%.1f" % (stats.open_sent / traffic_time)),
+            ("Deliveries/s", "%.1f" % (len(open_latencies) / traffic_time)),
+            ("Delivered", "%d/%d" % (len(open_latencies), stats.open_expected)),
+            ("Open p50/p95/p99", "%.2f/%.2f/%.2f ms" % (percentile(open_latencies, 0.5),
+                                                         percentile(open_latencies, 0.95),
+                                                         percentile(open_latencies, 0.99))),
+            ("Private msgs/s", "%.1f" % (stats.private_sent / traffic_time)),
+            ("Private delivered", "%d/%d" % (len(private_latencies), stats.private_sent)),
+            ("Private p50/p95/p99", "%.2f/%.2f/%.2f ms" % (percentile(private_latencies, 0.5),
+                                                            percentile(private_latencies, 0.95),
+                                                            percentile(private_latencies, 0.99))),
+            ("DB writes+reads/s", "%.1f" % (stats.db_sent / traffic_time)),
+            ("Errors", "%d" % stats.errors),
+            ("Server RSS", "%.1f MiB (%d proc.)" % (rss[0] / 1048576.0, rss[1]))]
+
+def report(results):
+    print("%-22s%s" % ("", "".join("%-26s" % policy for policy, _ in results)))
+
+    for i, (label, _) in enumerate(results[0][1]):
+        print("%-22s%s" % (label + ":", "".join("%-26s" % summary[i][1] for _, summary in results)))
+
+async def run_profile(opts, policy, stats):
+    server = Server(opts, policy, stats)
+
+    server.start()
+
+    clients = []
+    db_clients = []
+
+    try:
+        await server.wait_ready()
+
+        stats = Stats()
+
+        started = time.perf_counter()
+
+        clients = await connect_clients(opts, stats)
+
+        login_time = time.perf_counter() - started
+
+        if len(clients) < 2:
+            raise Exception("Not enough clients connected.")
+
+        db_load = None
+
+        if opts["db_clients"]:
+            db_clients = await connect_db_clients(opts)
+            db_load = asyncio.ensure_future(drive_db_load(opts, stats, db_clients))
+
+        traffic_time = await drive_traffic(opts, stats, clients)
+
+        if db_load:
+            db_load.cancel()
+
+        await drain(stats)
+
+        return summarize(stats, login_time, traffic_time, server.rss())
+    finally:
+        for c in clients + db_clients:
+            c.close()
+
+        server.stop()
+
+async def run(opts):
+    raise_fd_limit()
+
+    results = []
+
+    for policy in opts["loops"]:
+        if eventloop.is_available(policy):
+            for stats in opts["stats"]:
+                label = policy if len(opts["stats"]) == 1 else "%s/%s" % (policy, stats)
+
+                results.append((label, await run_profile(opts, policy, stats)))
+        else:
+            print("Event loop '%s' not available, skipping." % policy)
+
+    if results:
+        report(results)
+
+def get_opts(argv):
+    options, _ = getopt.getopt(argv, 'c:d:n:g:t:',
+                               ['config=', 'data-dir=', 'clients=', 'groups=', 'duration=', 'open-rate=', 'private-rate=',
+                                'concurrency=', 'workers=', 'port=', 'loops=', 'stats=', 'db-clients=', 'db-rate='])
+
+    m = {"clients": 1000,
+         "groups": 10,
+         "duration": 30.0,
+         "open_rate": 200.0,
+         "private_rate": 100.0,
+         "concurrency": 100,
+         "workers": 1,
+         "loops": ["asyncio"],
+         "stats": ["enabled"],
+         "db_clients": 0,
+         "db_rate": 200.0,
+         "port": 0}
+
+    for opt, arg in options:
+        if opt in ('-c', '--config'):
+            m["config"] = arg
+        elif opt in ('-d', '--data-dir'):
+            m["data_dir"] = arg
+        elif opt in ('-n', '--clients'):
+            m["clients"] = int(arg)
+        elif opt in ('-g', '--groups'):
+            m["groups"] = int(arg)
+        elif opt in ('-t', '--duration'):
+            m["duration"] = float(arg)
+        elif opt in ('--open-rate',):
+            m["open_rate"] = float(arg)
+        elif opt in ('--private-rate',):
+            m["private_rate"] = float(arg)
+        elif opt in ('--concurrency',):
+            m["concurrency"] = int(arg)
+        elif opt in ('--workers',):
+            m["workers"] = int(arg)
+        elif opt in ('--port',):
+            m["port"] = int(arg)
+        elif opt in ('--loops',):
+            m["loops"] = [policy.strip() for policy in arg.split(",") if policy.strip()]
+        elif opt in ('--stats',):
+            m["stats"] = [mode.strip() for mode in arg.split(",") if mode.strip()]
+        elif opt in ('--db-clients',):
+            m["db_clients"] = int(arg)
+        elif opt in ('--db-rate',):
+            m["db_rate"] = float(arg)
+
+    if not m.get("data_dir"):
+        raise getopt.GetoptError("--data-dir option is mandatory")
+
+    if m["clients"] < 2 or m["groups"] < 1:
+        raise getopt.GetoptError("At least two clients and one group are required.")
+
+    for policy in m["loops"]:
+        if policy not in eventloop.POLICIES:
+            raise getopt.GetoptError("Unsupported event loop: %s" % policy)
+
+    for mode in m["stats"]:
+        if mode not in STATS_MODES:
+            raise getopt.GetoptError("Unsupported statistics mode: %s" % mode)
+
+    if not m["port"]:
+        m["port"] = free_port()
+
+    return m
+
+if __name__ == "__main__":
+    try:
+        opts = get_opts(sys.argv[1:])
+
+        asyncio.run(run(opts))
+    except getopt.GetoptError as ex:
+        print(str(ex))
+    except ValueError as ex:
+        print(str(ex))
+    except:
+        traceback.print_exc()
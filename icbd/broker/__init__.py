@@ -43,6 +43,9 @@ class Broker:
     def get_subscribers(self, channel):
         raise NotImplementedError
 
+    def subscriber_count(self, channel):
+        raise NotImplementedError
+
     def get_channels(self, session_id):
         raise NotImplementedError
 
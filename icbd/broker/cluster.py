@@ -0,0 +1,252 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+from logging import Logger
+import broker.memory
+import session
+import metrics
+import cluster
+import ltd
+from textutils import tolower
+
+def pack_frame(message):
+    return (bytes(message),
+            getattr(message, "type_id", None),
+            getattr(message, "sender", None),
+            getattr(message, "origin", None))
+
+def unpack_frame(data, type_id, sender, origin):
+    return ltd.Frame(data, type_id, sender, origin)
+
+class Broker(broker.memory.Broker):
+    def __init__(self):
+        self.__owners = {}
+        self.__members = {}
+        self.__joined = {}
+        self.__nodes = {}
+
+        super(Broker, self).__init__()
+
+    def inject(self, log: Logger, session_store: session.Store, metrics: metrics.Metrics, node: cluster.Node):
+        super(Broker, self).inject(log, session_store, metrics)
+
+        self.__node = node
+
+        node.add_listener("broker.add", self.__added__)
+        node.add_listener("broker.remove", self.__removed__)
+        node.add_listener("broker.join", self.__joined__)
+        node.add_listener("broker.part", self.__parted__)
+        node.add_listener("broker.deliver", self.__delivered__)
+        node.add_listener("broker.fanout", self.__fanout__)
+        node.add_listener("broker.broadcast", self.__broadcasted__)
+        node.add_listener("cluster.node_joined", self.__node_joined__)
+        node.add_listener("cluster.node_lost", self.__node_lost__)
+
+    def add_session(self, session_id, handler):
+        added = super(Broker, self).add_session(session_id, handler)
+
+        if added:
+            self.__added__(session_id, self.__node.id)
+
+            self.__node.publish("broker.add", session_id, self.__node.id)
+
+        return added
+
+    def session_exists(self, session_id):
+        return session_id in self.__owners
+
+    def remove_session(self, session_id):
+        if super(Broker, self).session_exists(session_id):
+            super(Broker, self).remove_session(session_id)
+
+        self.__removed__(session_id)
+
+        self.__node.publish("broker.remove", session_id)
+
+    @tolower(argname="channel")
+    def join(self, session_id, channel):
+        first = self.__joined__(session_id, channel)
+
+        self.__node.publish("broker.join", session_id, channel)
+
+        return first
+
+    @tolower(argname="channel")
+    def part(self, session_id, channel):
+        left = self.__parted__(session_id, channel)
+
+        self.__node.publish("broker.part", session_id, channel)
+
+        return left
+
+    @tolower(argname="channel")
+    def get_subscribers(self, channel):
+        return self.__members[channel]
+
+    @tolower(argname="channel")
+    def subscriber_count(self, channel):
+        return len(self.__members.get(channel, ()))
+
+    def get_channels(self, session_id):
+        return list(self.__joined.get(session_id, ()))
+
+    def deliver(self, receiver, message):
+        node_id = self.__owners.get(receiver)
+
+        if node_id is None or node_id == self.__node.id:
+            super(Broker, self).deliver(receiver, message)
+        else:
+            self.__node.publish("broker.deliver", receiver, pack_frame(message), target=node_id)
+
+    @tolower(argname="channel")
+    def to_channel_from(self, sender, channel, message):
+        members = self.__members[channel]
+
+        self.__publish_fanout__(sender, channel, message)
+
+        if super(Broker, self).subscriber_count(channel):
+            super(Broker, self).to_channel_from(sender, channel, message)
+
+        return len(members) - 1 if sender in members else len(members)
+
+    @tolower(argname="channel")
+    def to_channel(self, channel, message):
+        members = self.__members[channel]
+
+        self.__publish_fanout__(None, channel, message)
+
+        if super(Broker, self).subscriber_count(channel):
+            super(Broker, self).to_channel(channel, message)
+
+        return len(members)
+
+    def broadcast(self, message):
+        self.__node.publish("broker.broadcast", pack_frame(message))
+
+        super(Broker, self).broadcast(message)
+
+    def __publish_fanout__(self, sender, channel, message):
+        frame = None
+
+        for node_id in self.__nodes.get(channel, ()):
+            if node_id != self.__node.id:
+                if frame is None:
+                    frame = pack_frame(message)
+
+                self.__node.publish("broker.fanout", sender, channel, frame, target=node_id)
+
+    def __added__(self, session_id, node_id):
+        self.__owners[session_id] = node_id
+        self.__joined.setdefault(session_id, set())
+
+    def __removed__(self, session_id):
+        for channel in list(self.__joined.get(session_id, ())):
+            self.__part__(session_id, channel)
+
+        self.__joined.pop(session_id, None)
+        self.__owners.pop(session_id, None)
+
+    def __join__(self, session_id, channel):
+        members = self.__members.setdefault(channel, set())
+
+        if session_id not in members:
+            members.add(session_id)
+
+            self.__joined.setdefault(session_id, set()).add(channel)
+
+            node_id = self.__owners.get(session_id)
+
+            if node_id is not None:
+                nodes = self.__nodes.setdefault(channel, {})
+                nodes[node_id] = nodes.get(node_id, 0) + 1
+
+        return len(members) == 1
+
+    def __part__(self, session_id, channel):
+        members = self.__members.get(channel, set())
+
+        if session_id in members:
+            members.remove(session_id)
+
+            self.__joined[session_id].discard(channel)
+
+            node_id = self.__owners.get(session_id)
+            nodes = self.__nodes.get(channel, {})
+
+            if node_id in nodes:
+                nodes[node_id] -= 1
+
+                if not nodes[node_id]:
+                    del nodes[node_id]
+
+        if not members:
+            self.__members.pop(channel, None)
+            self.__nodes.pop(channel, None)
+
+        return len(members) > 0
+
+    def __joined__(self, session_id, channel):
+        if super(Broker, self).session_exists(session_id):
+            super(Broker, self).join(session_id, channel)
+
+        return self.__join__(session_id, channel)
+
+    def __parted__(self, session_id, channel):
+        if super(Broker, self).session_exists(session_id):
+            super(Broker, self).part(session_id, channel)
+
+        return self.__part__(session_id, channel)
+
+    def __delivered__(self, receiver, frame):
+        super(Broker, self).deliver(receiver, unpack_frame(*frame))
+
+    def __fanout__(self, sender, channel, frame):
+        if super(Broker, self).subscriber_count(channel):
+            message = unpack_frame(*frame)
+
+            if sender:
+                super(Broker, self).to_channel_from(sender, channel, message)
+            else:
+                super(Broker, self).to_channel(channel, message)
+
+    def __broadcasted__(self, frame):
+        super(Broker, self).broadcast(unpack_frame(*frame))
+
+    def __node_joined__(self, node_id):
+        for session_id, owner in self.__owners.items():
+            if owner == self.__node.id:
+                self.__node.publish("broker.add", session_id, owner, target=node_id)
+
+                for channel in self.__joined[session_id]:
+                    self.__node.publish("broker.join", session_id, channel, target=node_id)
+
+    def __node_lost__(self, node_id):
+        lost = [session_id for session_id, owner in self.__owners.items() if owner == node_id]
+
+        if lost:
+            self.log.warning("Cluster node %d lost, removing %d session(s).", node_id, len(lost))
+
+        for session_id in lost:
+            self.__removed__(session_id)
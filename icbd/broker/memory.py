@@ -24,25 +24,40 @@
     OTHER DEALINGS IN THE SOFTWARE.
 """
 from logging import Logger
+from dataclasses import dataclass
 import broker
+import session
+import metrics
 import di
+import ltd
 from textutils import tolower
 
+@dataclass
+class Sender:
+    session_id: str
+    nick: str
+    site: str
+    public: bool
+
 class Broker(broker.Broker, di.Injected):
     def __init__(self):
         super(Broker, self).__init__()
 
         self.__sessions = {}
         self.__channels = {}
+        self.__memberships = {}
 
-    def inject(self, log: Logger):
+    def inject(self, log: Logger, session_store: session.Store, metrics: metrics.Metrics):
         self.log = log
+        self.__session_store = session_store
+        self.__metrics = metrics
 
     def add_session(self, session_id, handler):
         added = session_id not in self.__sessions
 
         if added:
             self.__sessions[session_id] = handler
+            self.__memberships[session_id] = set()
 
         return added
 
@@ -52,13 +67,12 @@ class Broker(broker.Broker, di.Injected):
     def remove_session(self, session_id):
         del self.__sessions[session_id]
 
-        for _, channel in self.__channels.items():
-            try:
-                channel.remove(session_id)
-            except KeyError:
-                pass
+        for channel in self.__memberships.pop(session_id, ()):
+            members = self.__channels[channel]
+            members.discard(session_id)
 
-        self.__channels = {k: v for k, v in self.__channels.items() if len(v) > 0}
+            if not members:
+                del self.__channels[channel]
 
     @tolower(argname="channel")
     def join(self, session_id, channel):
@@ -66,6 +80,7 @@ class Broker(broker.Broker, di.Injected):
         members.add(session_id)
 
         self.__channels[channel] = members
+        self.__memberships.setdefault(session_id, set()).add(channel)
 
         return len(members) == 1
 
@@ -74,6 +89,8 @@ class Broker(broker.Broker, di.Injected):
         members = self.__channels.get(channel)
         members.remove(session_id)
 
+        self.__memberships[session_id].discard(channel)
+
         if not members:
             del self.__channels[channel]
 
@@ -83,33 +100,81 @@ class Broker(broker.Broker, di.Injected):
     def get_subscribers(self, channel):
         return self.__channels[channel]
 
+    @tolower(argname="channel")
+    def subscriber_count(self, channel):
+        return len(self.__channels.get(channel, ()))
+
     def get_channels(self, session_id):
-        return [k for k, v in self.__channels.items() if session_id in v]
+        return list(self.__memberships.get(session_id, ()))
 
     def deliver(self, receiver, message):
-        if receiver in self.__sessions:
-            self.__sessions[receiver](message)
-        else:
-            self.log.warning("Couldn't deliver message, session not registered.")
+        self.__deliver__(receiver, message, self.__sender__(message))
 
     @tolower(argname="channel")
     def to_channel_from(self, sender, channel, message):
         count = 0
 
+        msg_sender = self.__sender__(message)
+
         for session_id in self.__channels[channel]:
             if session_id != sender:
-                self.deliver(session_id, message)
+                self.__deliver__(session_id, message, msg_sender)
                 count += 1
 
+        self.__metrics.fanout(count)
+
         return count
 
     @tolower(argname="channel")
     def to_channel(self, channel, message):
+        msg_sender = self.__sender__(message)
+
         for session_id in self.__channels[channel]:
-            self.deliver(session_id, message)
+            self.__deliver__(session_id, message, msg_sender)
+
+        self.__metrics.fanout(len(self.__channels[channel]))
 
         return len(self.__channels[channel])
 
     def broadcast(self, message):
+        msg_sender = self.__sender__(message)
+
         for session_id in self.__sessions:
-            self.deliver(session_id, message)
+            self.__deliver__(session_id, message, msg_sender)
+
+        self.__metrics.fanout(len(self.__sessions))
+
+    def __sender__(self, message):
+        sender = None
+
+        if message.sender is not None and self.__session_store.get_hushing():
+            nick = message.sender.lower()
+            session_id = message.origin or self.__session_store.find_nick(nick)
+            site = None
+
+            if session_id:
+                site = self.__session_store.get(session_id).address.lower()
+
+            sender = Sender(session_id=session_id, nick=nick, site=site, public=(message.type_id == "b"))
+
+        return sender
+
+    def __deliver__(self, receiver, message, sender):
+        if receiver in self.__sessions:
+            if sender and self.__hushed__(receiver, sender):
+                if not sender.public and sender.session_id:
+                    self.deliver(sender.session_id, ltd.encode_status_msg("Bounce", "Message did not go trough."))
+            else:
+                self.__sessions[receiver](message)
+        else:
+            self.log.warning("Couldn't deliver message, session not registered.")
+
+    def __hushed__(self, receiver, sender):
+        hushed = False
+
+        if receiver in self.__session_store.get_hushing():
+            state = self.__session_store.get(receiver)
+
+            hushed = state.hushlist.hushed(sender.nick, sender.site, sender.public)
+
+        return hushed
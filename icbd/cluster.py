@@ -0,0 +1,427 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import logging
+import asyncio
+import struct
+import json
+import base64
+from datetime import datetime
+from enum import Enum
+import config
+import di
+import shutdown
+import url
+import timer
+import session
+import group
+import hush
+import notify
+
+ALL = 0xffff
+
+HEADER = struct.Struct("!IH")
+LENGTH = struct.Struct("!I")
+
+TYPES = {"%s.%s" % (T.__module__, T.__qualname__): T for T in (session.State,
+                                                               session.BeepMode,
+                                                               session.EchoMode,
+                                                               group.GroupInfo,
+                                                               group.Invitation,
+                                                               group.Visibility,
+                                                               group.Control,
+                                                               group.Volume,
+                                                               hush.Hushlist,
+                                                               hush.Entry,
+                                                               notify.Notifylist)}
+
+def encode(obj):
+    return json.dumps(pack(obj), separators=(",", ":")).encode()
+
+def decode(payload):
+    return json.loads(payload, object_hook=unpack)
+
+def pack(obj):
+    if isinstance(obj, Enum):
+        return {"t": "enum", "v": [type_name(obj), pack(obj.value)]}
+
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+
+    if isinstance(obj, list):
+        return [pack(v) for v in obj]
+
+    if isinstance(obj, tuple):
+        return {"t": "tuple", "v": [pack(v) for v in obj]}
+
+    if isinstance(obj, (set, frozenset)):
+        return {"t": "set", "v": [pack(v) for v in obj]}
+
+    if isinstance(obj, dict):
+        return {"t": "dict", "v": [[pack(k), pack(v)] for k, v in obj.items()]}
+
+    if isinstance(obj, bytes):
+        return {"t": "bytes", "v": base64.b64encode(obj).decode("ascii")}
+
+    if isinstance(obj, datetime):
+        return {"t": "datetime", "v": obj.isoformat()}
+
+    if isinstance(obj, timer.Timer):
+        return {"t": "timer", "v": obj.elapsed()}
+
+    return {"t": "object", "v": [type_name(obj), pack(obj.__dict__)]}
+
+def type_name(obj):
+    T = type(obj)
+
+    name = "%s.%s" % (T.__module__, T.__qualname__)
+
+    if TYPES.get(name) is not T:
+        raise TypeError("Unsupported type: %s" % name)
+
+    return name
+
+def unpack(m):
+    tag = m.get("t")
+    value = m.get("v")
+
+    if tag == "tuple":
+        return tuple(value)
+
+    if tag == "set":
+        return set(value)
+
+    if tag == "dict":
+        return {k: v for k, v in value}
+
+    if tag == "bytes":
+        return base64.b64decode(value)
+
+    if tag == "datetime":
+        return datetime.fromisoformat(value)
+
+    if tag == "timer":
+        return timer.Timer(value)
+
+    if tag in ("enum", "object"):
+        name, v = value
+
+        T = TYPES.get(name)
+
+        if not T or issubclass(T, Enum) != (tag == "enum"):
+            raise ValueError("Unsupported type: %s" % name)
+
+        if tag == "enum":
+            return T(v)
+
+        obj = T.__new__(T)
+
+        obj.__dict__.update(v)
+
+        return obj
+
+    raise ValueError("Unsupported tag: %s" % tag)
+
+class Clock:
+    def __init__(self, node_id):
+        self.__node_id = node_id
+        self.__counter = 0
+
+    def tick(self):
+        self.__counter += 1
+
+        return (self.__counter, self.__node_id)
+
+    def witness(self, stamp):
+        self.__counter = max(self.__counter, stamp[0])
+
+class PacketReader:
+    def __init__(self, header, listener):
+        self.__header = header
+        self.__listener = listener
+        self.__buffer = bytearray()
+
+    def write(self, data):
+        self.__buffer.extend(data)
+
+        offset = 0
+        size = len(self.__buffer)
+        header_size = self.__header.size
+
+        while size - offset >= header_size:
+            header = self.__header.unpack_from(self.__buffer, offset)
+
+            end = offset + header_size + header[0]
+
+            if end > size:
+                break
+
+            self.__listener(bytes(self.__buffer[offset + header_size:end]), *header[1:])
+
+            offset = end
+
+        del self.__buffer[:offset]
+
+class HubProtocol(asyncio.Protocol, di.Injected):
+    def __init__(self, hub):
+        asyncio.Protocol.__init__(self)
+        di.Injected.__init__(self)
+
+        self.__hub = hub
+        self.__node_id = None
+        self.__transport = None
+        self.__reader = PacketReader(HEADER, self.__packet_received__)
+
+    def inject(self, log: logging.Logger):
+        self.__log = log
+
+    @property
+    def node_id(self):
+        return self.__node_id
+
+    def connection_made(self, transport):
+        self.__transport = transport
+
+    def write(self, frames):
+        self.__transport.writelines(frames)
+
+    def data_received(self, data):
+        self.__reader.write(data)
+
+    def __packet_received__(self, payload, target):
+        if self.__node_id is None:
+            self.__node_id = target
+
+            self.__log.info("Cluster node %d connected.", self.__node_id)
+
+            self.__hub.attach(self)
+        else:
+            self.__hub.route(self, target, payload)
+
+    def connection_lost(self, ex):
+        if ex:
+            self.__log.info(ex)
+
+        if self.__node_id is not None:
+            self.__log.info("Cluster node %d disconnected.", self.__node_id)
+
+            self.__hub.detach(self)
+
+class Hub(di.Injected):
+    def inject(self, log: logging.Logger, config: config.Config):
+        self.__log = log
+        self.__config = config
+        self.__server = None
+        self.__nodes = {}
+        self.__closed = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+
+        self.__closed = loop.create_future()
+
+        self.__log.info("Starting cluster hub: %s", self.__config.server_cluster_binding)
+
+        binding = url.parse_server_address(self.__config.server_cluster_binding)
+
+        if binding["protocol"] == "unix":
+            self.__server = await loop.create_unix_server(lambda: HubProtocol(self), binding["path"])
+        else:
+            raise NotImplementedError("Unsupported protocol: %s", binding["protocol"])
+
+        await self.__server.start_serving()
+
+    def attach(self, node):
+        self.__nodes[node.node_id] = node
+
+        payload = encode(("cluster.node_joined", (node.node_id,)))
+
+        self.route(node, ALL, payload)
+
+    def detach(self, node):
+        if self.__nodes.get(node.node_id) is node:
+            del self.__nodes[node.node_id]
+
+            payload = encode(("cluster.node_lost", (node.node_id,)))
+
+            self.route(node, ALL, payload)
+
+        if not self.__nodes and not self.__closed.done():
+            self.__closed.set_result(None)
+
+    def route(self, source, target, payload):
+        frames = (LENGTH.pack(len(payload)), payload)
+
+        if target == ALL:
+            for node in self.__nodes.values():
+                if node is not source:
+                    node.write(frames)
+        else:
+            node = self.__nodes.get(target)
+
+            if node:
+                node.write(frames)
+
+    async def wait_closed(self):
+        await self.__closed
+
+    async def close(self):
+        self.__log.info("Stopping cluster hub.")
+
+        self.__server.close()
+
+        await self.__server.wait_closed()
+
+class NodeProtocol(asyncio.Protocol):
+    def __init__(self, listener, on_conn_lost):
+        self.__reader = PacketReader(LENGTH, listener)
+        self.__on_conn_lost = on_conn_lost
+
+    def data_received(self, data):
+        self.__reader.write(data)
+
+    def connection_lost(self, ex):
+        self.__on_conn_lost.set_result(ex)
+
+class Node(di.Injected):
+    def __init__(self, node_id):
+        self.__id = node_id
+
+        di.Injected.__init__(self)
+
+    def inject(self, log: logging.Logger, config: config.Config):
+        self.__log = log
+        self.__config = config
+        self.__transport = None
+        self.__listeners = {}
+        self.__pending = []
+        self.__flush_handle = None
+        self.__on_conn_lost = None
+
+    @property
+    def id(self):
+        return self.__id
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+
+        self.__on_conn_lost = loop.create_future()
+
+        binding = url.parse_server_address(self.__config.server_cluster_binding)
+
+        if binding["protocol"] == "unix":
+            self.__transport, _ = await loop.create_unix_connection(lambda: NodeProtocol(self.__packet_received__,
+                                                                                         self.__on_conn_lost),
+                                                                    binding["path"])
+        else:
+            raise NotImplementedError("Unsupported protocol: %s", binding["protocol"])
+
+        self.__log.info("Connected to cluster hub as node %d.", self.__id)
+
+        self.__transport.write(HEADER.pack(0, self.__id))
+
+        self.__flush__()
+
+        return self.__on_conn_lost
+
+    def add_listener(self, event, listener):
+        self.__listeners.setdefault(event, []).append(listener)
+
+    def publish(self, event, *args, target=ALL):
+        payload = encode((event, args))
+
+        self.__pending.append(HEADER.pack(len(payload), target))
+        self.__pending.append(payload)
+
+        if self.__transport and not self.__flush_handle:
+            loop = asyncio.get_running_loop()
+
+            self.__flush_handle = loop.call_soon(self.__flush__)
+
+    def __flush__(self):
+        self.__flush_handle = None
+
+        if self.__pending and not self.__transport.is_closing():
+            self.__transport.writelines(self.__pending)
+
+        self.__pending = []
+
+    def __packet_received__(self, payload):
+        try:
+            event, args = decode(payload)
+        except (ValueError, TypeError) as ex:
+            self.__log.warning("Discarding malformed cluster packet: %s", ex)
+
+            return
+
+        for l in self.__listeners.get(event, ()):
+            l(*args)
+
+    def close(self):
+        if self.__transport:
+            if self.__flush_handle:
+                self.__flush_handle.cancel()
+
+                self.__flush__()
+
+            self.__transport.close()
+
+class ShutdownRelay(shutdown.ShutdownListener, di.Injected):
+    def inject(self, shutdown: shutdown.Shutdown, node: Node):
+        self.__shutdown = shutdown
+        self.__node = node
+        self.__remote = False
+
+        self.__shutdown.add_listener(self)
+
+        node.add_listener("shutdown.request", self.__request__)
+        node.add_listener("shutdown.cancel", self.__cancel__)
+
+    def shutdown(self, delay, restart):
+        if not self.__remote:
+            self.__node.publish("shutdown.request", delay, restart)
+
+    def cancel_shutdown(self):
+        if not self.__remote:
+            self.__node.publish("shutdown.cancel")
+
+    def __request__(self, delay, restart):
+        self.__remote = True
+
+        try:
+            if restart:
+                self.__shutdown.restart(delay)
+            else:
+                self.__shutdown.halt(delay)
+        finally:
+            self.__remote = False
+
+    def __cancel__(self):
+        self.__remote = True
+
+        try:
+            self.__shutdown.cancel()
+        finally:
+            self.__remote = False
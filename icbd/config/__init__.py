@@ -34,11 +34,28 @@ class Config:
     server_unsecure_login: bool = False
     server_max_logins: int = 500
     server_ipc_binding: str = "unix:///tmp/fuchsschwanz.sock"
+    server_output_high_watermark: int = 65536
+    server_output_low_watermark: int = 16384
+    server_output_queue_limit: int = 262144
+    server_output_slow_consumer_policy: str = "drop"
+    server_cluster_workers: int = 1
+    server_cluster_binding: str = "unix:///tmp/fuchsschwanz-cluster.sock"
+    server_loop_policy: str = "asyncio"
+    server_socket_backlog: int = 100
+    server_socket_tcp_no_delay: bool = True
+    server_socket_send_buffer: int = 0
+    server_socket_receive_buffer: int = 0
     server_bridges: List[Dict[str, object]] = field(default_factory=list)
     bindings: List[str] = field(default_factory=list)
     logging_verbosity: core.Verbosity = core.Verbosity.INFO
+    metrics_binding: str = "unix:///tmp/fuchsschwanz-metrics.sock"
+    metrics_loop_interval: float = 1.0
     database_filename: str = None
     database_cleanup_interval: float = 3600
+    database_readers: int = 0
+    database_nick_cache_size: int = 4194304
+    stats_enabled: bool = True
+    stats_flush_interval: float = 10.0
     mbox_limit: int = 25
     timeouts_connection: float = 120.0
     timeouts_ping: float = 45.0
@@ -51,11 +68,20 @@ class Config:
     timeouts_confirmation_code: float = 1800.0
     timeouts_password_reset_request: float = 60.0
     timeouts_password_reset_code: float = 1800.0
+    resolver_timeout: float = 5.0
+    resolver_workers: int = 4
+    resolver_cache_size: int = 4096
+    resolver_ttl: float = 3600.0
+    resolver_negative_ttl: float = 300.0
     mail_ttl: int = 480
     mail_max_errors: int = 3
     mail_interval: int = 60.0
     mail_retry_timeout: int = 120
     mail_cleanup_interval: int = 900
+    mail_lease_timeout: int = 300
+    mail_workers: int = 4
+    mail_min_backoff: float = 5.0
+    mail_max_backoff: float = 300.0
     smtp_hostname: str = "127.0.0.1"
     smtp_port: int = 25
     smtp_ssl_enabled: bool = False
@@ -63,6 +89,8 @@ class Config:
     smtp_sender: str = "root@localhost"
     smtp_username: str = None
     smtp_password: str = None
+    smtp_timeout: float = 30.0
+    smtp_idle_timeout: float = 60.0
     avatar_directory: str = "avatars"
     avatar_max_file_size: int = 1024*2048
     avatar_max_width: int = 2048
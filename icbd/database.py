@@ -23,6 +23,8 @@
     ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
     OTHER DEALINGS IN THE SOFTWARE.
 """
+import asyncio
+from concurrent.futures import Future
 
 class TransactionScope():
     def __init__(self, connection):
@@ -47,6 +49,10 @@ class TransactionScope():
     def complete(self):
         self.__completed = True
 
+    @property
+    def completed(self):
+        return self.__completed
+
     def add_listener(self, listener):
         self.__listener.append(listener)
 
@@ -62,6 +68,7 @@ class TransactionScope():
 class Connection():
     def __init__(self):
         self.__scope = None
+        self.__scope_listeners = []
 
     def __enter__(self):
         return self
@@ -76,8 +83,35 @@ class Connection():
         self.__scope = self.__create_transaction_scope__()
         self.__scope.add_listener(self)
 
+        self.__scope_created__(self.__scope)
+
         return self.__scope
 
+    def add_scope_listener(self, listener):
+        self.__scope_listeners.append(listener)
+
+    def __scope_created__(self, scope):
+        for l in self.__scope_listeners:
+            scope.add_listener(l)
+
+    def submit(self, fn, readonly=False):
+        future = Future()
+
+        try:
+            with self.enter_scope() as scope:
+                result = fn(scope)
+
+                scope.complete()
+
+            future.set_result(result)
+        except Exception as ex:
+            future.set_exception(ex)
+
+        return future
+
+    async def run(self, fn, readonly=False):
+        return await asyncio.wrap_future(self.submit(fn, readonly))
+
     def __create_transaction_scope__(self): return None
 
     def close(self): pass
@@ -24,31 +24,71 @@
     OTHER DEALINGS IN THE SOFTWARE.
 """
 import inspect
+from enum import Enum
+
+class Lifetime(Enum):
+    TRANSIENT = 0
+    SINGLETON = 1
 
 class Container:
     def __init__(self):
         self.__m = {}
+        self.__factories = {}
+        self.__singletons = {}
 
     def register(self, T, obj):
         self.__m[T] = obj
 
+    def register_factory(self, T, factory, lifetime=Lifetime.TRANSIENT):
+        self.__factories[T] = (factory, lifetime)
+        self.__singletons.pop(T, None)
+
+    def registered(self, T):
+        return T in self.__m or T in self.__factories
+
     def resolve(self, T):
+        if T not in self.__m:
+            return self.__create__(T)
+
         obj = self.__m[T]
 
         return obj() if callable(obj) else obj
 
+    def __create__(self, T):
+        factory, lifetime = self.__factories[T]
+
+        if lifetime == Lifetime.SINGLETON:
+            obj = self.__singletons.get(T)
+
+            if obj is None:
+                obj = factory()
+
+                self.__singletons[T] = obj
+        else:
+            obj = factory()
+
+        return obj
+
     def clear(self):
         self.__m.clear()
+        self.__factories.clear()
+        self.__singletons.clear()
 
 default_container = Container()
 
-class Injected:
-    def __init__(self, container=default_container):
-        spec = inspect.getfullargspec(self.inject)
-        vals = []
+__plans = {}
+
+def plan(cls):
+    args = __plans.get(cls)
 
-        for arg in spec.args[1:]:
-            T = spec.annotations[arg]
-            vals.append(container.resolve(T))
+    if args is None:
+        spec = inspect.getfullargspec(cls.inject)
+        args = tuple(spec.annotations[arg] for arg in spec.args[1:])
 
-        self.inject(*vals)
+        __plans[cls] = args
+
+    return args
+
+class Injected:
+    def __init__(self, container=default_container):
+        self.inject(*[container.resolve(T) for T in plan(self.__class__)])
@@ -0,0 +1,84 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import group.memory
+import cluster
+import di
+
+class Store(group.memory.Store, di.Injected):
+    def __init__(self):
+        group.memory.Store.__init__(self)
+        di.Injected.__init__(self)
+
+    def inject(self, node: cluster.Node):
+        self.__node = node
+        self.__clock = cluster.Clock(node.id)
+        self.__stamps = {}
+
+        node.add_listener("group.update", self.__remote_update__)
+        node.add_listener("group.delete", self.__remote_delete__)
+        node.add_listener("cluster.node_joined", self.__node_joined__)
+
+    def update(self, info):
+        stamp = self.__clock.tick()
+
+        self.__stamps[info.key] = stamp
+
+        super().update(info)
+
+        self.__node.publish("group.update", info, stamp)
+
+    def delete(self, id):
+        stamp = self.__clock.tick()
+
+        self.__stamps[id] = stamp
+
+        super().delete(id)
+
+        self.__node.publish("group.delete", id, stamp)
+
+    def __remote_update__(self, info, stamp):
+        self.__clock.witness(stamp)
+
+        if stamp > self.__stamps.get(info.key, (0, 0)):
+            self.__stamps[info.key] = stamp
+
+            group.memory.Store.update(self, info)
+
+    def __remote_delete__(self, id, stamp):
+        self.__clock.witness(stamp)
+
+        if stamp > self.__stamps.get(id, (0, 0)):
+            self.__stamps[id] = stamp
+
+            if self.exists(id):
+                group.memory.Store.delete(self, id)
+
+    def __node_joined__(self, node_id):
+        for info in self.get_groups():
+            stamp = self.__stamps.get(info.key)
+
+            if stamp and stamp[1] == self.__node.id:
+                self.__node.publish("group.update", info, stamp, target=node_id)
@@ -93,6 +93,18 @@ class Hushlist:
 
         return getattr(entry, "public" if public else "private")
 
+    def hushed(self, nick, site, public):
+        attr = "public" if public else "private"
+
+        entry = self.__nicks.get(nick)
+        hushed = bool(entry and getattr(entry, attr))
+
+        if not hushed and site:
+            entry = self.__sites.get(site)
+            hushed = bool(entry and getattr(entry, attr))
+
+        return hushed
+
     @property
     def nicks(self):
         return sorted(self.__nicks.values(), key=lambda e: e.display_name.lower())
@@ -39,23 +39,33 @@ import config
 import config.json
 import log
 import di
+import eventloop
+import metrics
 from process import Process
 import ipc
 import network
+import messages
 import session
 import session.memory
+import session.cluster
 import broker
 import broker.memory
+import broker.cluster
+import cluster
 import shutdown
 import reputation
 import reputation.memory
 import group
 import group.memory
+import group.cluster
 import sqlite
 import nickdb
 import nickdb.sqlite
+import nickdb.cache
 import statsdb
 import statsdb.sqlite
+import statsdb.aggregate
+import statsdb.void
 import confirmation
 import confirmation.sqlite
 import passwordreset
@@ -76,6 +86,9 @@ import avatar.sqlite
 import ipfilter
 import ipfilter.sqlite
 import ipfilter.cache
+import resolver
+import resolver.system
+import resolver.cache
 import ltd
 import dateutils
 
@@ -129,8 +142,22 @@ class AvatarProcess(Process, di.Injected, avatar.WriterListener):
 
         self.broadcast("put")
 
+class WorkerProcess(Process):
+    def __init__(self, node_id):
+        Process.__init__(self, "worker-%d" % node_id, capture_output=False)
+
+        self.__node_id = node_id
+
+    def __build_args__(self, argv):
+        return [sys.executable,
+                os.path.abspath(__file__),
+                "--config", argv["config"],
+                "--data-dir", argv["data_dir"],
+                "--worker", str(self.__node_id)]
+
 async def run_services(opts):
     data_dir = opts.get("data_dir")
+    worker = opts.get("worker")
 
     mapping = config.json.load(opts["config"])
     preferences = config.from_mapping(mapping)
@@ -141,11 +168,19 @@ async def run_services(opts):
 
     registry.register(logger)
 
-    logger.info("Starting server process with pid %d.", os.getpid())
+    if worker is None:
+        logger.info("Starting server process with pid %d.", os.getpid())
+    else:
+        logger.info("Starting worker %d with pid %d.", worker, os.getpid())
+
+    if not eventloop.is_available(preferences.server_loop_policy):
+        logger.warning("Event loop policy '%s' not available, using asyncio.", preferences.server_loop_policy)
+
+    logger.info("Event loop: %s", eventloop.name(asyncio.get_running_loop()))
 
     container = di.default_container
 
-    connection = sqlite.Connection(preferences.database_filename)
+    connection = sqlite.Connection(preferences.database_filename, readers=preferences.database_readers)
 
     ipfilter_storage = ipfilter.sqlite.Storage()
     ipfilter_cached = ipfilter.cache.Storage(ipfilter_storage)
@@ -156,17 +191,43 @@ async def run_services(opts):
     container.register(ipc.Broadcast, ipc.Broadcast())
     container.register(shutdown.Shutdown, shutdown.Shutdown())
     container.register(ipfilter.Connection, connection)
-    container.register(ipfilter.Storage, ipfilter_cached)
-    container.register(broker.Broker, broker.memory.Broker())
-    container.register(session.Store, session.memory.Store())
+    container.register(metrics.Metrics, metrics.Metrics())
+
+    connection.add_scope_listener(container.resolve(metrics.Metrics))
+
+    if worker is None:
+        container.register(ipfilter.Storage, ipfilter_cached)
+        container.register(nickdb.NickDb, nickdb.cache.NickDb(nickdb.sqlite.NickDb(), preferences.database_nick_cache_size))
+        container.register(session.Store, session.memory.Store())
+        container.register(broker.Broker, broker.memory.Broker())
+        container.register(group.Store, group.memory.Store())
+    else:
+        container.register(ipfilter.Storage, ipfilter_storage)
+        container.register(nickdb.NickDb, nickdb.sqlite.NickDb())
+        container.register(cluster.Node, cluster.Node(worker))
+        container.register(session.Store, session.cluster.Store())
+        container.register(broker.Broker, broker.cluster.Broker())
+        container.register(group.Store, group.cluster.Store())
+
     container.register(session.AwayTimeoutTable, timer.TimeoutTable())
     container.register(session.NotificationTimeoutTable, timer.TimeoutTable())
+    container.register(timer.Scheduler, timer.Scheduler())
     container.register(reputation.Reputation, reputation.memory.Reputation())
-    container.register(group.Store, group.memory.Store())
+    container.register(resolver.Resolver, resolver.cache.Resolver(resolver.system.Resolver(preferences.resolver_timeout,
+                                                                                           preferences.resolver_workers),
+                                                                  preferences.resolver_cache_size,
+                                                                  preferences.resolver_ttl,
+                                                                  preferences.resolver_negative_ttl))
     container.register(nickdb.Connection, connection)
-    container.register(nickdb.NickDb, nickdb.sqlite.NickDb())
     container.register(statsdb.Connection, connection)
-    container.register(statsdb.StatsDb, statsdb.sqlite.StatsDb())
+
+    if not preferences.stats_enabled:
+        container.register(statsdb.StatsDb, statsdb.void.StatsDb())
+    elif preferences.stats_flush_interval > 0:
+        container.register(statsdb.StatsDb, statsdb.aggregate.StatsDb(statsdb.sqlite.StatsDb()))
+    else:
+        container.register(statsdb.StatsDb, statsdb.sqlite.StatsDb())
+
     container.register(confirmation.Connection, connection)
     container.register(confirmation.Confirmation, confirmation.sqlite.Confirmation())
     container.register(passwordreset.Connection, connection)
@@ -192,6 +253,8 @@ async def run_services(opts):
 
         container.register(avatar.Storage, avatar.void.Storage())
 
+    container.register(messages.Registry, messages.Registry())
+
     with connection.enter_scope() as scope:
         container.resolve(ipfilter.Storage).setup(scope)
         container.resolve(nickdb.NickDb).setup(scope)
@@ -206,10 +269,33 @@ async def run_services(opts):
 
     container.resolve(avatar.Storage).setup()
 
+    if worker is not None:
+        exit_code = await run_worker(worker)
+    elif preferences.server_cluster_workers > 1:
+        exit_code = await run_master(opts, preferences.server_cluster_workers)
+    else:
+        exit_code = await run_server(opts)
+
+    with connection.enter_scope() as scope:
+        container.resolve(statsdb.StatsDb).flush(scope)
+
+        scope.complete()
+
+    connection.close()
+
+    sys.exit(exit_code)
+
+async def run_server(opts):
+    container = di.default_container
+
+    logger = container.resolve(logging.Logger)
+
     bus = ipc.Bus()
 
     await bus.start()
 
+    exporter = await start_exporter(container.resolve(config.Config).metrics_binding)
+
     if os.name == "posix":
         loop = asyncio.get_event_loop()
 
@@ -238,25 +324,145 @@ async def run_services(opts):
 
     await bus.close()
 
+    if exporter:
+        await exporter.close()
+
     for p in processes:
         p.exit()
 
     logger.info("Server stopped.")
 
+    signoff_server()
+
+    return server.exit_code if not failed else core.EXIT_FAILURE
+
+async def run_master(opts, workers):
+    container = di.default_container
+
+    logger = container.resolve(logging.Logger)
+
+    bus = ipc.Bus()
+
+    await bus.start()
+
+    hub = cluster.Hub()
+
+    await hub.start()
+
+    loop = asyncio.get_event_loop()
+
+    stopped = loop.create_future()
+
+    if os.name == "posix":
+        loop.add_signal_handler(signal.SIGINT, lambda: stopped.done() or stopped.set_result(None))
+        loop.add_signal_handler(signal.SIGTERM, lambda: stopped.done() or stopped.set_result(None))
+
+    processes = [MailProcess()]
+
+    if avatar.is_available():
+        processes.append(AvatarProcess())
+
+    asyncio.gather(*[p.spawn(opts) for p in processes])
+
+    nodes = [WorkerProcess(i) for i in range(workers)]
+
+    await asyncio.gather(*[p.spawn(opts) for p in nodes])
+
+    await asyncio.wait([loop.create_task(hub.wait_closed()), stopped], return_when=asyncio.FIRST_COMPLETED)
+
+    if stopped.done():
+        for p in nodes:
+            p.terminate()
+
+    exit_codes = [p.exit() for p in nodes]
+
+    await hub.close()
+    await bus.close()
+
+    for p in processes:
+        p.exit()
+
+    logger.info("Cluster stopped.")
+
+    signoff_server()
+
+    return exit_codes[0] if exit_codes[0] is not None else core.EXIT_FAILURE
+
+async def run_worker(worker):
+    container = di.default_container
+
+    logger = container.resolve(logging.Logger)
+
+    node = container.resolve(cluster.Node)
+
+    conn_lost = await node.connect()
+
+    cluster.ShutdownRelay()
+
+    binding = container.resolve(config.Config).metrics_binding
+
+    exporter = await start_exporter("%s.%d" % (binding, worker) if binding else binding)
+
+    server = None
+    failed = False
+
+    try:
+        server = network.Server()
+
+        if os.name == "posix":
+            loop = asyncio.get_event_loop()
+
+            loop.add_signal_handler(signal.SIGINT, server.close)
+            loop.add_signal_handler(signal.SIGTERM, server.close)
+
+        conn_lost.add_done_callback(lambda _: server.close())
+
+        await server.run(primary=(worker == 0))
+    except asyncio.CancelledError:
+        pass
+    except:
+        logger.warning(traceback.format_exc())
+
+        failed = True
+
+    node.close()
+
+    if exporter:
+        await exporter.close()
+
+    logger.info("Worker %d stopped.", worker)
+
+    return server.exit_code if server and not failed else core.EXIT_FAILURE
+
+async def start_exporter(binding):
+    exporter = None
+
+    if binding:
+        exporter = metrics.Exporter(binding)
+
+        await exporter.start()
+
+    return exporter
+
+def signoff_server():
+    container = di.default_container
+
     with container.resolve(nickdb.Connection).enter_scope() as scope:
         container.resolve(nickdb.NickDb).set_signoff(scope, core.NICKSERV, dateutils.now())
 
         scope.complete()
 
-    sys.exit(server.exit_code if not failed else core.EXIT_FAILURE)
-
 def run(opts):
+    preferences = config.from_mapping(config.json.load(opts["config"]))
+
+    eventloop.select(preferences.server_loop_policy)
+
     asyncio.run(run_services(opts))
 
 def get_opts(argv):
-    options, _ = getopt.getopt(argv, 'c:d:', ['config=', 'data-dir=', 'auto-respawn'])
+    options, _ = getopt.getopt(argv, 'c:d:', ['config=', 'data-dir=', 'auto-respawn', 'worker='])
 
-    m = {"auto-respawn": False}
+    m = {"auto-respawn": False, "worker": None}
 
     for opt, arg in options:
         if opt in ('-c', '--config'):
@@ -265,6 +471,8 @@ def get_opts(argv):
             m["data_dir"] = arg
         elif opt in ('--auto-respawn',):
             m["auto-respawn"] = True
+        elif opt in ('--worker',):
+            m["worker"] = int(arg)
 
     if not m.get("config"):
         raise getopt.GetoptError("--config option is mandatory")
@@ -278,26 +486,31 @@ if __name__ == "__main__":
     try:
         opts = get_opts(sys.argv[1:])
 
-        spawn = True
+        if opts["worker"] is not None:
+            run(opts)
+        else:
+            spawn = True
 
-        while spawn:
-            p = multiprocessing.Process(target=run, args=(opts,))
+            while spawn:
+                p = multiprocessing.Process(target=run, args=(opts,))
 
-            p.start()
-            p.join()
+                p.start()
+                p.join()
 
-            if p.exitcode != core.EXIT_RESTART:
-                if p.exitcode == core.EXIT_SUCCESS or not opts["auto-respawn"]:
-                    spawn = False
-                else:
-                    for _ in range(10):
-                        sys.stdout.write(".")
-                        sys.stdout.flush()
-                        time.sleep(1)
+                if p.exitcode != core.EXIT_RESTART:
+                    if p.exitcode == core.EXIT_SUCCESS or not opts["auto-respawn"]:
+                        spawn = False
+                    else:
+                        for _ in range(10):
+                            sys.stdout.write(".")
+                            sys.stdout.flush()
+                            time.sleep(1)
 
-                    sys.stdout.write("\n")
+                        sys.stdout.write("\n")
 
     except getopt.GetoptError as ex:
         print(str(ex))
+    except SystemExit:
+        raise
     except:
         traceback.print_exc()
@@ -167,7 +167,7 @@ class MessageQueue:
 
         return self.__msgs.pop(0)
 
-class IPCClientProtocol(asyncio.Protocol):
+class IPCClientProtocol(asyncio.BufferedProtocol):
     def __init__(self, on_conn_lost, queue):
         self.__on_conn_lost = on_conn_lost
         self.__transport = None
@@ -178,9 +178,12 @@ class IPCClientProtocol(asyncio.Protocol):
     def connection_made(self, transport):
         self.__transport = transport
 
-    def data_received(self, data):
+    def get_buffer(self, sizehint):
+        return self.__decoder.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
         try:
-            self.__decoder.write(data)
+            self.__decoder.buffer_updated(nbytes)
 
         except Exception as ex:
             self.__shutdown__(ex)
@@ -192,7 +195,7 @@ class IPCClientProtocol(asyncio.Protocol):
         self.__on_conn_lost.set_result(ex)
 
     def __message_received__(self, type_id, payload):
-        self.__queue.put_nowait((type_id, payload))
+        self.__queue.put_nowait((type_id, bytes(payload)))
 
 class Client:
     def __init__(self, address):
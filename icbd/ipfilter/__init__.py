@@ -56,6 +56,14 @@ class Factory:
 
             return Factory.__loginid_equals__(self.__loginid, loginid) and ipaddress.ip_address(address) in self.__network
 
+        @property
+        def loginid(self):
+            return self.__loginid
+
+        @property
+        def network(self):
+            return self.__network
+
     class Address(Filter):
         def __init__(self, expr):
             Filter.__init__(self, expr)
@@ -70,6 +78,14 @@ class Factory:
 
             return Factory.__loginid_equals__(self.__loginid, loginid) and ipaddress.ip_address(address) == self.__ip
 
+        @property
+        def loginid(self):
+            return self.__loginid
+
+        @property
+        def address(self):
+            return self.__ip
+
     @staticmethod
     def create(expr):
         parts = expr.split("@", 1)
@@ -127,6 +143,11 @@ class Storage:
     def deny_filter_exists(self, scope, expr):
         raise NotImplementedError
 
+    def is_denied(self, scope, loginid, address):
+        login = "%s@%s" % (loginid, address)
+
+        return any(f.matches(login) for f, _ in self.load_deny_filters(scope))
+
     def remove(self, scope, expr):
         raise NotImplementedError
 
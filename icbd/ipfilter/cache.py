@@ -23,62 +23,209 @@
     ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
     OTHER DEALINGS IN THE SOFTWARE.
 """
-import ipfilter
-import dateutils
-from textutils import tolower
-
-class Storage(ipfilter.Storage):
-    def __init__(self, storage):
-        self.__storage = storage
-        self.__deny = {}
-
-    def setup(self, scope):
-        self.__storage.setup(scope)
-
-        self.__reload__(scope)
-
-    def load_deny_filters(self, scope):
-        return [t for t in self.__deny.values() if t[1] == -1 or t[1] >= dateutils.timestamp()]
-
-    def deny_until(self, scope, filter, timestamp):
-        self.__storage.deny_until(scope, filter, timestamp)
-
-        if filter.expression in self.__deny:
-            self.__deny[filter.expression][1] = timestamp
-        else:
-            self.__deny[filter.expression] = [filter, timestamp]
-
-    @tolower(argname="expr")
-    def deny_filter_exists(self, scope, expr):
-        exists = False
-
-        try:
-            lifetime = self.__deny[expr][1]
-
-            exists = lifetime == -1 or lifetime >= dateutils.timestamp()
-        except KeyError:
-            pass
-
-        return exists
-
-    @tolower(argname="expr")
-    def remove(self, scope, expr):
-        try:
-            del self.__deny[expr]
-        except KeyError:
-            pass
-
-        self.__storage.remove(scope, expr)
-
-    def flush(self, scope):
-        self.__storage.flush(scope)
-
-        self.__deny = {}
-
-    def cleanup(self, scope):
-        self.__reload__(scope)
-
-    def __reload__(self, scope):
-        self.__storage.cleanup(scope)
-
-        self.__deny = {f.expression: [f, l] for f, l in self.__storage.load_deny_filters(scope)}
+import heapq
+import ipaddress
+import ipfilter
+import dateutils
+from textutils import tolower
+
+class Trie:
+    def __init__(self, bits):
+        self.__bits = bits
+        self.__root = [None, None, None]
+
+    def add(self, network, loginid, expression):
+        node = self.__root
+        value = int(network.network_address)
+
+        for i in range(network.prefixlen):
+            bit = (value >> (self.__bits - i - 1)) & 1
+
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+
+            node = node[bit]
+
+        if node[2] is None:
+            node[2] = {}
+
+        node[2].setdefault(loginid, set()).add(expression)
+
+    def remove(self, network, loginid, expression):
+        path = []
+        node = self.__root
+        value = int(network.network_address)
+
+        for i in range(network.prefixlen):
+            bit = (value >> (self.__bits - i - 1)) & 1
+
+            path.append((node, bit))
+
+            node = node[bit]
+
+            if node is None:
+                return
+
+        if node[2] and loginid in node[2]:
+            node[2][loginid].discard(expression)
+
+            if not node[2][loginid]:
+                del node[2][loginid]
+
+            if not node[2]:
+                node[2] = None
+
+            while path and node[0] is None and node[1] is None and node[2] is None:
+                node, bit = path.pop()
+                node[bit] = None
+
+    def matches(self, address, loginid):
+        node = self.__root
+        value = int(address)
+        i = self.__bits
+
+        while node:
+            entries = node[2]
+
+            if entries and (None in entries or loginid in entries):
+                return True
+
+            i -= 1
+
+            if i < 0:
+                break
+
+            node = node[(value >> i) & 1]
+
+        return False
+
+class Index:
+    def __init__(self):
+        self.__addresses = {}
+        self.__networks = {4: Trie(32), 6: Trie(128)}
+
+    def add(self, filter):
+        loginid = filter.loginid or None
+
+        if isinstance(filter, ipfilter.Factory.Network):
+            self.__networks[filter.network.version].add(filter.network, loginid, filter.expression)
+        else:
+            self.__addresses.setdefault(filter.address, {}).setdefault(loginid, set()).add(filter.expression)
+
+    def remove(self, filter):
+        loginid = filter.loginid or None
+
+        if isinstance(filter, ipfilter.Factory.Network):
+            self.__networks[filter.network.version].remove(filter.network, loginid, filter.expression)
+        else:
+            entries = self.__addresses.get(filter.address)
+
+            if entries and loginid in entries:
+                entries[loginid].discard(filter.expression)
+
+                if not entries[loginid]:
+                    del entries[loginid]
+
+                if not entries:
+                    del self.__addresses[filter.address]
+
+    def matches(self, loginid, address):
+        loginid = loginid.lower() if loginid else ""
+        address = ipaddress.ip_address(address)
+
+        entries = self.__addresses.get(address)
+
+        if entries and (None in entries or loginid in entries):
+            return True
+
+        return self.__networks[address.version].matches(address, loginid)
+
+class Storage(ipfilter.Storage):
+    def __init__(self, storage):
+        self.__storage = storage
+        self.__deny = {}
+        self.__index = Index()
+        self.__lifetimes = []
+
+    def setup(self, scope):
+        self.__storage.setup(scope)
+
+        self.__reload__(scope)
+
+    def load_deny_filters(self, scope):
+        self.__expire__()
+
+        return [tuple(t) for t in self.__deny.values()]
+
+    def is_denied(self, scope, loginid, address):
+        self.__expire__()
+
+        return self.__index.matches(loginid, address)
+
+    def deny_until(self, scope, filter, timestamp):
+        self.__storage.deny_until(scope, filter, timestamp)
+
+        if filter.expression in self.__deny:
+            self.__deny[filter.expression][1] = timestamp
+        else:
+            self.__deny[filter.expression] = [filter, timestamp]
+
+            self.__index.add(filter)
+
+        if timestamp != -1:
+            heapq.heappush(self.__lifetimes, (timestamp, filter.expression))
+
+    @tolower(argname="expr")
+    def deny_filter_exists(self, scope, expr):
+        self.__expire__()
+
+        return expr in self.__deny
+
+    @tolower(argname="expr")
+    def remove(self, scope, expr):
+        self.__drop__(expr)
+
+        self.__storage.remove(scope, expr)
+
+    def flush(self, scope):
+        self.__storage.flush(scope)
+
+        self.__deny = {}
+        self.__index = Index()
+        self.__lifetimes = []
+
+    def cleanup(self, scope):
+        self.__reload__(scope)
+
+    def __reload__(self, scope):
+        self.__storage.cleanup(scope)
+
+        self.__deny = {}
+        self.__index = Index()
+        self.__lifetimes = []
+
+        for f, l in self.__storage.load_deny_filters(scope):
+            self.__deny[f.expression] = [f, l]
+            self.__index.add(f)
+
+            if l != -1:
+                self.__lifetimes.append((l, f.expression))
+
+        heapq.heapify(self.__lifetimes)
+
+    def __expire__(self):
+        now = dateutils.timestamp()
+
+        while self.__lifetimes and self.__lifetimes[0][0] < now:
+            lifetime, expr = heapq.heappop(self.__lifetimes)
+
+            entry = self.__deny.get(expr)
+
+            if entry and entry[1] == lifetime:
+                self.__drop__(expr)
+
+    def __drop__(self, expr):
+        entry = self.__deny.pop(expr, None)
+
+        if entry:
+            self.__index.remove(entry[0])
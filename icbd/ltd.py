@@ -23,11 +23,36 @@
     ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
     OTHER DEALINGS IN THE SOFTWARE.
 """
+import textutils
+
+class Frame(bytes):
+    def __new__(cls, data, type_id, sender=None, origin=None):
+        frame = super().__new__(cls, data)
+
+        frame.__type_id = type_id
+        frame.__sender = sender
+        frame.__origin = origin
+
+        return frame
+
+    @property
+    def type_id(self):
+        return self.__type_id
+
+    @property
+    def sender(self):
+        return self.__sender
+
+    @property
+    def origin(self):
+        return self.__origin
 
 class Encoder:
-    def __init__(self, T):
+    def __init__(self, T, origin=None):
         self.__T = T
+        self.__origin = origin
         self.__d = bytearray()
+        self.__head = None
 
     def add_field(self, data):
         if self.__d:
@@ -36,22 +61,21 @@ class Encoder:
         self.__d.extend(data)
 
     def add_field_str(self, text, append_null=False):
+        if self.__head is None:
+            self.__head = text
+
         self.add_field(text.encode("UTF-8", "backslashreplace"))
 
         if append_null:
             self.__d.append(0)
 
     def encode(self):
-        pkg = bytearray()
-
         if len(self.__d) >= 255:
             raise OverflowError
 
-        pkg.append(len(self.__d) + 1)
-        pkg.append(ord(self.__T))
-        pkg.extend(self.__d)
+        sender = self.__head if self.__T in ("b", "c") else None
 
-        return pkg
+        return Frame(bytes((len(self.__d) + 1, ord(self.__T))) + self.__d, self.__T, sender, self.__origin)
 
 def encode_str(T, text):
     e = Encoder(T)
@@ -85,8 +109,13 @@ def encode_co_output(text, msgid=""):
     return e.encode()
 
 class Decoder:
-    def __init__(self):
-        self.__buffer = bytearray()
+    def __init__(self, capacity=65536):
+        if capacity < 512:
+            raise ValueError("Buffer capacity too small.")
+
+        self.__buffer = bytearray(capacity)
+        self.__view = memoryview(self.__buffer)
+        self.__length = 0
         self.__listeners = []
 
     def add_listener(self, listener):
@@ -95,36 +124,99 @@ class Decoder:
     def remove_listener(self, listener):
         self.__listeners.remove(listener)
 
-    def write(self, data):
-        self.__buffer.extend(data)
+    def get_buffer(self, sizehint=-1):
+        return self.__view[self.__length:]
+
+    def buffer_updated(self, nbytes):
+        self.__length += nbytes
         self.__process__()
 
+    def write(self, data):
+        offset = 0
+
+        while offset < len(data):
+            n = min(len(data) - offset, len(self.__buffer) - self.__length)
+
+            self.__buffer[self.__length:self.__length + n] = data[offset:offset + n]
+            self.buffer_updated(n)
+
+            offset += n
+
     def __process__(self):
-        length = len(self.__buffer)
+        view = self.__view
+        length = self.__length
+        offset = 0
+
+        try:
+            while offset < length:
+                p_length = view[offset]
+                end = offset + p_length + 1
+
+                if end > length:
+                    break
+
+                if p_length > 0:
+                    type_id = chr(view[offset + 1])
+                    payload = view[offset + 2:end]
 
-        if length >= 2 and length - 1 >= self.__buffer[0]:
-            p_length = self.__buffer[0]
+                    offset = end
 
-            for f in self.__listeners:
-                f(chr(self.__buffer[1]), self.__buffer[2:p_length + 1])
+                    for f in self.__listeners:
+                        f(type_id, payload)
+                else:
+                    offset = end
+        finally:
+            self.__compact__(offset)
 
-            self.__buffer = self.__buffer[p_length + 1:]
-            self.__process__()
+    def __compact__(self, offset):
+        if offset > 0:
+            remaining = self.__length - offset
+
+            if remaining > 0:
+                self.__buffer[:remaining] = self.__buffer[offset:self.__length]
+
+            self.__length = remaining
 
 def split(payload):
-    fields = []
-    field = []
+    return bytes(payload).split(b"\1")
 
-    for b in payload:
-        if b == 1:
-            fields.append(bytearray(field))
-            field = []
-        else:
-            field.append(b)
+class Message:
+    def __init__(self, type_id, fields, text=None):
+        self.__type_id = type_id
+        self.__fields = fields
+        self.__text = text
+
+    @staticmethod
+    def parse(type_id, payload):
+        return Message(type_id, split(payload))
+
+    @staticmethod
+    def from_text(type_id, text):
+        return Message(type_id, [field.encode() for field in text], text)
+
+    @property
+    def type_id(self):
+        return self.__type_id
+
+    @property
+    def fields(self):
+        return self.__fields
+
+    @property
+    def text(self):
+        if self.__text is None:
+            self.__text = [textutils.decode(f).strip(" \0") for f in self.__fields]
+
+        return self.__text
+
+    def __len__(self):
+        return len(self.__fields)
 
-    fields.append(bytearray(field))
+    def __getitem__(self, index):
+        return self.__fields[index]
 
-    return fields
+    def __iter__(self):
+        return iter(self.__fields)
 
 def get_opts(line, **opts):
     m = {}
@@ -41,6 +41,16 @@ class Email:
                                                       self.receiver,
                                                       self.subject)
 
+class MessageRejected(Exception):
+    def __init__(self, code, message):
+        super().__init__("%d %s" % (code, message))
+
+        self.code = code
+
+    @property
+    def temporary(self):
+        return 400 <= self.code < 500
+
 Connection = NewType("Connection", database.Connection)
 
 class SinkListener:
@@ -63,13 +73,19 @@ class Queue:
     def setup(self, scope):
         raise NotImplementedError
 
-    def head(self, scope):
+    def claim_batch(self, scope, n):
+        raise NotImplementedError
+
+    def delivered(self, scope, msgids):
+        raise NotImplementedError
+
+    def mta_error(self, scope, msgids):
         raise NotImplementedError
 
-    def delivered(self, scope, msgid):
+    def defer(self, scope, deferrals):
         raise NotImplementedError
 
-    def mta_error(self, scope, msgid):
+    def release(self, scope, msgids):
         raise NotImplementedError
 
     def cleanup(self, scope):
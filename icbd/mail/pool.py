@@ -0,0 +1,106 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import threading
+import time
+from logging import Logger
+import di
+
+class Pool(di.Injected):
+    def __init__(self, factory, size, idle_timeout):
+        super().__init__()
+
+        self.__factory = factory
+        self.__size = size
+        self.__idle_timeout = idle_timeout
+        self.__lock = threading.Lock()
+        self.__idle = []
+
+    def inject(self, log: Logger):
+        self.__log = log
+
+    def acquire(self, reuse=True):
+        expired = []
+        mta = None
+
+        with self.__lock:
+            now = time.monotonic()
+
+            while reuse and self.__idle and not mta:
+                session, t_release = self.__idle.pop()
+
+                if now - t_release < self.__idle_timeout:
+                    mta = session
+                else:
+                    expired.append(session)
+
+        self.__close__(expired)
+
+        if not mta:
+            self.__log.debug("Opening SMTP session.")
+
+            mta = self.__factory()
+
+            mta.start_session()
+
+        return mta
+
+    def release(self, mta, reuse=True):
+        if reuse:
+            with self.__lock:
+                if len(self.__idle) < self.__size:
+                    self.__idle.append((mta, time.monotonic()))
+
+                    mta = None
+
+        if mta:
+            self.__close__([mta])
+
+    def close_idle(self):
+        with self.__lock:
+            now = time.monotonic()
+
+            expired = [session for session, t_release in self.__idle if now - t_release >= self.__idle_timeout]
+
+            self.__idle = [(session, t_release) for session, t_release in self.__idle if now - t_release < self.__idle_timeout]
+
+        self.__close__(expired)
+
+    def close(self):
+        with self.__lock:
+            sessions = [session for session, _ in self.__idle]
+
+            self.__idle = []
+
+        self.__close__(sessions)
+
+    def __close__(self, sessions):
+        for mta in sessions:
+            self.__log.debug("Closing SMTP session.")
+
+            try:
+                mta.end_session()
+            except Exception as ex:
+                self.__log.debug("Couldn't close SMTP session: %s", ex)
@@ -28,7 +28,7 @@ import smtplib
 import mail
 
 class MTA(mail.MTA):
-    def __init__(self, host, port, ssl, start_tls, sender, username=None, password=None):
+    def __init__(self, host, port, ssl, start_tls, sender, username=None, password=None, timeout=30.0):
         self.server = host
         self.port = port
         self.ssl = ssl
@@ -36,23 +36,27 @@ class MTA(mail.MTA):
         self.sender = sender
         self.username = username
         self.password = password
+        self.timeout = timeout
         self.__client = None
 
     def start_session(self):
         if self.ssl:
-            self.__client = smtplib.SMTP(self.server, self.port)
-            self.__client.ehlo()
+            self.__client = smtplib.SMTP_SSL(self.server, self.port, timeout=self.timeout)
         else:
-            self.__client = smtplib.SMTP()
+            self.__client = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
 
-        if self.start_tls:
-            self.__client.starttls()
+        try:
             self.__client.ehlo()
 
-        self.__client.connect(self.server, self.port)
+            if self.start_tls:
+                self.__client.starttls()
+                self.__client.ehlo()
 
-        if self.username and self.password:
-            self.__client.login(self.username, self.password)
+            if self.username and self.password:
+                self.__client.login(self.username, self.password)
+        except:
+            self.__client.close()
+            raise
 
     def send(self, receiver, subject, body):
         msg = MIMEText(body, 'plain', 'utf-8')
@@ -61,7 +65,33 @@ class MTA(mail.MTA):
         msg['From'] = self.sender.strip()
         msg['To'] = receiver.strip()
 
-        self.__client.sendmail(self.sender, [receiver], msg.as_string())
+        options = [] if receiver.isascii() else ["SMTPUTF8"]
+
+        try:
+            self.__client.sendmail(self.sender, [receiver], msg.as_string(), options)
+        except smtplib.SMTPRecipientsRefused as ex:
+            code, message = next(iter(ex.recipients.values()))
+
+            if code == 421:
+                raise
+
+            raise mail.MessageRejected(code, message.decode(errors="replace"))
+        except smtplib.SMTPResponseException as ex:
+            if ex.smtp_code == 421:
+                raise
+
+            raise mail.MessageRejected(ex.smtp_code, ex.smtp_error.decode(errors="replace"))
+        except smtplib.SMTPNotSupportedError as ex:
+            raise mail.MessageRejected(553, str(ex))
+        except UnicodeError as ex:
+            self.__client.rset()
+
+            raise mail.MessageRejected(553, str(ex))
 
     def end_session(self):
-        self.__client.quit()
+        try:
+            self.__client.quit()
+        except smtplib.SMTPServerDisconnected:
+            pass
+        finally:
+            self.__client.close()
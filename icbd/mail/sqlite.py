@@ -54,32 +54,30 @@ class Sink(mail.Sink):
         self.__listeners.remove(listener)
 
 class Queue(mail.Queue):
-    def __init__(self, ttl, max_errors, retry_timeout):
+    def __init__(self, ttl, max_errors, retry_timeout, lease_timeout=300):
         self.__ttl = ttl
         self.__max_errors = max_errors
         self.__retry_timeout = retry_timeout
+        self.__lease_timeout = lease_timeout
 
     def setup(self, scope):
         Schema().upgrade(scope)
 
-    def head(self, scope):
+    def claim_batch(self, scope, n):
         now = dateutils.timestamp()
-
-        query = """select * from Mail
-                     where Sent=0 and %d - Timestamp <= %d and MTAErrors < %d and DueDate <= %d
-                     order by MTAErrors, Timestamp asc limit 1""" % (now, self.__ttl, self.__max_errors, now)
+        lease = uuid.uuid4().hex
 
         cur = scope.get_handle()
-        cur.execute(query)
-
-        m = cur.fetchone()
+        cur.execute("""update Mail
+                         set Lease=?, LeaseExpiry=?
+                         where UUID in (select UUID from Mail
+                                          where Sent=0 and MTAErrors < ? and Timestamp >= ? and DueDate <= ? and LeaseExpiry <= ?
+                                          order by MTAErrors, Timestamp asc limit ?)""",
+                    (lease, now + self.__lease_timeout, self.__max_errors, now - self.__ttl, now, now, n))
 
-        msg = None
+        cur.execute("select * from Mail where Lease=? order by MTAErrors, Timestamp asc", (lease,))
 
-        if m:
-            msg = self.__to_email__(m)
-
-        return msg
+        return [self.__to_email__(row) for row in cur.fetchall()]
 
     @staticmethod
     def __to_email__(row):
@@ -88,19 +86,29 @@ class Queue(mail.Queue):
                           subject=row["Subject"],
                           body=row["Body"])
 
-    def delivered(self, scope, msgid):
+    def delivered(self, scope, msgids):
         cur = scope.get_handle()
-        cur.execute("update Mail set Sent=1 where UUID=?", (msgid.hex,))
+        cur.executemany("update Mail set Sent=1, Lease=null, LeaseExpiry=0 where UUID=?", ((msgid.hex,) for msgid in msgids))
 
-    def mta_error(self, scope, msgid):
+    def mta_error(self, scope, msgids):
         now = dateutils.timestamp()
         due_date = now + self.__retry_timeout
 
         cur = scope.get_handle()
-        cur.execute("update Mail set MTAErrors=MTAErrors + 1, DueDate = ? where UUID=?", (due_date, msgid.hex,))
+        cur.executemany("update Mail set MTAErrors=MTAErrors + 1, DueDate=?, Lease=null, LeaseExpiry=0 where UUID=?",
+                        ((due_date, msgid.hex) for msgid in msgids))
+
+    def defer(self, scope, deferrals):
+        cur = scope.get_handle()
+        cur.executemany("update Mail set DueDate=?, Lease=null, LeaseExpiry=0 where UUID=?",
+                        ((due_date, msgid.hex) for msgid, due_date in deferrals))
+
+    def release(self, scope, msgids):
+        cur = scope.get_handle()
+        cur.executemany("update Mail set Lease=null, LeaseExpiry=0 where UUID=?", ((msgid.hex,) for msgid in msgids))
 
     def cleanup(self, scope):
         now = dateutils.timestamp()
 
         cur = scope.get_handle()
-        cur.execute("delete from Mail where %d - Timestamp > %d" % (now, self.__ttl))
+        cur.execute("delete from Mail where Timestamp < ?", (now - self.__ttl,))
@@ -0,0 +1,232 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import getopt
+import sys
+import os
+import asyncio
+import logging
+import random
+import tempfile
+import time
+import traceback
+import config
+import log
+import sqlite
+import mail
+import mail.sqlite
+import mail.smtp
+import mail.pool
+import di
+from mail_process import Sendmail
+
+class SMTPStats:
+    def __init__(self):
+        self.sessions = 0
+        self.accepted = 0
+        self.rejected = 0
+
+class SMTPServerProtocol(asyncio.Protocol):
+    def __init__(self, stats, latency, reject_rate):
+        self.__stats = stats
+        self.__latency = latency
+        self.__reject_rate = reject_rate
+        self.__transport = None
+        self.__buffer = bytearray()
+        self.__data = False
+
+    def connection_made(self, transport):
+        self.__transport = transport
+        self.__stats.sessions += 1
+
+        self.__reply__("220 localhost ESMTP stand-in")
+
+    def data_received(self, data):
+        self.__buffer.extend(data)
+
+        while True:
+            if self.__data:
+                index = self.__buffer.find(b"\r\n.\r\n")
+
+                if index == -1:
+                    break
+
+                del self.__buffer[:index + 5]
+
+                self.__data = False
+
+                self.__stats.accepted += 1
+
+                loop = asyncio.get_running_loop()
+
+                loop.call_later(self.__latency, self.__reply__, "250 OK")
+            else:
+                index = self.__buffer.find(b"\r\n")
+
+                if index == -1:
+                    break
+
+                line = self.__buffer[:index].decode("ascii", "replace")
+
+                del self.__buffer[:index + 2]
+
+                self.__command__(line)
+
+    def __command__(self, line):
+        verb = line.split(" ", 1)[0].upper()
+
+        if verb == "EHLO":
+            self.__reply__("250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+        elif verb == "AUTH":
+            self.__reply__("235 Authentication successful")
+        elif verb == "RCPT" and random.random() < self.__reject_rate:
+            self.__stats.rejected += 1
+
+            self.__reply__("451 Try again later")
+        elif verb == "DATA":
+            self.__data = True
+
+            self.__reply__("354 End data with <CR><LF>.<CR><LF>")
+        elif verb == "QUIT":
+            self.__reply__("221 Bye")
+
+            self.__transport.close()
+        else:
+            self.__reply__("250 OK")
+
+    def __reply__(self, text):
+        if not self.__transport.is_closing():
+            self.__transport.write(text.encode("ascii") + b"\r\n")
+
+async def run(opts):
+    directory = tempfile.TemporaryDirectory(prefix="icbd-mail-benchmark-")
+
+    loop = asyncio.get_running_loop()
+
+    stats = SMTPStats()
+
+    server = await loop.create_server(lambda: SMTPServerProtocol(stats, opts["latency"], opts["reject_rate"]), "127.0.0.1", 0)
+
+    port = server.sockets[0].getsockname()[1]
+
+    preferences = config.Config(database_filename=os.path.join(directory.name, "icbd.db"),
+                                mail_ttl=3600,
+                                mail_workers=opts["workers"],
+                                smtp_hostname="127.0.0.1",
+                                smtp_port=port,
+                                smtp_username="bench",
+                                smtp_password="bench",
+                                smtp_idle_timeout=opts["idle_timeout"])
+
+    container = di.default_container
+
+    container.register(config.Config, preferences)
+    container.register(logging.Logger, log.new_logger("mail", log.Verbosity.ERROR, log.SIMPLE_TEXT_FORMAT))
+    container.register(mail.Connection, sqlite.Connection(preferences.database_filename))
+    container.register(mail.Queue, mail.sqlite.Queue(preferences.mail_ttl,
+                                                     preferences.mail_max_errors,
+                                                     preferences.mail_retry_timeout,
+                                                     preferences.mail_lease_timeout))
+    container.register(mail.pool.Pool, mail.pool.Pool(lambda: mail.smtp.MTA(preferences.smtp_hostname,
+                                                                           preferences.smtp_port,
+                                                                           preferences.smtp_ssl_enabled,
+                                                                           preferences.smtp_start_tls,
+                                                                           preferences.smtp_sender,
+                                                                           preferences.smtp_username,
+                                                                           preferences.smtp_password,
+                                                                           preferences.smtp_timeout),
+                                                      preferences.mail_workers,
+                                                      preferences.smtp_idle_timeout))
+
+    mailer = Sendmail()
+
+    sink = mail.sqlite.Sink()
+
+    connection = container.resolve(mail.Connection)
+
+    with connection.enter_scope() as scope:
+        for i in range(opts["mails"]):
+            sink.put(scope, "user%d@example%d.org" % (i, i % 10), "Benchmark", "Message %d" % i)
+
+        scope.complete()
+
+    started = time.perf_counter()
+
+    await mailer.send()
+
+    elapsed = time.perf_counter() - started
+
+    await mailer.close()
+
+    server.close()
+
+    await server.wait_closed()
+
+    connection.close()
+
+    directory.cleanup()
+
+    print("%-22s%d" % ("Mails:", opts["mails"]))
+    print("%-22s%d" % ("Workers:", opts["workers"]))
+    print("%-22s%d/%d" % ("Accepted/rejected:", stats.accepted, stats.rejected))
+    print("%-22s%d" % ("SMTP sessions:", stats.sessions))
+    print("%-22s%.2f s" % ("Elapsed:", elapsed))
+    print("%-22s%.1f" % ("Mails/s:", stats.accepted / elapsed if elapsed else 0.0))
+
+def get_opts(argv):
+    options, _ = getopt.getopt(argv, 'n:w:', ['mails=', 'workers=', 'latency=', 'reject-rate=', 'idle-timeout='])
+
+    m = {"mails": 10000,
+         "workers": 4,
+         "latency": 0.005,
+         "reject_rate": 0.0,
+         "idle_timeout": 60.0}
+
+    for opt, arg in options:
+        if opt in ('-n', '--mails'):
+            m["mails"] = int(arg)
+        elif opt in ('-w', '--workers'):
+            m["workers"] = int(arg)
+        elif opt in ('--latency',):
+            m["latency"] = float(arg) / 1000.0
+        elif opt in ('--reject-rate',):
+            m["reject_rate"] = float(arg)
+        elif opt in ('--idle-timeout',):
+            m["idle_timeout"] = float(arg)
+
+    if m["mails"] < 1 or m["workers"] < 1:
+        raise getopt.GetoptError("At least one mail and one worker are required.")
+
+    return m
+
+if __name__ == "__main__":
+    try:
+        opts = get_opts(sys.argv[1:])
+
+        asyncio.run(run(opts))
+    except getopt.GetoptError as ex:
+        print(str(ex))
+    except:
+        traceback.print_exc()
@@ -32,6 +32,7 @@ from enum import Enum
 import traceback
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 import ipc
 import config
 import config.json
@@ -39,72 +40,190 @@ import log
 import sqlite
 import mail.sqlite
 import mail.smtp
+import mail.pool
+import dateutils
 import di
 
+RELAY = "*"
+
 class TransferStatus(Enum):
     SERVER_ERROR = 0
     DELIVERED = 1
     MTA_ERROR = 2
+    DEFERRED = 3
+    TEMPORARY_ERROR = 4
+
+class Backoff:
+    def __init__(self, min_delay, max_delay):
+        self.__min_delay = min_delay
+        self.__max_delay = max_delay
+        self.__failures = {}
+
+    def failed(self, destination):
+        errors, _ = self.__failures.get(destination, (0, 0.0))
+
+        delay = min(self.__max_delay, self.__min_delay * (2 ** errors))
+
+        self.__failures[destination] = (errors + 1, time.monotonic() + delay)
+
+        return delay
+
+    def succeeded(self, destination):
+        self.__failures.pop(destination, None)
+
+    def remaining(self, destination):
+        _, deadline = self.__failures.get(destination, (0, 0.0))
+
+        return max(0.0, deadline - time.monotonic())
 
 class Sendmail(di.Injected):
-    def inject(self, config: config.Config, log: logging.Logger, mta: mail.MTA, connection: mail.Connection, queue: mail.Queue):
+    def inject(self,
+               config: config.Config,
+               log: logging.Logger,
+               pool: mail.pool.Pool,
+               connection: mail.Connection,
+               queue: mail.Queue):
         self.__config = config
         self.__log = log
-        self.__mta = mta
+        self.__pool = pool
         self.__connection = connection
         self.__queue = queue
+        self.__backoff = Backoff(config.mail_min_backoff, config.mail_max_backoff)
+        self.__executor = ThreadPoolExecutor(max_workers=config.mail_workers, thread_name_prefix="sendmail")
+        self.__server_error = False
 
         self.__prepare_db__()
 
-    def send(self):
+    @property
+    def backoff(self):
+        return self.__backoff.remaining(RELAY)
+
+    async def send(self):
         self.__log.debug("Processing mail queue.")
 
-        read_next = True
+        loop = asyncio.get_running_loop()
+
+        read_next = self.backoff == 0.0
+
+        if not read_next:
+            self.__log.debug("SMTP server unavailable, next attempt in %.2f second(s).", self.backoff)
 
         while read_next:
             with self.__connection.enter_scope() as scope:
-                msg = self.__queue.head(scope)
+                msgs = self.__queue.claim_batch(scope, self.__config.mail_workers * 8)
 
-            if msg:
-                self.__send_mail__(msg)
+                scope.complete()
+
+            if msgs:
+                self.__server_error = False
+
+                results = await asyncio.gather(*[self.__send_mail__(loop, msg) for msg in msgs])
+
+                self.__update_queue__(msgs, results)
+
+                if TransferStatus.SERVER_ERROR in results:
+                    delay = self.__backoff.failed(RELAY)
+
+                    self.__log.warning("SMTP server unavailable, retrying in %.2f second(s).", delay)
+
+                    read_next = False
+                else:
+                    self.__backoff.succeeded(RELAY)
             else:
                 read_next = False
 
-    def __send_mail__(self, msg):
+        await loop.run_in_executor(self.__executor, self.__pool.close_idle)
+
+    async def __send_mail__(self, loop, msg):
+        destination = msg.receiver.rpartition("@")[2].lower()
+
+        if self.__backoff.remaining(destination) > 0.0:
+            self.__log.debug("Deferring mail to %s: %s", destination, msg)
+
+            return TransferStatus.DEFERRED
+
+        status = await loop.run_in_executor(self.__executor, self.__transfer__, msg)
+
+        if status == TransferStatus.TEMPORARY_ERROR:
+            self.__backoff.failed(destination)
+        elif status == TransferStatus.DELIVERED:
+            self.__backoff.succeeded(destination)
+
+        return status
+
+    def __transfer__(self, msg):
         self.__log.info("Sending mail: %s", msg)
 
         status = TransferStatus.SERVER_ERROR
+        attempts = 2
 
-        try:
-            self.__mta.start_session()
+        while status == TransferStatus.SERVER_ERROR and attempts > 0 and not self.__server_error:
+            attempts -= 1
 
             try:
-                self.__mta.send(msg.receiver, msg.subject, msg.body)
-
-                status = TransferStatus.DELIVERED
+                mta = self.__pool.acquire(reuse=(attempts > 0))
             except:
-                self.__log.warning(traceback.format_exc())
+                self.__log.error(traceback.format_exc())
 
-                status = TransferStatus.MTA_ERROR
+                self.__server_error = True
 
-            self.__mta.end_session()
-        except:
-            self.__log.error(traceback.format_exc())
+                break
 
-            time.sleep(5)
+            try:
+                mta.send(msg.receiver, msg.subject, msg.body)
 
-        if status != TransferStatus.SERVER_ERROR:
-            with self.__connection.enter_scope() as scope:
-                if status == TransferStatus.DELIVERED:
-                    self.__log.debug("Marking mail delivered.")
+                status = TransferStatus.DELIVERED
+            except mail.MessageRejected as ex:
+                self.__log.warning("Mail rejected (%s): %s", msg, ex)
 
-                    self.__queue.delivered(scope, msg.msgid)
+                status = TransferStatus.TEMPORARY_ERROR if ex.temporary else TransferStatus.MTA_ERROR
+            except Exception as ex:
+                if attempts > 0:
+                    self.__log.debug("SMTP session failed, reconnecting: %s", ex)
                 else:
-                    self.__log.debug("Incrementing MTA error counter.")
+                    self.__log.warning(traceback.format_exc())
 
-                    self.__queue.mta_error(scope, msg.msgid)
+                    self.__server_error = True
 
-                scope.complete()
+            self.__pool.release(mta, reuse=(status != TransferStatus.SERVER_ERROR))
+
+        return status
+
+    def __update_queue__(self, msgs, results):
+        delivered = []
+        failed = []
+        deferred = []
+        released = []
+
+        for msg, status in zip(msgs, results):
+            if status == TransferStatus.DELIVERED:
+                delivered.append(msg.msgid)
+            elif status in (TransferStatus.MTA_ERROR, TransferStatus.TEMPORARY_ERROR):
+                failed.append(msg.msgid)
+            elif status == TransferStatus.DEFERRED:
+                destination = msg.receiver.rpartition("@")[2].lower()
+
+                deferred.append((msg.msgid, dateutils.timestamp() + int(self.__backoff.remaining(destination)) + 1))
+            else:
+                released.append(msg.msgid)
+
+        self.__log.debug("Updating mail queue: delivered=%d, failed=%d, deferred=%d, released=%d.",
+                         len(delivered), len(failed), len(deferred), len(released))
+
+        with self.__connection.enter_scope() as scope:
+            self.__queue.delivered(scope, delivered)
+            self.__queue.mta_error(scope, failed)
+            self.__queue.defer(scope, deferred)
+            self.__queue.release(scope, released)
+
+            scope.complete()
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+
+        await loop.run_in_executor(self.__executor, self.__pool.close)
+
+        self.__executor.shutdown()
 
     def cleanup(self):
         with self.__connection.enter_scope() as scope:
@@ -147,14 +266,18 @@ async def run(opts):
     container.register(mail.Connection, sqlite.Connection(preferences.database_filename))
     container.register(mail.Queue, mail.sqlite.Queue(preferences.mail_ttl,
                                                      preferences.mail_max_errors,
-                                                     preferences.mail_retry_timeout))
-    container.register(mail.MTA, mail.smtp.MTA(preferences.smtp_hostname,
-                                               preferences.smtp_port,
-                                               preferences.smtp_ssl_enabled,
-                                               preferences.smtp_start_tls,
-                                               preferences.smtp_sender,
-                                               preferences.smtp_username,
-                                               preferences.smtp_password))
+                                                     preferences.mail_retry_timeout,
+                                                     preferences.mail_lease_timeout))
+    container.register(mail.pool.Pool, mail.pool.Pool(lambda: mail.smtp.MTA(preferences.smtp_hostname,
+                                                                           preferences.smtp_port,
+                                                                           preferences.smtp_ssl_enabled,
+                                                                           preferences.smtp_start_tls,
+                                                                           preferences.smtp_sender,
+                                                                           preferences.smtp_username,
+                                                                           preferences.smtp_password,
+                                                                           preferences.smtp_timeout),
+                                                      preferences.mail_workers,
+                                                      preferences.smtp_idle_timeout))
 
     client = ipc.Client(preferences.server_ipc_binding)
 
@@ -202,7 +325,7 @@ async def run(opts):
                 action = Action.QUIT
 
         if action == Action.SEND:
-            mailer.send()
+            await mailer.send()
         elif action == Action.CLEANUP:
             mailer.cleanup()
         elif action == Action.QUIT:
@@ -216,6 +339,13 @@ async def run(opts):
             if f is timeout_f:
                 timeout_f = asyncio.ensure_future(asyncio.sleep(preferences.mail_interval))
 
+        if action == Action.SEND and mailer.backoff > 0.0:
+            timeout_f.cancel()
+
+            timeout_f = asyncio.ensure_future(asyncio.sleep(min(mailer.backoff, preferences.mail_interval)))
+
+    await mailer.close()
+
     logger.info("Stopped.")
 
 if __name__ == "__main__":
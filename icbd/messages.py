@@ -24,6 +24,8 @@
     OTHER DEALINGS IN THE SOFTWARE.
 """
 import sys
+import inspect
+import functools
 import di
 import session
 import broker
@@ -47,99 +49,46 @@ import actions.list
 import actions.admin
 import actions.help
 import actions.info
-import textutils
 from exception import LtdErrorException, LtdResponseException
 
-def code(id):
+class Argument:
+    def __init__(self, display="Argument", min=0, max=0, at=0):
+        self.display = display
+        self.min = min
+        self.max = max
+        self.at = at
+
+class Schema:
+    def __init__(self, login=False, text=False, catch=False, count=0, min=0, max=0, arg=None):
+        self.login = login
+        self.text = text
+        self.catch = catch
+        self.count = count
+        self.min = min
+        self.max = max
+        self.arg = arg
+
+def code(id, **schema):
     def decorator(cls):
         cls.code = id
+        cls.schema = Schema(**schema)
 
         return cls
 
     return decorator
 
-def textfields(fn):
-    def wrapper(session_id, fields):
-        fn(session_id, [textutils.decode(b).strip(" \0") for b in fields])
-
-    return wrapper
-
-def loginrequired(fn):
-    def wrapper(session_id, fields):
-        sessions = di.default_container.resolve(session.Store)
-
-        state = sessions.get(session_id)
-
-        if not state.loggedin:
-            raise LtdErrorException("Login required.")
-
-        fn(session_id, fields)
-
-    return wrapper
-
-def catchltdexceptions(fn):
-    def wrapper(session_id, fields):
-        try:
-            fn(session_id, fields)
-
-        except LtdResponseException as ex:
-            b = di.default_container.resolve(broker.Broker)
-
-            b.deliver(session_id, ex.response)
-
-    return wrapper
-
-def fieldslength(count=0, min=0, max=0):
-    def decorator(fn):
-        def wrapper(session_id, fields):
-            if count > 0 and len(fields) != count:
-                raise LtdErrorException("Malformed message, wrong number of fields.")
-
-            if len(fields) < min:
-                raise LtdErrorException("Malformed message, missing fields.")
-
-            if max > min and len(fields) > max:
-                raise LtdErrorException("Malformed message, too many fields.")
-
-            fn(session_id, fields)
-
-        return wrapper
-
-    return decorator
-
-def arglength(at=0, min=0, max=0, display="Argument"):
-    def decorator(fn):
-        def wrapper(session_id, fields):
-            val = fields[at]
-
-            if len(val) < min:
-                if min == 1:
-                    raise LtdErrorException("%s cannot be empty." % display)
-
-                raise LtdErrorException("%s requires at least %d characters." % (display, min))
-
-            if max > min and len(val) > max:
-                raise LtdErrorException("%s exceeds allowed maximum length (%d characters)." % (display, max))
-
-            fn(session_id, fields)
-
-        return wrapper
-
-    return decorator
-
-def command(name):
+def command(name, **schema):
     def decorator(cls):
         cls.command = name
+        cls.schema = Schema(**schema)
 
         return cls
 
     return decorator
 
-@code("a")
+@code("a", text=True, min=5, max=7)
 class Login:
     @staticmethod
-    @textfields
-    @fieldslength(min=5, max=7)
     def process(session_id, fields):
         fn = None
         args = []
@@ -157,247 +106,181 @@ class Login:
         if not fn:
             raise LtdErrorException("Unsupported login type: '%s'" % fields[3])
 
-        fn(*args)
+        return fn(*args)
 
-@code("b")
+@code("b", login=True, text=True, catch=True, count=1)
 class OpenMessage:
     @staticmethod
-    @loginrequired
-    @textfields
-    @catchltdexceptions
-    @fieldslength(count=1)
     def process(session_id, fields):
         ACTION(actions.openmessage.OpenMessage).send(session_id, fields[0])
 
-@command("g")
+@command("g", login=True, count=1, arg=Argument("Group name", validate.GROUP_MIN, validate.GROUP_MAX))
 class ChangeGroup:
     @staticmethod
-    @loginrequired
-    @fieldslength(count=1)
-    @arglength(display="Group name", min=validate.GROUP_MIN, max=validate.GROUP_MAX)
     def process(session_id, fields):
-        ACTION(actions.usersession.UserSession).join(session_id, fields[0])
+        return ACTION(actions.usersession.UserSession).join(session_id, fields[0])
 
-@command("name")
+@command("name", login=True, count=1, arg=Argument("Nick Name", validate.NICK_MIN, validate.NICK_MAX))
 class Rename:
     @staticmethod
-    @loginrequired
-    @fieldslength(count=1)
-    @arglength(display="Nick Name", min=validate.NICK_MIN, max=validate.NICK_MAX)
     def process(session_id, fields):
-        ACTION(actions.usersession.UserSession).rename(session_id, fields[0])
+        return ACTION(actions.usersession.UserSession).rename(session_id, fields[0])
 
-@command("p")
+@command("p", login=True, count=1, arg=Argument("Password", validate.PASSWORD_MIN, validate.PASSWORD_MAX))
 class Register:
     @staticmethod
-    @loginrequired
-    @fieldslength(count=1)
-    @arglength(display="Password", min=validate.PASSWORD_MIN, max=validate.PASSWORD_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).register(session_id, fields[0])
+        return ACTION(actions.registration.Registration).register(session_id, fields[0])
 
-@command("cp")
+@command("cp", count=1)
 class ChangePassword:
     @staticmethod
-    @fieldslength(count=1)
     def process(session_id, fields):
         msg_fields = fields[0].split(" ")
 
         if len(msg_fields) == 2:
             old_pwd, new_pwd = msg_fields
 
-            ACTION(actions.registration.Registration).change_password(session_id, old_pwd, new_pwd)
+            return ACTION(actions.registration.Registration).change_password(session_id, old_pwd, new_pwd)
         else:
             raise LtdErrorException("Usage: /cp {old password} {new password}")
 
-@command("newpasswd")
+@command("newpasswd", count=1, arg=Argument("E-Mail address", validate.EMAIL_MIN, validate.EMAIL_MAX))
 class ResetPassword:
     @staticmethod
-    @fieldslength(count=1)
-    @arglength(display="E-Mail address", min=validate.EMAIL_MIN, max=validate.EMAIL_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).reset_password(session_id, fields[0])
+        return ACTION(actions.registration.Registration).reset_password(session_id, fields[0])
 
-@command("passwd")
+@command("passwd", login=True, count=1)
 class ChangeUserPassword:
     @staticmethod
-    @loginrequired
-    @fieldslength(count=1)
     def process(session_id, fields):
         msg_fields = fields[0].split(" ")
 
         if len(msg_fields) == 2:
             nick, password = msg_fields
 
-            ACTION(actions.admin.Admin).change_password(session_id, nick, password)
+            return ACTION(actions.admin.Admin).change_password(session_id, nick, password)
         else:
             raise LtdErrorException("Usage: /passwd {nick} {new password}")
 
 def msgid(fields):
     return fields[1] if len(fields) == 2 else ""
 
-@command("whoami")
+@command("whoami", login=True, min=1, max=2)
 class WhoAmI:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         ACTION(actions.registration.Registration).whoami(session_id, msgid=msgid(fields))
 
-@command("secure")
+@command("secure", login=True, min=1, max=2)
 class EnableSecurity:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).set_security_mode(session_id, enabled=True, msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).set_security_mode(session_id, enabled=True, msgid=msgid(fields))
 
-@command("nosecure")
+@command("nosecure", login=True, min=1, max=2)
 class DisableSecurity:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).set_security_mode(session_id, enabled=False, msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).set_security_mode(session_id, enabled=False, msgid=msgid(fields))
 
-@command("rname")
+@command("rname", login=True, min=1, max=2, arg=Argument("Real Name", validate.REALNAME_MIN, validate.REALNAME_MAX))
 class ChangeRealname:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="Real Name", min=validate.REALNAME_MIN, max=validate.REALNAME_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).change_field(session_id, "real_name", fields[0], msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).change_field(session_id, "real_name", fields[0], msgid=msgid(fields))
 
-@command("addr")
+@command("addr", login=True, min=1, max=2, arg=Argument("Address", validate.ADDRESS_MIN, validate.ADDRESS_MAX))
 class ChangeAddress:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="Address", min=validate.ADDRESS_MIN, max=validate.ADDRESS_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).change_field(session_id, "address", fields[0], msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).change_field(session_id, "address", fields[0], msgid=msgid(fields))
 
-@command("phone")
+@command("phone", login=True, min=1, max=2, arg=Argument("Phone Number", validate.PHONE_MIN, validate.PHONE_MAX))
 class ChangePhone:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="Phone Number", min=validate.PHONE_MIN, max=validate.PHONE_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).change_field(session_id, "phone", fields[0], msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).change_field(session_id, "phone", fields[0], msgid=msgid(fields))
 
-@command("email")
+@command("email", login=True, min=1, max=2, arg=Argument("E-Mail address", validate.EMAIL_MIN, validate.EMAIL_MAX))
 class ChangeEmail:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="E-Mail address", min=validate.EMAIL_MIN, max=validate.EMAIL_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).change_field(session_id, "email", fields[0], msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).change_field(session_id, "email", fields[0], msgid=msgid(fields))
 
-@command("text")
+@command("text", login=True, min=1, max=2, arg=Argument("Text", validate.TEXT_MIN, validate.TEXT_MAX))
 class ChangeText:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="Text", min=validate.TEXT_MIN, max=validate.TEXT_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).change_field(session_id, "text", fields[0], msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).change_field(session_id, "text", fields[0], msgid=msgid(fields))
 
-@command("www")
+@command("www", login=True, min=1, max=2, arg=Argument("WWW", validate.WWW_MIN, validate.WWW_MAX))
 class ChangeWebsite:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="WWW", min=validate.WWW_MIN, max=validate.WWW_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).change_field(session_id, "www", fields[0], msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).change_field(session_id, "www", fields[0], msgid=msgid(fields))
 
-@command("avatar")
+@command("avatar", login=True, min=1, max=2, arg=Argument("Avatar", validate.AVATAR_MIN, validate.AVATAR_MAX))
 class ChangeAvatar:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="Avatar", min=validate.AVATAR_MIN, max=validate.AVATAR_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).change_field(session_id, "avatar", fields[0], msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).change_field(session_id, "avatar", fields[0], msgid=msgid(fields))
 
-@command("forward")
+@command("forward", login=True, min=1, max=2)
 class EnableForwarding:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).enable_forwarding(session_id, enabled=True, msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).enable_forwarding(session_id, enabled=True, msgid=msgid(fields))
 
-@command("noforward")
+@command("noforward", login=True, min=1, max=2)
 class DisableForwarding:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).enable_forwarding(session_id, enabled=False, msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).enable_forwarding(session_id, enabled=False, msgid=msgid(fields))
 
-@command("protect")
+@command("protect", login=True, min=1, max=2)
 class EnableProtection:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).set_protected(session_id, protected=True, msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).set_protected(session_id, protected=True, msgid=msgid(fields))
 
-@command("noprotect")
+@command("noprotect", login=True, min=1, max=2)
 class DisableProtection:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).set_protected(session_id, protected=False, msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).set_protected(session_id, protected=False, msgid=msgid(fields))
 
-@command("confirm")
+@command("confirm", login=True, min=1, max=2)
 class ConfirmEmail:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields and fields[0]:
-            ACTION(actions.registration.Registration).confirm(session_id, fields[0])
+            return ACTION(actions.registration.Registration).confirm(session_id, fields[0])
         else:
-            ACTION(actions.registration.Registration).request_confirmation(session_id)
+            return ACTION(actions.registration.Registration).request_confirmation(session_id)
 
-@command("delete")
+@command("delete", login=True, min=1, max=2, arg=Argument("Password", validate.PASSWORD_MIN, validate.PASSWORD_MAX))
 class DeleteNick:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="Password", min=validate.PASSWORD_MIN, max=validate.PASSWORD_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).delete(session_id, fields[0], msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).delete(session_id, fields[0], msgid=msgid(fields))
 
-@command("whois")
+@command("whois", login=True, min=1, max=2, arg=Argument("Nick Name", validate.NICK_MIN, validate.NICK_MAX))
 class Whois:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="Nick Name", min=validate.NICK_MIN, max=validate.NICK_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).whois(session_id, fields[0], msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).whois(session_id, fields[0], msgid=msgid(fields))
 
-@command("picture")
+@command("picture", login=True, min=1, max=2, arg=Argument("Nick Name", validate.NICK_MIN, validate.NICK_MAX))
 class DisplayAvatar:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="Nick Name", min=validate.NICK_MIN, max=validate.NICK_MAX)
     def process(session_id, fields):
-        ACTION(actions.registration.Registration).display_avatar(session_id, fields[0], msgid=msgid(fields))
+        return ACTION(actions.registration.Registration).display_avatar(session_id, fields[0], msgid=msgid(fields))
 
-@command("write")
+@command("write", login=True, min=1, max=2)
 class WriteMessage:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         msg_fields = fields[0].split(" ", 1)
 
@@ -406,13 +289,11 @@ class WriteMessage:
         else:
             raise LtdErrorException("Usage: /write {nick} {message}")
 
-        ACTION(actions.messagebox.MessageBox).send_message(session_id, receiver, message)
+        return ACTION(actions.messagebox.MessageBox).send_message(session_id, receiver, message)
 
-@command("m")
+@command("m", login=True, min=1, max=2)
 class WritePrivateMessage:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         msg_fields = fields[0].split(" ", 1)
 
@@ -423,11 +304,9 @@ class WritePrivateMessage:
 
         ACTION(actions.privatemessage.PrivateMessage).send(session_id, receiver, message)
 
-@command("exclude")
+@command("exclude", login=True, min=1, max=2)
 class Exclude:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         msg_fields = fields[0].split(" ", 1)
 
@@ -438,22 +317,18 @@ class Exclude:
 
         ACTION(actions.openmessage.OpenMessage).send(session_id, message, exclude=receiver)
 
-@command("read")
+@command("read", login=True, min=1, max=2)
 class ReadMessages:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields[0]:
             raise LtdErrorException("Usage: /read")
 
-        ACTION(actions.messagebox.MessageBox).read_messages(session_id, msgid=msgid(fields))
+        return ACTION(actions.messagebox.MessageBox).read_messages(session_id, msgid=msgid(fields))
 
-@command("whereis")
+@command("whereis", login=True, min=1, max=2)
 class Whereis:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         usage = "Usage: whereis {-a} {nick}"
 
@@ -467,48 +342,40 @@ class Whereis:
             except:
                 raise LtdErrorException(usage)
 
-            ACTION(actions.usersession.UserSession).whereis(session_id, nick, **opts, msgid=msgid(fields))
+            return ACTION(actions.usersession.UserSession).whereis(session_id, nick, **opts, msgid=msgid(fields))
         else:
             raise LtdErrorException(usage)
 
-@command("beep")
+@command("beep", login=True, min=1, max=2)
 class Beep:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if not fields[0]:
             raise LtdErrorException("Usage: /beep {nick}")
 
         ACTION(actions.beep.Beep).beep(session_id, fields[0])
 
-@command("nobeep")
+@command("nobeep", login=True, min=1, max=2)
 class NoBeep:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if not fields[0]:
             raise LtdErrorException("Usage: /nobeep {on|off|verbose}")
 
         ACTION(actions.beep.Beep).set_mode(session_id, fields[0])
 
-@command("echoback")
+@command("echoback", login=True, min=1, max=2)
 class Echoback:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if not fields[0]:
             raise LtdErrorException("Usage: /echoback {on|off|verbose}")
 
         ACTION(actions.echoback.Echoback).set_mode(session_id, fields[0])
 
-@command("hush")
+@command("hush", login=True, min=1, max=2)
 class Hush:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         usage = "Usage: hush {-q} {-n nick|-s address}"
 
@@ -526,11 +393,9 @@ class Hush:
         else:
             ACTION(actions.hush.Hush).list(session_id)
 
-@command("notify")
+@command("notify", login=True, min=1, max=2)
 class Notify:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         usage = "Usage: notify {-q} {-n nick|-s address}"
 
@@ -548,80 +413,65 @@ class Notify:
         else:
             ACTION(actions.notification.Notify).list(session_id)
 
-@command("away")
+@command("away", login=True, min=1, max=2)
 class Away:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         ACTION(actions.away.Away).away(session_id, fields[0])
 
-@command("noaway")
+@command("noaway", login=True, min=1, max=2)
 class NoAway:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields[0]:
             raise LtdErrorException("Usage: /noaway")
 
         ACTION(actions.away.Away).noaway(session_id)
 
-@command("w")
+@command("w", login=True, min=1, max=2)
 class Userlist:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields[0]:
             if fields[0] == "-s":
-                ACTION(actions.list.List).shortlist(session_id, with_members=True, msgid=msgid(fields))
+                return ACTION(actions.list.List).shortlist(session_id, with_members=True, msgid=msgid(fields))
             elif fields[0] == "-g":
-                ACTION(actions.list.List).shortlist(session_id, with_members=False, msgid=msgid(fields))
+                return ACTION(actions.list.List).shortlist(session_id, with_members=False, msgid=msgid(fields))
             else:
-                ACTION(actions.list.List).list_group(session_id, fields[0], msgid(fields))
+                return ACTION(actions.list.List).list_group(session_id, fields[0], msgid(fields))
         else:
-            ACTION(actions.list.List).list(session_id, msgid=msgid(fields))
+            return ACTION(actions.list.List).list(session_id, msgid=msgid(fields))
 
-@command("motd")
+@command("motd", login=True, min=1, max=2)
 class Motd:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields[0]:
             raise LtdErrorException("Usage: /motd")
 
         ACTION(actions.motd.Motd).receive(session_id, msgid(fields))
 
-@command("topic")
+@command("topic", login=True, count=1, arg=Argument("Topic", validate.TOPIC_MIN, validate.TOPIC_MAX))
 class ChangeTopic:
     @staticmethod
-    @loginrequired
-    @fieldslength(count=1)
-    @arglength(display="Topic", min=validate.TOPIC_MIN, max=validate.TOPIC_MAX)
     def process(session_id, fields):
         if fields[0]:
-            ACTION(actions.group.Group).set_topic(session_id, fields[0])
+            return ACTION(actions.group.Group).set_topic(session_id, fields[0])
         else:
             ACTION(actions.group.Group).topic(session_id, msgid(fields))
 
-@command("status")
+@command("status", login=True, min=1, max=2)
 class Status:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields[0]:
-            ACTION(actions.group.Group).change_status(session_id, fields[0])
+            return ACTION(actions.group.Group).change_status(session_id, fields[0])
         else:
             ACTION(actions.group.Group).status(session_id, msgid(fields))
 
-@command("invite")
+@command("invite", login=True, min=1, max=2)
 class Invite:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         usage = "Usage: invite {-q} {-r} {-n nick|-s address}"
 
@@ -634,13 +484,11 @@ class Invite:
         except:
             raise LtdErrorException(usage)
 
-        ACTION(actions.group.Group).invite(session_id, nick, **opts)
+        return ACTION(actions.group.Group).invite(session_id, nick, **opts)
 
-@command("cancel")
+@command("cancel", login=True, min=1, max=2)
 class Cancel:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         usage = "Usage: cancel {-q} {-n nick|-s address}"
 
@@ -653,13 +501,11 @@ class Cancel:
         except:
             raise LtdErrorException(usage)
 
-        ACTION(actions.group.Group).cancel(session_id, nick, **opts)
+        return ACTION(actions.group.Group).cancel(session_id, nick, **opts)
 
-@command("talk")
+@command("talk", login=True, min=1, max=2)
 class Talk:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         usage = "Usage: talk {-q} {-d} {-r} {-n nick|-s address}"
 
@@ -672,146 +518,127 @@ class Talk:
         except:
             raise LtdErrorException(usage)
 
-        ACTION(actions.group.Group).talk(session_id, nick, **opts)
+        return ACTION(actions.group.Group).talk(session_id, nick, **opts)
 
-@command("boot")
+@command("boot", login=True, min=1, max=2, arg=Argument("Nick Name", validate.NICK_MIN, validate.NICK_MAX))
 class Boot:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="Nick Name", min=validate.NICK_MIN, max=validate.NICK_MAX)
     def process(session_id, fields):
         if not fields[0]:
             raise LtdErrorException("Usage: /boot {nick}")
 
-        ACTION(actions.group.Group).boot(session_id, fields[0])
+        return ACTION(actions.group.Group).boot(session_id, fields[0])
 
-@command("pass")
+@command("pass", login=True, min=1, max=2)
 class Pass:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields[0]:
-            ACTION(actions.group.Group).pass_over(session_id, fields[0])
+            return ACTION(actions.group.Group).pass_over(session_id, fields[0])
         else:
-            ACTION(actions.group.Group).relinquish(session_id)
+            return ACTION(actions.group.Group).relinquish(session_id)
 
-@command("reputation")
+@command("reputation", login=True, min=1, max=2, arg=Argument("Nick Name", validate.NICK_MIN, validate.NICK_MAX))
 class Reputation:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
-    @arglength(display="Nick Name", min=validate.NICK_MIN, max=validate.NICK_MAX)
     def process(session_id, fields):
         if not fields[0]:
             raise LtdErrorException("Usage: /reputation {nick}")
 
-        ACTION(actions.admin.Admin).get_reputation(session_id, fields[0], msgid(fields))
+        return ACTION(actions.admin.Admin).get_reputation(session_id, fields[0], msgid(fields))
 
-@command("wall")
+@command("wall", login=True, min=1, max=2)
 class Wall:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if not fields[0]:
             raise LtdErrorException("Usage: /wall {message}")
 
-        ACTION(actions.admin.Admin).wall(session_id, fields[0])
+        return ACTION(actions.admin.Admin).wall(session_id, fields[0])
 
-@command("log")
+@command("log", login=True, min=1, max=2)
 class Log:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields[0] and not fields[0].isdigit():
             raise LtdErrorException("Usage: /log {level}")
 
         if fields[0]:
-            ACTION(actions.admin.Admin).set_log_level(session_id, int(fields[0]), msgid(fields))
+            return ACTION(actions.admin.Admin).set_log_level(session_id, int(fields[0]), msgid(fields))
         else:
-            ACTION(actions.admin.Admin).log_level(session_id, msgid(fields))
+            return ACTION(actions.admin.Admin).log_level(session_id, msgid(fields))
+
+@command("metrics", login=True, min=1, max=2)
+class Metrics:
+    @staticmethod
+    def process(session_id, fields):
+        if fields[0]:
+            raise LtdErrorException("Usage: /metrics")
 
-@command("drop")
+        return ACTION(actions.admin.Admin).metrics(session_id, msgid(fields))
+
+@command("drop", login=True, min=1, max=2)
 class Drop:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if not fields[0]:
             raise LtdErrorException("Usage: /drop {nicknames}")
 
         nicks = [n.strip() for n in fields[0].split(" ")]
 
-        ACTION(actions.admin.Admin).drop(session_id, nicks)
+        return ACTION(actions.admin.Admin).drop(session_id, nicks)
 
-@command("shutdown")
+@command("shutdown", login=True, count=1)
 class Shutdown:
     @staticmethod
-    @loginrequired
-    @fieldslength(count=1)
     def process(session_id, fields):
         delay = int(fields[0]) if (fields[0] and fields[0].isdigit()) else 60
 
-        ACTION(actions.admin.Admin).shutdown(session_id, max(delay, 0), restart=False)
+        return ACTION(actions.admin.Admin).shutdown(session_id, max(delay, 0), restart=False)
 
-@command("restart")
+@command("restart", login=True, count=1)
 class Restart:
     @staticmethod
-    @loginrequired
-    @fieldslength(count=1)
     def process(session_id, fields):
         delay = int(fields[0]) if (fields[0] and fields[0].isdigit()) else 60
 
-        ACTION(actions.admin.Admin).shutdown(session_id, max(delay, 0), restart=True)
+        return ACTION(actions.admin.Admin).shutdown(session_id, max(delay, 0), restart=True)
 
-@command("abort")
+@command("abort", login=True, count=1)
 class AbortShutdown:
     @staticmethod
-    @loginrequired
-    @fieldslength(count=1)
     def process(session_id, fields):
-        ACTION(actions.admin.Admin).cancel_shutdown(session_id)
+        return ACTION(actions.admin.Admin).cancel_shutdown(session_id)
 
-@command("help")
+@command("help", login=True, min=1, max=2)
 class Help:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields[0]:
             ACTION(actions.help.Help).query(session_id, fields[0], msgid(fields))
         else:
             ACTION(actions.help.Help).introduction(session_id, msgid(fields))
 
-@command("ipfilter")
+@command("ipfilter", login=True, min=1, max=2)
 class Deny:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         argv = [s.strip() for s in fields[0].split(" ")]
 
-        ACTION(actions.admin.Admin).ipfilter(session_id, argv)
+        return ACTION(actions.admin.Admin).ipfilter(session_id, argv)
 
-@command("v")
+@command("v", login=True, min=1, max=2)
 class Version:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields[0]:
             raise LtdErrorException("Usage: /v")
 
         ACTION(actions.info.Info).version(session_id, msgid(fields))
 
-@command("stats")
+@command("stats", login=True, min=1, max=2)
 class Stats:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         usage = "Usage: /stats {-s|-t|-m|-y|-a}"
 
@@ -821,17 +648,15 @@ class Stats:
             if rest:
                 raise LtdErrorException(usage)
 
-            ACTION(actions.info.Info).stats(session_id, **opts, msgid=msgid(fields))
+            return ACTION(actions.info.Info).stats(session_id, **opts, msgid=msgid(fields))
         except LtdErrorException as ex:
             raise ex
         except:
             raise LtdErrorException(usage)
 
-@command("news")
+@command("news", login=True, min=1, max=2)
 class News:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=1, max=2)
     def process(session_id, fields):
         if fields[0] and not fields[0].isdigit():
             raise LtdErrorException("Usage: /news {item}")
@@ -844,43 +669,124 @@ class News:
 COMMANDS = {cls.command: cls() for cls in filter(lambda cls: isinstance(cls, type) and "command" in cls.__dict__,
                                                  sys.modules[__name__].__dict__.values())}
 
-@code("h")
+@code("h", login=True, text=True, catch=True, min=1, max=3)
 class Command:
     @staticmethod
-    @loginrequired
-    @textfields
-    @catchltdexceptions
-    @fieldslength(min=1, max=3)
-    def process(session_id, fields):
-        cmd = COMMANDS.get(fields[0])
+    def process(session_id, fields, commands):
+        cmd = commands.get(fields[0])
 
         if not cmd:
             raise LtdErrorException("Unsupported command: '%s'" % fields[0])
 
-        cmd.process(session_id, fields[1:])
+        return cmd(session_id, fields[1:])
 
-@code("l")
+@code("l", login=True, text=True, catch=True, min=0, max=2)
 class Ping:
     @staticmethod
-    @loginrequired
-    @textfields
-    @catchltdexceptions
-    @fieldslength(min=0, max=2)
     def process(session_id, fields):
         ACTION(actions.ping.Ping).ping(session_id, msgid(fields))
 
-@code("m")
+@code("m", login=True, min=0, max=2)
 class Pong:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=0, max=2)
     def process(session_id, fields):
         pass
 
-@code("n")
+@code("n", login=True, min=0, max=2)
 class Noop:
     @staticmethod
-    @loginrequired
-    @fieldslength(min=0, max=2)
     def process(session_id, fields):
         pass
+
+MESSAGES = {cls.code: cls for cls in filter(lambda cls: isinstance(cls, type) and "code" in cls.__dict__,
+                                            sys.modules[__name__].__dict__.values())}
+
+def compile_handler(schema, fn, sessions, broker):
+    login = schema.login
+    text = schema.text
+    catch = schema.catch
+    count = schema.count
+    min = schema.min
+    max = schema.max
+    arg = schema.arg is not None
+
+    if arg:
+        at = schema.arg.at
+        arg_min = schema.arg.min
+        arg_max = schema.arg.max
+        display = schema.arg.display
+
+    async def await_result(session_id, result):
+        try:
+            await result
+
+        except LtdResponseException as ex:
+            broker.deliver(session_id, ex.response)
+
+    def process(session_id, fields):
+        if login and not sessions.get(session_id).loggedin:
+            raise LtdErrorException("Login required.")
+
+        if text:
+            fields = fields.text
+
+        result = None
+
+        try:
+            length = len(fields)
+
+            if count > 0 and length != count:
+                raise LtdErrorException("Malformed message, wrong number of fields.")
+
+            if length < min:
+                raise LtdErrorException("Malformed message, missing fields.")
+
+            if max > min and length > max:
+                raise LtdErrorException("Malformed message, too many fields.")
+
+            if arg:
+                length = len(fields[at])
+
+                if length < arg_min:
+                    if arg_min == 1:
+                        raise LtdErrorException("%s cannot be empty." % display)
+
+                    raise LtdErrorException("%s requires at least %d characters." % (display, arg_min))
+
+                if arg_max > arg_min and length > arg_max:
+                    raise LtdErrorException("%s exceeds allowed maximum length (%d characters)." % (display, arg_max))
+
+            result = fn(session_id, fields)
+
+            if catch and inspect.isawaitable(result):
+                result = await_result(session_id, result)
+
+        except LtdResponseException as ex:
+            if not catch:
+                raise
+
+            broker.deliver(session_id, ex.response)
+
+        return result
+
+    return process
+
+class Registry(di.Injected):
+    def __init__(self):
+        super().__init__()
+
+        self.__commands = {name: self.__compile__(cls.schema, cls.process) for name, cls in COMMANDS.items()}
+        self.__messages = {id: self.__compile__(cls.schema, cls.process) for id, cls in MESSAGES.items()}
+
+        self.__messages[Command.code] = self.__compile__(Command.schema, functools.partial(Command.process,
+                                                                                           commands=self.__commands))
+
+    def inject(self, session: session.Store, broker: broker.Broker):
+        self.__session = session
+        self.__broker = broker
+
+    def __compile__(self, schema, fn):
+        return compile_handler(schema, fn, self.__session, self.__broker)
+
+    def get(self, type_id):
+        return self.__messages.get(type_id)
@@ -0,0 +1,256 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import logging
+import asyncio
+import threading
+from bisect import bisect_left
+from timeit import default_timer as timer
+import di
+import url
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+FANOUT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.__buckets = buckets
+        self.__counts = [0] * (len(buckets) + 1)
+        self.__sum = 0.0
+        self.__count = 0
+
+    def observe(self, value):
+        self.__counts[bisect_left(self.__buckets, value)] += 1
+        self.__sum += value
+        self.__count += 1
+
+    @property
+    def count(self):
+        return self.__count
+
+    @property
+    def sum(self):
+        return self.__sum
+
+    def cumulative(self):
+        total = 0
+
+        for le, n in zip(self.__buckets + (float("inf"),), self.__counts):
+            total += n
+
+            yield le, total
+
+    def quantile(self, q):
+        value = 0.0
+
+        if self.__count:
+            rank = q * self.__count
+
+            for le, total in self.cumulative():
+                value = le
+
+                if total >= rank:
+                    break
+
+        return value
+
+class Metrics:
+    def __init__(self):
+        self.__messages = {}
+        self.__handlers = {}
+        self.__fanout = Histogram(FANOUT_BUCKETS)
+        self.__db_scopes = Histogram(LATENCY_BUCKETS)
+        self.__loop_lag = Histogram(LATENCY_BUCKETS)
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def message_received(self, type_id, size):
+        counters = self.__messages.get(type_id)
+
+        if counters is None:
+            counters = self.__messages[type_id] = [0, 0]
+
+        counters[0] += 1
+        counters[1] += size
+
+    def message_processed(self, type_id, command, elapsed):
+        key = (type_id, command)
+
+        histogram = self.__handlers.get(key)
+
+        if histogram is None:
+            histogram = self.__handlers[key] = Histogram(LATENCY_BUCKETS)
+
+        histogram.observe(elapsed)
+
+    def fanout(self, receivers):
+        self.__fanout.observe(receivers)
+
+    def loop_lag(self, lag):
+        self.__loop_lag.observe(lag)
+
+    def scope_entered(self, scope):
+        self.__local.t_entered = timer()
+
+    def scope_leaved(self, scope):
+        elapsed = timer() - self.__local.t_entered
+
+        with self.__lock:
+            self.__db_scopes.observe(elapsed)
+
+    @property
+    def messages(self):
+        return sorted(self.__messages.items())
+
+    @property
+    def handlers(self):
+        return sorted(self.__handlers.items())
+
+    @property
+    def fanouts(self):
+        return self.__fanout
+
+    @property
+    def db_scopes(self):
+        return self.__db_scopes
+
+    @property
+    def loop_lags(self):
+        return self.__loop_lag
+
+    def export(self):
+        lines = ["# HELP icbd_messages_received_total Received messages by LTD type.",
+                 "# TYPE icbd_messages_received_total counter"]
+
+        for type_id, (count, _) in self.messages:
+            lines.append('icbd_messages_received_total{type="%s"} %d' % (escape(type_id), count))
+
+        lines.extend(["# HELP icbd_message_bytes_received_total Received bytes by LTD type.",
+                      "# TYPE icbd_message_bytes_received_total counter"])
+
+        for type_id, (_, size) in self.messages:
+            lines.append('icbd_message_bytes_received_total{type="%s"} %d' % (escape(type_id), size))
+
+        lines.extend(["# HELP icbd_handler_seconds Message handler latency by LTD type and command.",
+                      "# TYPE icbd_handler_seconds histogram"])
+
+        for (type_id, command), histogram in self.handlers:
+            add_histogram(lines, "icbd_handler_seconds", 'type="%s",command="%s"' % (escape(type_id), escape(command)), histogram)
+
+        lines.extend(["# HELP icbd_fanout_receivers Receivers per channel message.",
+                      "# TYPE icbd_fanout_receivers histogram"])
+
+        add_histogram(lines, "icbd_fanout_receivers", "", self.__fanout)
+
+        lines.extend(["# HELP icbd_db_scope_seconds Duration of database transaction scopes.",
+                      "# TYPE icbd_db_scope_seconds histogram"])
+
+        with self.__lock:
+            add_histogram(lines, "icbd_db_scope_seconds", "", self.__db_scopes)
+
+        lines.extend(["# HELP icbd_loop_lag_seconds Event loop scheduling delay.",
+                      "# TYPE icbd_loop_lag_seconds histogram"])
+
+        add_histogram(lines, "icbd_loop_lag_seconds", "", self.__loop_lag)
+
+        lines.append("")
+
+        return "\n".join(lines)
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def add_histogram(lines, name, labels, histogram):
+    sep = "," if labels else ""
+
+    for le, total in histogram.cumulative():
+        lines.append('%s_bucket{%s%sle="%s"} %d' % (name, labels, sep, "+Inf" if le == float("inf") else repr(le), total))
+
+    suffix = "{%s}" % labels if labels else ""
+
+    lines.append("%s_sum%s %r" % (name, suffix, histogram.sum))
+    lines.append("%s_count%s %d" % (name, suffix, histogram.count))
+
+class ExporterProtocol(asyncio.Protocol):
+    def __init__(self, metrics):
+        self.__metrics = metrics
+        self.__transport = None
+        self.__buffer = bytearray()
+
+    def connection_made(self, transport):
+        self.__transport = transport
+
+    def data_received(self, data):
+        self.__buffer.extend(data)
+
+        if b"\r\n\r\n" in self.__buffer or b"\n\n" in self.__buffer:
+            self.__respond__()
+
+    def eof_received(self):
+        self.__respond__()
+
+    def __respond__(self):
+        if not self.__transport.is_closing():
+            body = self.__metrics.export().encode()
+
+            self.__transport.write(b"HTTP/1.0 200 OK\r\n"
+                                   b"Content-Type: text/plain; version=0.0.4\r\n"
+                                   b"Content-Length: %d\r\n\r\n" % len(body))
+            self.__transport.write(body)
+            self.__transport.close()
+
+class Exporter(di.Injected):
+    def __init__(self, binding):
+        self.__binding = binding
+
+        di.Injected.__init__(self)
+
+    def inject(self, log: logging.Logger, metrics: Metrics):
+        self.__log = log
+        self.__metrics = metrics
+        self.__server = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+
+        self.__log.info("Starting metrics exporter: %s", self.__binding)
+
+        binding = url.parse_server_address(self.__binding)
+
+        if binding["protocol"] == "unix":
+            self.__log.info("Listening on %s (unix)", binding["path"])
+
+            self.__server = await loop.create_unix_server(lambda: ExporterProtocol(self.__metrics), binding["path"])
+        else:
+            raise NotImplementedError("Unsupported protocol: %s", binding["protocol"])
+
+        await self.__server.start_serving()
+
+    async def close(self):
+        self.__log.info("Stopping metrics exporter.")
+
+        self.__server.close()
+
+        await self.__server.wait_closed()
@@ -0,0 +1,400 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import getopt
+import sys
+import timeit
+import random
+import time
+import traceback
+import logging
+import inspect
+import functools
+from collections import deque
+import config
+import log
+import metrics
+import session
+import session.memory
+import broker
+import broker.memory
+import group
+import group.memory
+import reputation
+import reputation.memory
+import nickdb
+import statsdb
+import ltd
+import timer
+import di
+import textutils
+from actions import ACTION
+import actions.usersession
+import actions.away
+import actions.notification
+import actions.openmessage
+import actions.ping
+import actions.privatemessage
+import messages
+from transform import Transform
+
+def measure(fn, number, repeat):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+def new_container():
+    container = di.default_container
+
+    container.clear()
+
+    container.register(logging.Logger, log.new_logger("icbd", log.Verbosity.ERROR, log.SIMPLE_TEXT_FORMAT))
+    container.register(config.Config, config.Config())
+    container.register(metrics.Metrics, metrics.Metrics())
+    container.register(session.Store, session.memory.Store())
+    container.register(session.AwayTimeoutTable, timer.TimeoutTable())
+    container.register(session.NotificationTimeoutTable, timer.TimeoutTable())
+    container.register(reputation.Reputation, reputation.memory.Reputation())
+    container.register(broker.Broker, broker.memory.Broker())
+    container.register(group.Store, group.memory.Store())
+
+    for T in (nickdb.Connection, nickdb.NickDb, statsdb.Connection, statsdb.StatsDb):
+        container.register(T, None)
+
+    return container
+
+class RecursiveDecoder:
+    def __init__(self):
+        self.__buffer = bytearray()
+        self.__listeners = []
+
+    def add_listener(self, listener):
+        self.__listeners.append(listener)
+
+    def write(self, data):
+        self.__buffer.extend(data)
+        self.__process__()
+
+    def __process__(self):
+        length = len(self.__buffer)
+
+        if length >= 2 and length - 1 >= self.__buffer[0]:
+            p_length = self.__buffer[0]
+
+            for f in self.__listeners:
+                f(chr(self.__buffer[1]), self.__buffer[2:p_length + 1])
+
+            self.__buffer = self.__buffer[p_length + 1:]
+            self.__process__()
+
+def bench_decoder(opts):
+    rows = []
+
+    limit = sys.getrecursionlimit()
+
+    try:
+        for frames in (1, 100, 10000):
+            chunk = b"".join(ltd.encode_str("b", "message %d" % i) for i in range(frames))
+
+            sys.setrecursionlimit(max(limit, frames + 1000))
+
+            results = []
+
+            for decoder in (RecursiveDecoder(), ltd.Decoder()):
+                decoder.add_listener(lambda type_id, payload: None)
+
+                elapsed = measure(lambda: decoder.write(chunk), max(1, opts["frames"] // frames), opts["repeat"])
+
+                results.append("%.3f us/frame" % (elapsed / frames * 1000000.0))
+
+            rows.append(("%d frame(s)/chunk" % frames, "recursive %s, current %s" % tuple(results)))
+    finally:
+        sys.setrecursionlimit(limit)
+
+    return rows
+
+def bench_fanout(opts):
+    container = new_container()
+
+    sessions = container.resolve(session.Store)
+    channels = broker.memory.Broker()
+    sink = deque(maxlen=1)
+
+    rows = []
+
+    for members in (10, 1000, 10000):
+        channel = "fanout%d" % members
+        sender = None
+
+        for i in range(members):
+            session_id = sessions.new(loginid="bench", host="localhost", nick="f%d_%d" % (members, i), group=channel)
+
+            channels.add_session(session_id, sink.append)
+            channels.join(session_id, channel)
+
+            sender = sender or session_id
+
+        e = ltd.Encoder("b", origin=sender)
+
+        e.add_field_str("f%d_0" % members, append_null=False)
+        e.add_field_str("benchmark message", append_null=True)
+
+        frame = e.encode()
+
+        elapsed = measure(lambda: channels.to_channel_from(sender, channel, frame), max(1, opts["frames"] // members), opts["repeat"])
+
+        rows.append(("%d members" % members, "%.2f us/message, %.3f us/receiver" % (elapsed * 1000000.0,
+                                                                                    elapsed / (members - 1) * 1000000.0)))
+
+    return rows
+
+def bench_sessions(opts):
+    sessions = session.memory.Store()
+
+    rows = []
+
+    for count in (1000, 10000, 50000):
+        for i in range(len(sessions), count):
+            sessions.new(loginid="bench", host="localhost", nick="s%d" % i, group="g%d" % (i % 100))
+
+        nicks = ["S%d" % random.randrange(count) for _ in range(1000)]
+
+        def lookup():
+            for nick in nicks:
+                sessions.find_nick(nick)
+                sessions.count_logins()
+                sessions.get_members("g1")
+
+        elapsed = measure(lookup, max(1, opts["frames"] // 10000), opts["repeat"]) / len(nicks)
+
+        rows.append(("%d sessions" % count, "%.3f us/message" % (elapsed * 1000000.0)))
+
+    return rows
+
+def bench_idle(opts):
+    scheduler = timer.Scheduler()
+
+    for i in range(opts["sessions"]):
+        scheduler.schedule(i, 60.0 + random.random() * 60.0)
+
+    idle = measure(scheduler.expired, 1000, opts["repeat"])
+
+    due = max(1, opts["sessions"] // 45)
+    busy = None
+
+    for _ in range(opts["repeat"]):
+        for i in range(due):
+            scheduler.schedule(i, 0.0)
+
+        started = time.process_time()
+
+        for k in scheduler.expired():
+            scheduler.schedule(k, 45.0)
+
+        elapsed = time.process_time() - started
+
+        busy = elapsed if busy is None else min(busy, elapsed)
+
+    return [("%d sessions, none due" % opts["sessions"], "%.3f us/tick" % (idle * 1000000.0)),
+            ("%d sessions, %d due" % (opts["sessions"], due), "%.3f ms/tick" % (busy * 1000.0))]
+
+def bench_di(opts):
+    new_container()
+
+    rows = []
+
+    for T in (actions.openmessage.OpenMessage, actions.privatemessage.PrivateMessage, actions.ping.Ping, actions.away.Away):
+        started = time.perf_counter()
+
+        ACTION(T)
+
+        startup = time.perf_counter() - started
+
+        lookup = measure(lambda: ACTION(T), opts["frames"], opts["repeat"])
+        spec = measure(lambda: inspect.getfullargspec(T.inject), opts["frames"] // 10, opts["repeat"])
+        construction = measure(T, opts["frames"] // 10, opts["repeat"])
+
+        rows.append((T.__name__, "%.1f us startup, %.3f us/message (argspec %.2f us, construction %.2f us)"
+                                 % (startup * 1000000.0, lookup * 1000000.0, spec * 1000000.0, construction * 1000000.0)))
+
+    return rows
+
+def bench_transform(opts):
+    new_container()
+
+    transform = Transform()
+
+    payloads = [b"m\1bob hello there, how are you?\0",
+                b"m\1server ?\0",
+                b"w\1\0",
+                b"shush\1carol\0",
+                b"topic\1some new topic\0"]
+
+    def process():
+        for payload in payloads:
+            transform.transform(ltd.Message.parse("h", payload)).text
+
+    elapsed = measure(process, opts["frames"] // len(payloads), opts["repeat"]) / len(payloads)
+
+    return [("Commands", "%.0f commands/s, %.3f us/command" % (1.0 / elapsed, elapsed * 1000000.0))]
+
+def dispatch_fields(schema):
+    count = schema.count or max(schema.min, 1)
+    length = max(schema.arg.min, 1) if schema.arg else 8
+
+    return [b"x" * length] * count
+
+def bench_dispatch(opts):
+    container = new_container()
+
+    sessions = container.resolve(session.Store)
+    channels = container.resolve(broker.Broker)
+
+    session_id = sessions.new(loginid="bench", host="localhost", nick="dispatch", group="bench")
+
+    noop = lambda session_id, fields: None
+
+    commands = {name: messages.compile_handler(cls.schema, noop, sessions, channels) for name, cls in messages.COMMANDS.items()}
+    handlers = {id: messages.compile_handler(cls.schema, noop, sessions, channels) for id, cls in messages.MESSAGES.items()}
+
+    handlers[messages.Command.code] = messages.compile_handler(messages.Command.schema,
+                                                               functools.partial(messages.Command.process, commands=commands),
+                                                               sessions,
+                                                               channels)
+
+    frames = [(id, dispatch_fields(cls.schema)) for id, cls in messages.MESSAGES.items() if id != messages.Command.code]
+    frames.extend((messages.Command.code, [name.encode()] + dispatch_fields(cls.schema)) for name, cls in messages.COMMANDS.items())
+
+    def dispatch():
+        for type_id, fields in frames:
+            handlers[type_id](session_id, ltd.Message(type_id, fields))
+
+    elapsed = measure(dispatch, max(1, opts["frames"] // len(frames)), opts["repeat"]) / len(frames)
+
+    @textutils.tolower(argnames=["nick", "email"])
+    def lookup(scope, nick, email):
+        pass
+
+    lowered = measure(lambda: lookup(None, "Nick", "Mail"), opts["frames"], opts["repeat"])
+
+    return [("%d handlers" % len(frames), "%.0f dispatches/s, %.3f us/dispatch" % (1.0 / elapsed, elapsed * 1000000.0)),
+            ("tolower", "%.3f us/call" % (lowered * 1000000.0))]
+
+def bench_notify(opts):
+    rows = []
+
+    for watching in (False, True):
+        container = new_container()
+
+        sessions = container.resolve(session.Store)
+        channels = container.resolve(broker.Broker)
+        notifications = []
+
+        ids = []
+
+        for i in range(opts["logins"]):
+            session_id = sessions.new(loginid="u%d" % i, host="h%d" % (i % 500), nick="n%d" % i, group="g%d" % (i % 100))
+
+            channels.add_session(session_id, notifications.append)
+
+            if watching:
+                state = sessions.get(session_id)
+
+                for _ in range(5):
+                    state.notifylist.watch_nick("n%d" % random.randrange(opts["logins"]))
+
+                state.notifylist.watch_site("u%d@h%d" % (random.randrange(opts["logins"]), random.randrange(500)))
+
+                sessions.set(session_id, state)
+
+            ids.append(session_id)
+
+        notify = ACTION(actions.notification.Notify)
+
+        started = time.perf_counter()
+
+        for session_id in ids:
+            notify.notify_signon(session_id)
+
+        elapsed = time.perf_counter() - started
+
+        rows.append(("%s notify lists" % ("With" if watching else "Without"),
+                     "%d logins in %.2f s, %d notification(s)" % (opts["logins"], elapsed, len(notifications))))
+
+    return rows
+
+SCENARIOS = {"decoder": bench_decoder,
+             "fanout": bench_fanout,
+             "sessions": bench_sessions,
+             "idle": bench_idle,
+             "di": bench_di,
+             "transform": bench_transform,
+             "dispatch": bench_dispatch,
+             "notify": bench_notify}
+
+def run(opts):
+    for name in opts["scenarios"]:
+        print("%s:" % name)
+
+        for label, value in SCENARIOS[name](opts):
+            print("  %-28s%s" % (label + ":", value))
+
+def get_opts(argv):
+    options, _ = getopt.getopt(argv, 's:r:', ['scenarios=', 'repeat=', 'frames=', 'sessions=', 'logins='])
+
+    m = {"scenarios": list(SCENARIOS),
+         "repeat": 5,
+         "frames": 100000,
+         "sessions": 100000,
+         "logins": 10000}
+
+    for opt, arg in options:
+        if opt in ('-s', '--scenarios'):
+            m["scenarios"] = [name.strip() for name in arg.split(",") if name.strip()]
+        elif opt in ('-r', '--repeat'):
+            m["repeat"] = int(arg)
+        elif opt in ('--frames',):
+            m["frames"] = int(arg)
+        elif opt in ('--sessions',):
+            m["sessions"] = int(arg)
+        elif opt in ('--logins',):
+            m["logins"] = int(arg)
+
+    for name in m["scenarios"]:
+        if name not in SCENARIOS:
+            raise getopt.GetoptError("Unsupported scenario: %s" % name)
+
+    if m["repeat"] < 1 or m["frames"] < 10 or m["sessions"] < 1 or m["logins"] < 1:
+        raise getopt.GetoptError("Repeat count, sessions and logins must be positive, at least 10 frames are required.")
+
+    return m
+
+if __name__ == "__main__":
+    try:
+        opts = get_opts(sys.argv[1:])
+
+        run(opts)
+    except getopt.GetoptError as ex:
+        print(str(ex))
+    except:
+        traceback.print_exc()
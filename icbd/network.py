@@ -25,12 +25,13 @@
 """
 import logging
 import asyncio
-import socket
+import inspect
+from collections import deque
 import ssl
+import socket
 import traceback
-from datetime import datetime
+from datetime import datetime, timedelta
 from getpass import getuser
-import math
 import core
 import config
 import config.json
@@ -42,6 +43,7 @@ import group
 import nickdb
 import statsdb
 import reputation
+import resolver
 import url
 import shutdown
 import session
@@ -50,6 +52,7 @@ import confirmation
 import passwordreset
 import timer
 import dateutils
+import metrics
 from actions import ACTION
 import actions.usersession
 import ltd
@@ -57,12 +60,9 @@ import messages
 from transform import Transform
 from exception import LtdResponseException, LtdErrorException
 
-MESSAGES = {cls.code: cls for cls in filter(lambda cls: isinstance(cls, type) and "code" in cls.__dict__,
-                                            messages.__dict__.values())}
-
-class ICBServerProtocol(asyncio.Protocol, di.Injected):
+class ICBServerProtocol(asyncio.BufferedProtocol, di.Injected):
     def __init__(self, connections):
-        asyncio.Protocol.__init__(self)
+        asyncio.BufferedProtocol.__init__(self)
         di.Injected.__init__(self)
 
         self.__connections = connections
@@ -73,14 +73,23 @@ class ICBServerProtocol(asyncio.Protocol, di.Injected):
                broker: broker.Broker,
                session_store: session.Store,
                away_table: session.AwayTimeoutTable,
-               reputation: reputation.Reputation):
+               notification_table: session.NotificationTimeoutTable,
+               reputation: reputation.Reputation,
+               resolver: resolver.Resolver,
+               scheduler: timer.Scheduler,
+               metrics: metrics.Metrics,
+               registry: messages.Registry):
         self.__log = log
         self.__config = config
         self.__broker = broker
         self.__session_store = session_store
         self.__away_table = away_table
-        self.__notification_table = away_table
+        self.__notification_table = notification_table
         self.__reputation = reputation
+        self.__resolver = resolver
+        self.__scheduler = scheduler
+        self.__metrics = metrics
+        self.__registry = registry
 
     def connection_made(self, transport):
         address = transport.get_extra_info("peername")
@@ -94,90 +103,147 @@ class ICBServerProtocol(asyncio.Protocol, di.Injected):
             self.__log.info("Cipher: %s", cipher)
             tls = True
 
+        self.__tune_socket__(transport.get_extra_info("socket"))
+
         self.__transport = transport
+        self.__transport.set_write_buffer_limits(high=self.__config.server_output_high_watermark,
+                                                 low=self.__config.server_output_low_watermark)
+        self.__queue = deque()
+        self.__queued_bytes = 0
+        self.__dropped_frames = 0
+        self.__writing_paused = False
+        self.__flush_handle = None
+        self.__evicted = False
         self.__session_id = self.__session_store.new(ip=address[0],
-                                                     host=socket.getfqdn(address[0]),
+                                                     host=address[0],
                                                      tls=tls,
                                                      t_recv=timer.Timer(),
                                                      t_alive=timer.Timer())
         self.__broker.add_session(self.__session_id, self.__handle_write__)
         self.__reputation.add_session(self.__session_id)
-        self.__buffer = bytearray()
         self.__decoder = ltd.Decoder()
         self.__decoder.add_listener(self.__message_received__)
         self.__transform = Transform()
         self.__shutdown = False
+        self.__pending = None
 
         self.__log.debug("Session created successfully: %s", self.__session_id)
 
         self.__connections[self.__session_id] = self
 
+        self.__scheduler.schedule(self.__session_id, min(self.__config.timeouts_ping, self.__config.timeouts_connection))
+
         self.__write_protocol_info__()
 
-    def __handle_write__(self, message):
-        if not self.__reject__(message):
-            self.__transport.write(message)
+        loop = asyncio.get_running_loop()
 
-        self.__shutdown = (len(message) >= 2 and message[1] == 103) # quit message ("g")
+        loop.create_task(self.__resolve_host__(address[0]))
 
-    def __reject__(self, message):
-        rejected = False
+    async def __resolve_host__(self, ip):
+        host = await self.__resolver.resolve(ip)
 
-        if len(message) >= 5 and (message[1] == 98 or message[1] == 99): # public or private message
+        if host and self.__session_id in self.__connections:
             state = self.__session_store.get(self.__session_id)
 
-            if not state.hushlist.empty():
-                is_public = message[1] == 98
+            if state.ip == ip:
+                self.__log.debug("Host name resolved: %s (%s)", host, ip)
 
-                sender = self.__message_from__(message)
+                self.__session_store.update(self.__session_id, host=host)
 
-                rejected = self.__hushed__(state.hushlist, sender, public=is_public)
+    @property
+    def queued_bytes(self):
+        return self.__queued_bytes
 
-                if rejected and message[1] == 99:
-                    self.__notify_sender__(sender)
+    @property
+    def dropped_frames(self):
+        return self.__dropped_frames
 
-        return rejected
+    def __handle_write__(self, frame):
+        self.__enqueue__(frame)
 
-    def __message_from__(self, message):
-        payload = message[2:]
-        index = payload.find(1)
+        self.__shutdown = self.__shutdown or frame.type_id == "g"
 
-        sender = None
+    def __enqueue__(self, frame):
+        if not self.__evicted:
+            self.__queue.append(frame)
+            self.__queued_bytes += len(frame)
 
-        if index > 0:
-            sender = payload[:index].decode("UTF-8", errors="backslashreplace").strip()
+            if self.__writing_paused:
+                if self.__queued_bytes > self.__config.server_output_queue_limit:
+                    self.__evict__()
+            elif not self.__flush_handle:
+                loop = asyncio.get_running_loop()
 
-        return sender
+                self.__flush_handle = loop.call_soon(self.__flush__)
 
-    def __hushed__(self, hushlist, sender, public):
-        hushed = False
+    def __flush__(self):
+        self.__flush_handle = None
 
-        if public:
-            hushed = hushlist.nick_public_hushed(sender)
-        else:
-            hushed = hushlist.nick_private_hushed(sender)
+        if not self.__writing_paused and self.__queue:
+            if not self.__transport.is_closing():
+                self.__transport.writelines(self.__queue)
 
-        if not hushed:
-            sender_session = self.__session_store.find_nick(sender)
-            sender_state = self.__session_store.get(sender_session)
+            self.__queue.clear()
+            self.__queued_bytes = 0
 
-            if public:
-                hushed = hushlist.site_public_hushed(sender_state.address)
-            else:
-                hushed = hushlist.site_private_hushed(sender_state.address)
+    def __evict__(self):
+        limit = self.__config.server_output_queue_limit
+
+        if self.__config.server_output_slow_consumer_policy == "drop":
+            kept = []
+
+            while self.__queue and self.__queued_bytes > limit:
+                frame = self.__queue.popleft()
 
-        return hushed
+                if frame.type_id == "b":
+                    self.__queued_bytes -= len(frame)
+                    self.__dropped_frames += 1
+                else:
+                    kept.append(frame)
 
-    def __notify_sender__(self, sender):
-        session_id = self.__session_store.find_nick(sender)
+            self.__queue.extendleft(reversed(kept))
 
-        if session_id:
-            self.__broker.deliver(session_id, ltd.encode_status_msg("Bounce", "Message did not go trough."))
+            self.__log.debug("Dropped public messages (session='%s', dropped=%d, queued=%d).",
+                             self.__session_id,
+                             self.__dropped_frames,
+                             self.__queued_bytes)
 
-    def data_received(self, data):
+        if self.__queued_bytes > limit:
+            self.__log.info("Disconnecting slow consumer: '%s' (queued=%d)", self.__session_id, self.__queued_bytes)
+
+            self.__evicted = True
+            self.__shutdown = True
+            self.__queue.clear()
+            self.__queued_bytes = 0
+
+            self.__transport.write(ltd.encode_status_msg("Drop", "Connection too slow, disconnecting."))
+            self.__transport.close()
+
+    def pause_writing(self):
+        self.__writing_paused = True
+
+    def resume_writing(self):
+        self.__writing_paused = False
+
+        self.__flush__()
+
+    def __tune_socket__(self, sock):
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(self.__config.server_socket_tcp_no_delay))
+
+            if self.__config.server_socket_send_buffer > 0:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.__config.server_socket_send_buffer)
+
+            if self.__config.server_socket_receive_buffer > 0:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.__config.server_socket_receive_buffer)
+
+    def get_buffer(self, sizehint):
+        return self.__decoder.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
         if not self.__shutdown:
             try:
-                self.__decoder.write(data)
+                self.__decoder.buffer_updated(nbytes)
 
             except LtdResponseException as ex:
                 self.__broker.deliver(self.__session_id, ex.response)
@@ -206,6 +272,8 @@ class ICBServerProtocol(asyncio.Protocol, di.Injected):
 
         del self.__connections[self.__session_id]
 
+        self.__scheduler.cancel(self.__session_id)
+
         self.__broker.remove_session(self.__session_id)
         self.__session_store.delete(self.__session_id)
         self.__away_table.remove_source(self.__session_id)
@@ -219,9 +287,21 @@ class ICBServerProtocol(asyncio.Protocol, di.Injected):
         self.__transport.abort()
 
     def __message_received__(self, type_id, payload):
+        if self.__pending is None:
+            self.__process_message__(type_id, payload)
+        else:
+            self.__pending.append((type_id, bytes(payload)))
+
+    def __process_message__(self, type_id, payload):
         self.__log.debug("Received message: type='%s', session='%s', payload (size=%d)", type_id, self.__session_id, len(payload))
 
-        type_id, payload = self.__transform.transform(type_id, payload)
+        t = timer.Timer()
+
+        message = self.__transform.transform(ltd.Message.parse(type_id, payload))
+
+        type_id = message.type_id
+
+        self.__metrics.message_received(type_id if type_id in messages.MESSAGES else "unknown", len(payload) + 2)
 
         state = self.__session_store.get(self.__session_id)
 
@@ -237,26 +317,97 @@ class ICBServerProtocol(asyncio.Protocol, di.Injected):
         msg = None
 
         if not type_id in ["b", "c"] or elapsed >= self.__config.timeouts_time_between_messages:
-            msg = MESSAGES.get(type_id)
+            msg = self.__registry.get(type_id)
 
             if not msg:
                 self.__broker.deliver(self.__session_id, ltd.encode_str("e", "Unexpected message: '%s'" % type_id))
         else:
             self.__log.debug("Time between messages too short.")
 
+        suspended = False
+
         if msg:
-            msg.process(self.__session_id, ltd.split(payload))
+            label = (type_id, self.__command_name__(message))
+
+            result = msg(self.__session_id, message)
 
-            new_reputation = self.__reputation.get(self.__session_id)
+            if inspect.isawaitable(result):
+                self.__suspend__(result, old_reputation, label, t)
 
-            if old_reputation == new_reputation:
-                self.__reputation.ok(self.__session_id)
+                suspended = True
+            else:
+                self.__metrics.message_processed(*label, t.elapsed())
+
+                self.__message_processed__(old_reputation)
         else:
             self.__reputation.warning(self.__session_id)
 
+            self.__test_reputation__()
+
+        return suspended
+
+    def __command_name__(self, message):
+        command = ""
+
+        if message.type_id == "h":
+            command = message.text[0].lower()
+
+            if command not in messages.COMMANDS:
+                command = "unknown"
+
+        return command
+
+    def __message_processed__(self, old_reputation):
+        new_reputation = self.__reputation.get(self.__session_id)
+
+        if old_reputation == new_reputation:
+            self.__reputation.ok(self.__session_id)
+
+        self.__test_reputation__()
+
+    def __test_reputation__(self):
         if self.__reputation.get(self.__session_id) == 0.0:
             raise LtdErrorException("Suspicious activity detected.")
 
+    def __suspend__(self, result, old_reputation, label, t):
+        if self.__pending is None:
+            self.__pending = deque()
+
+            self.__transport.pause_reading()
+
+        loop = asyncio.get_running_loop()
+
+        loop.create_task(self.__resume__(result, old_reputation, label, t))
+
+    async def __resume__(self, result, old_reputation, label, t):
+        try:
+            await result
+
+            self.__metrics.message_processed(*label, t.elapsed())
+
+            if self.__session_id in self.__connections:
+                self.__message_processed__(old_reputation)
+
+                while self.__pending:
+                    type_id, payload = self.__pending.popleft()
+
+                    if self.__process_message__(type_id, payload):
+                        return
+
+        except LtdResponseException as ex:
+            if self.__session_id in self.__connections:
+                self.__broker.deliver(self.__session_id, ex.response)
+                self.__broker.deliver(self.__session_id, ltd.encode_empty_cmd("g"))
+
+        except Exception:
+            if self.__session_id in self.__connections:
+                self.__abort__()
+
+        self.__pending = None
+
+        if self.__session_id in self.__connections:
+            self.__transport.resume_reading()
+
     def __write_protocol_info__(self):
         e = ltd.Encoder("j")
 
@@ -292,7 +443,11 @@ class Server(di.Injected, shutdown.ShutdownListener):
                cfm_connection: confirmation.Connection,
                cfm: confirmation.Confirmation,
                pwdreset_connection: passwordreset.Connection,
-               pwdreset: passwordreset.PasswordReset):
+               pwdreset: passwordreset.PasswordReset,
+               scheduler: timer.Scheduler,
+               away_table: session.AwayTimeoutTable,
+               notification_table: session.NotificationTimeoutTable,
+               metrics: metrics.Metrics):
         self.__log = log
         self.__config = config
         self.__shutdown = shutdown
@@ -309,14 +464,26 @@ class Server(di.Injected, shutdown.ShutdownListener):
         self.__cfm = cfm
         self.__pwdreset_connection = pwdreset_connection
         self.__pwdreset = pwdreset
+        self.__scheduler = scheduler
+        self.__away_table = away_table
+        self.__notification_table = notification_table
+        self.__metrics = metrics
 
-    async def run(self):
-        self.__signon_server__()
-
+    async def run(self, primary=True):
         loop = asyncio.get_running_loop()
 
+        if primary:
+            self.__signon_server__()
+
+            loop.create_task(self.__cleanup_dbs_())
+
         loop.create_task(self.__process_idling_sessions__())
-        loop.create_task(self.__cleanup_dbs_())
+        loop.create_task(self.__measure_loop_lag__())
+
+        if self.__config.stats_enabled and self.__config.stats_flush_interval > 0:
+            loop.create_task(self.__flush_stats__())
+
+        reuse_port = self.__config.server_cluster_workers > 1
 
         for addr in self.__config.bindings:
             self.__log.info("Found binding: %s", addr)
@@ -328,7 +495,9 @@ class Server(di.Injected, shutdown.ShutdownListener):
 
                 server = await loop.create_server(lambda: ICBServerProtocol(self.__connections),
                                                                             binding["address"],
-                                                                            binding["port"])
+                                                                            binding["port"],
+                                                                            backlog=self.__config.server_socket_backlog,
+                                                                            reuse_port=reuse_port)
 
                 self.__servers.append(server)
             elif binding["protocol"] == "tcps":
@@ -340,7 +509,9 @@ class Server(di.Injected, shutdown.ShutdownListener):
                 server = await loop.create_server(lambda: ICBServerProtocol(self.__connections),
                                                                             binding["address"],
                                                                             binding["port"],
-                                                                            ssl=sc)
+                                                                            ssl=sc,
+                                                                            backlog=self.__config.server_socket_backlog,
+                                                                            reuse_port=reuse_port)
             else:
                 raise NotImplementedError("Unsupported protocol: %s", binding["protocol"])
 
@@ -402,108 +573,137 @@ class Server(di.Injected, shutdown.ShutdownListener):
         e.add_field_str("WALL", append_null=False)
         e.add_field_str("Server is %s." % ("restarting, please stay patient" if restart else "shutting down"), append_null=True)
 
-        self.__broker.broadcast(e.encode())
+        msg = e.encode()
+
+        for session_id in list(self.__connections):
+            self.__broker.deliver(session_id, msg)
 
         self.__exit_code = core.EXIT_RESTART if restart else core.EXIT_SUCCESS
 
     async def __process_idling_sessions__(self):
         while True:
-            interval = int(self.__config.timeouts_ping)
-            sessions = {k: v for k, v in self.__session_store if k != self.__session_id}
+            expired = self.__scheduler.expired()
 
-            self.__log.debug("Processing idling sessions.")
+            if expired:
+                self.__log.debug("Processing %d idling session(s).", len(expired))
 
-            max_idle_time = None
-            max_idle_nick = None
+                max_idle_time = None
+                max_idle_nick = None
 
-            for k, v in sessions.items():
-                if k != self.__session_id:
-                    alive = v.t_alive.elapsed()
+                for k in expired:
+                    if k in self.__connections:
+                        elapsed, nick = self.__process_idling_session__(k)
 
-                    if alive >= self.__config.timeouts_connection:
-                        self.__log.info("Connection timeout, session='%s', last activity=%.2f", k, alive)
+                        if elapsed is not None and (not max_idle_time or elapsed > max_idle_time):
+                            max_idle_time = elapsed
+                            max_idle_nick = nick
 
-                        self.__connections[k].timeout()
-                    else:
-                        elapsed = v.t_recv.elapsed()
+                if max_idle_time and max_idle_time > self.__max_idle_time:
+                    max_idle_time = round(max_idle_time)
 
-                        if not max_idle_time or elapsed > max_idle_time:
-                            max_idle_time = elapsed
-                            max_idle_nick = v.nick
+                    self.__log.debug("Max idle time: %.2f (%s)", max_idle_time, max_idle_nick)
 
-                        if elapsed >= self.__config.timeouts_ping:
-                            last_ping = v.t_ping.elapsed() if v.t_ping else 0.0
+                    await self.__statsdb_connection.run(lambda scope: self.__statsdb.set_max_idle(scope, max_idle_time, max_idle_nick))
 
-                            if not v.t_ping or last_ping >= self.__config.timeouts_ping:
-                                self.__log.debug("Sending ping message to session %s (idle=%.2f, ping timeout=%.2f).",
-                                                 k,
-                                                 elapsed, last_ping)
+                    self.__max_idle_time = max_idle_time
 
-                                self.__broker.deliver(k, ltd.encode_empty_cmd("l"))
+            for name, table in (("away", self.__away_table), ("notification", self.__notification_table)):
+                count = table.expire()
 
-                                self.__session_store.update(k, t_ping=timer.Timer())
-                            else:
-                                interval = self.__next_interval__(interval, self.__config.timeouts_ping - last_ping)
-                        else:
-                            interval = self.__next_interval__(interval, self.__config.timeouts_ping - elapsed)
+                if count:
+                    self.__log.debug("Expired %d %s timeout(s), %d remaining.", count, name, len(table))
 
-                        if v.group:
-                            info = self.__groups.get(v.group)
+            await asyncio.sleep(1)
 
-                            if info.moderator and k == info.moderator and info.idle_mod > 0:
-                                if elapsed > info.idle_mod * 60:
-                                    ACTION(actions.usersession.UserSession).idle_mod(k)
-                                else:
-                                    interval = self.__next_interval__(interval, (info.idle_mod * 60) - elapsed)
+    def __process_idling_session__(self, k):
+        v = self.__session_store.get(k)
 
-                            if (not info.moderator or k != info.moderator) and info.idle_boot > 0:
-                                if elapsed > info.idle_boot * 60:
-                                    ACTION(actions.usersession.UserSession).idle_boot(k)
-                                else:
-                                    interval = self.__next_interval__(interval, (info.idle_boot * 60) - elapsed)
+        alive = v.t_alive.elapsed()
 
-            if max_idle_time and max_idle_time > self.__max_idle_time:
-                max_idle_time = round(max_idle_time)
+        if alive >= self.__config.timeouts_connection:
+            self.__log.info("Connection timeout, session='%s', last activity=%.2f", k, alive)
 
-                self.__log.debug("Max idle time: %.2f (%s)", max_idle_time, max_idle_nick)
+            self.__connections[k].timeout()
 
-                with self.__statsdb_connection.enter_scope() as scope:
-                    self.__statsdb.set_max_idle(scope, max_idle_time, max_idle_nick)
+            return None, None
 
-                    scope.complete()
+        interval = self.__config.timeouts_connection - alive
 
-                    self.__max_idle_time = max_idle_time
+        elapsed = v.t_recv.elapsed()
 
-            self.__log.debug("Next interval: %.2f", interval)
+        if elapsed >= self.__config.timeouts_ping:
+            last_ping = v.t_ping.elapsed() if v.t_ping else 0.0
 
-            await asyncio.sleep(interval)
+            if not v.t_ping or last_ping >= self.__config.timeouts_ping:
+                self.__log.debug("Sending ping message to session %s (idle=%.2f, ping timeout=%.2f).",
+                                 k,
+                                 elapsed, last_ping)
 
-    @staticmethod
-    def __next_interval__(interval, next_interval):
-        return int(min(interval, math.ceil(next_interval)))
+                self.__broker.deliver(k, ltd.encode_empty_cmd("l"))
+
+                self.__session_store.update(k, t_ping=timer.Timer())
+
+                interval = min(interval, self.__config.timeouts_ping)
+            else:
+                interval = min(interval, self.__config.timeouts_ping - last_ping)
+        else:
+            interval = min(interval, self.__config.timeouts_ping - elapsed)
+
+        if v.group:
+            info = self.__groups.get(v.group)
+
+            if info.moderator and k == info.moderator and info.idle_mod > 0:
+                if elapsed > info.idle_mod * 60:
+                    ACTION(actions.usersession.UserSession).idle_mod(k)
+                else:
+                    interval = min(interval, (info.idle_mod * 60) - elapsed)
+
+            if (not info.moderator or k != info.moderator) and info.idle_boot > 0:
+                if elapsed > info.idle_boot * 60:
+                    ACTION(actions.usersession.UserSession).idle_boot(k)
+                else:
+                    interval = min(interval, (info.idle_boot * 60) - elapsed)
+
+        if k in self.__connections:
+            self.__scheduler.schedule(k, interval)
+
+        return elapsed, v.nick
+
+    async def __measure_loop_lag__(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            started = loop.time()
+
+            await asyncio.sleep(self.__config.metrics_loop_interval)
+
+            self.__metrics.loop_lag(max(0.0, loop.time() - started - self.__config.metrics_loop_interval))
+
+    async def __flush_stats__(self):
+        while True:
+            now = dateutils.now()
+            midnight = datetime(now.year, now.month, now.day, tzinfo=now.tzinfo) + timedelta(days=1)
+
+            await asyncio.sleep(min(self.__config.stats_flush_interval, (midnight - now).total_seconds()))
+
+            try:
+                await self.__statsdb_connection.run(self.__statsdb.flush)
+            except Exception as ex:
+                self.__log.warning("Couldn't flush statistics: %s", ex)
 
     async def __cleanup_dbs_(self):
         while True:
             self.__log.info("Cleaning up confirmation requests.")
 
-            with self.__cfm_connection.enter_scope() as scope:
-                self.__cfm.cleanup(scope, self.__config.timeouts_confirmation_code)
-
-                scope.complete()
+            await self.__cfm_connection.run(lambda scope: self.__cfm.cleanup(scope, self.__config.timeouts_confirmation_code))
 
             self.__log.info("Cleaning up password reset codes.")
 
-            with self.__pwdreset_connection.enter_scope() as scope:
-                self.__pwdreset.cleanup(scope, self.__config.timeouts_password_reset_request)
-
-                scope.complete()
+            await self.__pwdreset_connection.run(lambda scope: self.__pwdreset.cleanup(scope, self.__config.timeouts_password_reset_request))
 
             self.__log.info("Cleaning up IP filters.")
 
-            with self.__ipfilter_connection.enter_scope() as scope:
-                self.__ipfilters.cleanup(scope)
-
-                scope.complete()
+            await self.__ipfilter_connection.run(self.__ipfilters.cleanup)
 
             self.__log.debug("Next cleanup in %.2f seconds.", self.__config.database_cleanup_interval)
 
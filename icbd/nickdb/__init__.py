@@ -27,6 +27,7 @@ from dataclasses import dataclass
 from datetime import datetime
 from uuid import UUID
 from typing import NewType
+from hashlib import sha256
 import database
 
 @dataclass
@@ -39,6 +40,21 @@ class UserDetails:
     www: str = None
     avatar: str = None
 
+@dataclass
+class Record:
+    details: UserDetails = None
+    salt: str = None
+    password: str = None
+    secure: bool = False
+    admin: bool = False
+    email_confirmed: bool = False
+    forward_messages: bool = False
+    protected: bool = False
+    lastlogin: tuple = None
+    signon: datetime = None
+    signoff: datetime = None
+    mbox_limit: int = 0
+
 @dataclass
 class Message:
     uuid: UUID = None
@@ -48,6 +64,9 @@ class Message:
 
 Connection = NewType("Connection", database.Connection)
 
+def hash_password(plain, salt):
+    return sha256((plain + salt).encode("utf-8", errors="replace")).hexdigest()
+
 class NickDb:
     def setup(self, scope):
         raise NotImplementedError
@@ -61,6 +80,12 @@ class NickDb:
     def lookup(self, scope, nick):
         raise NotImplementedError
 
+    def load(self, scope, nick):
+        raise NotImplementedError
+
+    def load_many(self, scope, nicks):
+        raise NotImplementedError
+
     def update(self, scope, nick, details):
         raise NotImplementedError
 
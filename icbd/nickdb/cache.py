@@ -0,0 +1,340 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import sys
+import threading
+import dataclasses
+from collections import OrderedDict
+from datetime import datetime
+import nickdb
+import dateutils
+from textutils import tolower
+
+class Invalidation:
+    def __init__(self, cache, nick):
+        self.__cache = cache
+        self.__nick = nick
+
+    def scope_entered(self, scope):
+        pass
+
+    def scope_leaved(self, scope):
+        if not scope.completed:
+            self.__cache.evict(self.__nick)
+
+class NickDb(nickdb.NickDb):
+    def __init__(self, db, max_size):
+        self.__db = db
+        self.__max_size = max_size
+        self.__entries = OrderedDict()
+        self.__size = 0
+        self.__writes = 0
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+
+    def setup(self, scope):
+        self.__db.setup(scope)
+
+    @tolower(argname="nick")
+    def create(self, scope, nick):
+        self.__invalidate__(scope, nick)
+
+        return self.__db.create(scope, nick)
+
+    @tolower(argname="nick")
+    def exists(self, scope, nick):
+        return self.__fetch__(scope, nick) is not None
+
+    @tolower(argname="nick")
+    def lookup(self, scope, nick):
+        return dataclasses.replace(self.__fetch__(scope, nick).details)
+
+    @tolower(argname="nick")
+    def load(self, scope, nick):
+        return self.__fetch__(scope, nick)
+
+    def load_many(self, scope, nicks):
+        records = {}
+        missing = []
+
+        with self.__lock:
+            for nick in set(nick.lower() for nick in nicks):
+                entry = self.__entries.get(nick)
+
+                if entry:
+                    self.__entries.move_to_end(nick)
+                    self.__hits += 1
+
+                    if entry[0]:
+                        records[nick] = entry[0]
+                else:
+                    self.__misses += 1
+
+                    missing.append(nick)
+
+            writes = self.__writes
+
+        if missing:
+            loaded = self.__db.load_many(scope, missing)
+
+            with self.__lock:
+                if writes == self.__writes:
+                    for nick in missing:
+                        self.__store__(nick, loaded.get(nick))
+
+            records.update(loaded)
+
+        return records
+
+    @tolower(argname="nick")
+    def update(self, scope, nick, details):
+        self.__db.update(scope, nick, details)
+
+        self.__modify__(scope, nick, details=dataclasses.replace(details))
+
+    @tolower(argname="nick")
+    def set_password(self, scope, nick, password):
+        self.__invalidate__(scope, nick)
+
+        self.__db.set_password(scope, nick, password)
+
+    @tolower(argname="nick")
+    def check_password(self, scope, nick, password):
+        record = self.__fetch__(scope, nick)
+        success = False
+
+        if record and record.salt is not None and record.password is not None:
+            success = (record.password == nickdb.hash_password(password, record.salt))
+
+        return success
+
+    @tolower(argname="nick")
+    def is_secure(self, scope, nick):
+        return self.__fetch__(scope, nick).secure
+
+    @tolower(argname="nick")
+    def set_secure(self, scope, nick, secure):
+        self.__db.set_secure(scope, nick, secure)
+
+        self.__modify__(scope, nick, secure=bool(secure))
+
+    @tolower(argname="nick")
+    def is_admin(self, scope, nick):
+        return self.__fetch__(scope, nick).admin
+
+    @tolower(argname="nick")
+    def set_admin(self, scope, nick, is_admin):
+        self.__db.set_admin(scope, nick, is_admin)
+
+        self.__modify__(scope, nick, admin=bool(is_admin))
+
+    @tolower(argname="nick")
+    def is_email_confirmed(self, scope, nick):
+        return self.__fetch__(scope, nick).email_confirmed
+
+    @tolower(argname="nick")
+    def set_email_confirmed(self, scope, nick, confirmed):
+        self.__db.set_email_confirmed(scope, nick, confirmed)
+
+        self.__modify__(scope, nick, email_confirmed=bool(confirmed))
+
+    @tolower(argname="nick")
+    def is_message_forwarding_enabled(self, scope, nick):
+        return self.__fetch__(scope, nick).forward_messages
+
+    @tolower(argname="nick")
+    def enable_message_forwarding(self, scope, nick, enabled):
+        self.__db.enable_message_forwarding(scope, nick, enabled)
+
+        self.__modify__(scope, nick, forward_messages=bool(enabled))
+
+    @tolower(argname="nick")
+    def is_protected(self, scope, nick):
+        return self.__fetch__(scope, nick).protected
+
+    @tolower(argname="nick")
+    def set_protected(self, scope, nick, protected):
+        self.__db.set_protected(scope, nick, protected)
+
+        self.__modify__(scope, nick, protected=bool(protected))
+
+    @tolower(argname="nick")
+    def get_lastlogin(self, scope, nick):
+        return self.__fetch__(scope, nick).lastlogin
+
+    @tolower(argname="nick")
+    def set_lastlogin(self, scope, nick, loginid, host):
+        self.__db.set_lastlogin(scope, nick, loginid, host)
+
+        self.__modify__(scope, nick, lastlogin=(loginid, host) if loginid and host else None)
+
+    @tolower(argname="nick")
+    def get_signon(self, scope, nick):
+        return self.__fetch__(scope, nick).signon
+
+    @tolower(argname="nick")
+    def set_signon(self, scope, nick, timestamp=None):
+        if not timestamp:
+            timestamp = dateutils.now()
+
+        self.__db.set_signon(scope, nick, timestamp)
+
+        self.__modify__(scope, nick, signon=datetime.fromtimestamp(int(timestamp.timestamp())))
+
+    @tolower(argname="nick")
+    def get_signoff(self, scope, nick):
+        return self.__fetch__(scope, nick).signoff
+
+    @tolower(argname="nick")
+    def set_signoff(self, scope, nick, timestamp=None):
+        if not timestamp:
+            timestamp = dateutils.now()
+
+        self.__db.set_signoff(scope, nick, timestamp)
+
+        self.__modify__(scope, nick, signoff=datetime.fromtimestamp(int(timestamp.timestamp())))
+
+    @tolower(argname="nick")
+    def get_mbox_limit(self, scope, nick):
+        return self.__fetch__(scope, nick).mbox_limit
+
+    @tolower(argname="nick")
+    def set_mbox_limit(self, scope, nick, limit):
+        self.__db.set_mbox_limit(scope, nick, limit)
+
+        self.__modify__(scope, nick, mbox_limit=int(limit))
+
+    def add_message(self, scope, nick, sender, text):
+        return self.__db.add_message(scope, nick, sender, text)
+
+    def count_messages(self, scope, nick):
+        return self.__db.count_messages(scope, nick)
+
+    def get_messages(self, scope, nick):
+        return self.__db.get_messages(scope, nick)
+
+    def delete_message(self, scope, msgid):
+        self.__db.delete_message(scope, msgid)
+
+    @tolower(argname="nick")
+    def delete(self, scope, nick):
+        self.__invalidate__(scope, nick)
+
+        self.__db.delete(scope, nick)
+
+    def evict(self, nick):
+        with self.__lock:
+            self.__writes += 1
+
+            entry = self.__entries.pop(nick, None)
+
+            if entry:
+                self.__size -= entry[1]
+
+    def __fetch__(self, scope, nick):
+        with self.__lock:
+            entry = self.__entries.get(nick)
+
+            if entry:
+                self.__entries.move_to_end(nick)
+                self.__hits += 1
+
+                return entry[0]
+
+            self.__misses += 1
+
+            writes = self.__writes
+
+        record = self.__db.load(scope, nick)
+
+        with self.__lock:
+            if writes == self.__writes:
+                self.__store__(nick, record)
+
+        return record
+
+    def __modify__(self, scope, nick, **kwargs):
+        with self.__lock:
+            self.__writes += 1
+
+            entry = self.__entries.get(nick)
+
+            if entry and entry[0]:
+                record = entry[0]
+
+                for k, v in kwargs.items():
+                    setattr(record, k, v)
+
+                self.__store__(nick, record)
+
+        scope.add_listener(Invalidation(self, nick))
+
+    def __invalidate__(self, scope, nick):
+        self.evict(nick)
+
+        scope.add_listener(Invalidation(self, nick))
+
+    def __store__(self, nick, record):
+        size = self.__estimate_size__(nick, record)
+
+        entry = self.__entries.get(nick)
+
+        if entry:
+            self.__size -= entry[1]
+
+        self.__entries[nick] = (record, size)
+        self.__entries.move_to_end(nick)
+        self.__size += size
+
+        while self.__size > self.__max_size and self.__entries:
+            _, (_, size) = self.__entries.popitem(last=False)
+
+            self.__size -= size
+
+    @staticmethod
+    def __estimate_size__(nick, record):
+        size = sys.getsizeof(nick) + sys.getsizeof(record)
+
+        if record:
+            size += sum(sys.getsizeof(v) for v in vars(record).values())
+            size += sum(sys.getsizeof(v) for v in vars(record.details).values())
+
+        return size
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    @property
+    def size(self):
+        return self.__size
+
+    def __len__(self):
+        return len(self.__entries)
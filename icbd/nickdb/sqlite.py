@@ -26,7 +26,6 @@
 import uuid
 import secrets
 from logging import Logger
-from hashlib import sha256
 from datetime import datetime
 import nickdb
 from sqlite_schema import Schema
@@ -94,6 +93,54 @@ class NickDb(nickdb.NickDb, di.Injected):
                                   www=m["WWW"],
                                   avatar=m["Avatar"])
 
+    @tolower(argname="nick")
+    def load(self, scope, nick):
+        cur = scope.get_handle()
+        cur.execute("select * from Nick where Name=?", (nick,))
+
+        row = cur.fetchone()
+
+        return self.__record__(row) if row else None
+
+    def load_many(self, scope, nicks):
+        records = {}
+
+        nicks = list(set(nick.lower() for nick in nicks))
+
+        cur = scope.get_handle()
+
+        for i in range(0, len(nicks), 500):
+            chunk = nicks[i:i + 500]
+
+            cur.execute("select * from Nick where Name in (%s)" % ", ".join("?" * len(chunk)), chunk)
+
+            for row in cur:
+                records[row["Name"]] = self.__record__(row)
+
+        return records
+
+    @staticmethod
+    def __record__(row):
+        return nickdb.Record(details=nickdb.UserDetails(real_name=row["RealName"],
+                                                        phone=row["Phone"],
+                                                        address=row["Address"],
+                                                        email=row["Email"],
+                                                        text=row["Text"],
+                                                        www=row["WWW"],
+                                                        avatar=row["Avatar"]),
+                             salt=row["Salt"],
+                             password=row["Password"],
+                             secure=bool(row["IsSecure"]),
+                             admin=bool(row["IsAdmin"]),
+                             email_confirmed=bool(row["IsMailConfirmed"]),
+                             forward_messages=bool(row["ForwardMessages"]),
+                             protected=bool(row["IsProtected"]),
+                             lastlogin=(row["LastLoginID"], row["LastLoginHost"])
+                                       if row["LastLoginID"] and row["LastLoginHost"] else None,
+                             signon=datetime.fromtimestamp(row["Signon"]) if row["Signon"] else None,
+                             signoff=datetime.fromtimestamp(row["Signoff"]) if row["Signoff"] else None,
+                             mbox_limit=int(row["MBoxLimit"]))
+
     @tolower(argname="nick")
     def update(self, scope, nick, details):
         cur = scope.get_handle()
@@ -112,7 +159,7 @@ class NickDb(nickdb.NickDb, di.Injected):
         cur = scope.get_handle()
 
         salt = secrets.token_hex(20)
-        cur.execute("update Nick set Salt=?, Password=? where Name=?", (salt, self.__hash_password__(password, salt), nick))
+        cur.execute("update Nick set Salt=?, Password=? where Name=?", (salt, nickdb.hash_password(password, salt), nick))
 
     @tolower(argname="nick")
     def check_password(self, scope, nick, password):
@@ -126,14 +173,10 @@ class NickDb(nickdb.NickDb, di.Injected):
             salt, hash = row
 
             if salt is not None and hash is not None:
-                success = (hash == self.__hash_password__(password, salt))
+                success = (hash == nickdb.hash_password(password, salt))
 
         return success
 
-    @staticmethod
-    def __hash_password__(plain, salt):
-        return sha256((plain + salt).encode("utf-8", errors="replace")).hexdigest()
-
     @tolower(argname="nick")
     def is_secure(self, scope, nick):
         cur = scope.get_handle()
@@ -57,6 +57,14 @@ class Notifylist:
     def empty(self):
         return not (self.__nicks or self.__sites)
 
+    @property
+    def watched_nicks(self):
+        return frozenset(self.__nicks)
+
+    @property
+    def watched_sites(self):
+        return frozenset(self.__sites)
+
     @property
     def nicks(self):
         return sorted([n for n in self.__nicks.values()])
@@ -33,19 +33,25 @@ import ipc
 from log.asyncio import LogProtocol
 
 class Process:
-    def __init__(self, name):
+    def __init__(self, name, capture_output=True):
         self.__name = name
+        self.__capture_output = capture_output
         self.__process = None
+        self.__loop = None
         self.__log = di.default_container.resolve(logging.Logger)
         self.__config = di.default_container.resolve(config.Config)
         self.__broadcast = di.default_container.resolve(ipc.Broadcast)
 
     async def spawn(self, argv):
+        self.__loop = asyncio.get_running_loop()
+
         args = self.__build_args__(argv)
 
         self.__log.info("Spawning '%s' process: %s", self.__name, " ".join(args))
 
-        if os.name == "posix":
+        if not self.__capture_output:
+            self.__process = Popen(args, stdout=DEVNULL)
+        elif os.name == "posix":
             self.__process = Popen(args, stdout=DEVNULL, stderr=PIPE)
 
             loop = asyncio.get_event_loop()
@@ -62,9 +68,7 @@ class Process:
         raise NotImplementedError()
 
     def broadcast(self, message):
-        loop = asyncio.get_event_loop()
-
-        loop.call_soon(self.__broadcast.send, self.__name, message)
+        self.__loop.call_soon_threadsafe(self.__broadcast.send, self.__name, message)
 
     def exit(self):
         if self.__process:
@@ -98,3 +102,11 @@ class Process:
                 returncode = self.__process.returncode
 
             self.__log.info("Process %d stopped with exit status %d.", self.__process.pid, returncode)
+
+            return returncode
+
+    def terminate(self):
+        if self.__process and self.__process.poll() is None:
+            self.__log.info("Terminating '%s' process with pid %d.", self.__name, self.__process.pid)
+
+            self.__process.terminate()
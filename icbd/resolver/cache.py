@@ -0,0 +1,103 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+from collections import OrderedDict
+from timeit import default_timer as timer
+from logging import Logger
+import resolver
+import di
+
+class Resolver(resolver.Resolver, di.Injected):
+    def __init__(self, resolver, max_size, ttl, negative_ttl):
+        super().__init__()
+
+        self.__resolver = resolver
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__negative_ttl = negative_ttl
+        self.__entries = OrderedDict()
+        self.__pending = {}
+        self.__hits = 0
+        self.__misses = 0
+
+    def inject(self, log: Logger):
+        self.__log = log
+
+    async def resolve(self, address):
+        entry = self.__entries.get(address)
+
+        if entry and entry[0] > timer():
+            self.__entries.move_to_end(address)
+            self.__hits += 1
+
+            return entry[1]
+
+        self.__misses += 1
+
+        f = self.__pending.get(address)
+
+        if not f:
+            f = asyncio.ensure_future(self.__lookup__(address))
+
+            self.__pending[address] = f
+
+        return await asyncio.shield(f)
+
+    async def __lookup__(self, address):
+        host = None
+
+        try:
+            host = await self.__resolver.resolve(address)
+        except asyncio.TimeoutError:
+            self.__log.info("Reverse lookup timed out: %s", address)
+        except Exception as ex:
+            self.__log.info("Reverse lookup failed: %s (%s)", address, ex)
+        finally:
+            del self.__pending[address]
+
+        self.__store__(address, host)
+
+        return host
+
+    def __store__(self, address, host):
+        ttl = self.__ttl if host else self.__negative_ttl
+
+        self.__entries[address] = (timer() + ttl, host)
+        self.__entries.move_to_end(address)
+
+        while len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    def __len__(self):
+        return len(self.__entries)
@@ -90,6 +90,21 @@ class Store:
     def count_logins(self):
         raise NotImplementedError
 
+    def get_members(self, group):
+        raise NotImplementedError
+
+    def get_roster(self, group):
+        raise NotImplementedError
+
+    def get_hushing(self):
+        raise NotImplementedError
+
+    def get_nick_watchers(self, nick):
+        raise NotImplementedError
+
+    def get_site_watchers(self, site):
+        raise NotImplementedError
+
     def update(self, id, **kwargs):
         raise NotImplementedError
 
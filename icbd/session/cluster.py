@@ -0,0 +1,107 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import session.memory
+import cluster
+import di
+import timer
+
+TIMERS = frozenset(["t_recv", "t_alive", "t_ping"])
+
+class Store(session.memory.Store, di.Injected):
+    def __init__(self):
+        session.memory.Store.__init__(self)
+        di.Injected.__init__(self)
+
+    def inject(self, node: cluster.Node):
+        self.__node = node
+        self.__owners = {}
+        self.__synced = {}
+
+        node.add_listener("session.set", self.__remote_set__)
+        node.add_listener("session.update", self.__remote_update__)
+        node.add_listener("session.delete", self.__remote_delete__)
+        node.add_listener("cluster.node_joined", self.__node_joined__)
+        node.add_listener("cluster.node_lost", self.__node_lost__)
+
+    def new(self, **kwargs):
+        id = super().new(**kwargs)
+
+        self.__owners[id] = self.__node.id
+
+        self.__node.publish("session.set", id, self.get(id), self.__node.id)
+
+        return id
+
+    def update(self, id, **kwargs):
+        super().update(id, **kwargs)
+
+        if TIMERS.issuperset(kwargs):
+            if "t_recv" in kwargs:
+                t = self.__synced.get(id)
+
+                if not t or t.elapsed() >= 1.0:
+                    self.__synced[id] = timer.Timer()
+
+                    self.__node.publish("session.update", id, {"t_recv": kwargs["t_recv"]})
+        else:
+            self.__node.publish("session.update", id, kwargs)
+
+    def set(self, id, state):
+        super().set(id, state)
+
+        self.__node.publish("session.set", id, state, self.__owners.get(id))
+
+    def delete(self, id):
+        super().delete(id)
+
+        self.__owners.pop(id, None)
+        self.__synced.pop(id, None)
+
+        self.__node.publish("session.delete", id)
+
+    def __remote_set__(self, id, state, node_id):
+        session.memory.Store.set(self, id, state)
+
+        self.__owners[id] = node_id
+
+    def __remote_update__(self, id, kwargs):
+        if id in self.__owners:
+            session.memory.Store.update(self, id, **kwargs)
+
+    def __remote_delete__(self, id):
+        if id in self.__owners:
+            session.memory.Store.delete(self, id)
+
+            del self.__owners[id]
+
+    def __node_joined__(self, node_id):
+        for id, owner in self.__owners.items():
+            if owner == self.__node.id:
+                self.__node.publish("session.set", id, self.get(id), owner, target=node_id)
+
+    def __node_lost__(self, node_id):
+        for id in [id for id, owner in self.__owners.items() if owner == node_id]:
+            self.__remote_delete__(id)
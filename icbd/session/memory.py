@@ -24,6 +24,8 @@
     OTHER DEALINGS IN THE SOFTWARE.
 """
 from secrets import token_hex
+from bisect import bisect_left, insort
+from types import MappingProxyType
 import session
 from hush import Hushlist
 from notify import Notifylist
@@ -31,6 +33,16 @@ from notify import Notifylist
 class Store(session.Store):
     def __init__(self):
         self.__m = {}
+        self.__keys = {}
+        self.__nicks = {}
+        self.__named = {}
+        self.__groups = {}
+        self.__rosters = {}
+        self.__hushing = set()
+        self.__watches = {}
+        self.__nick_watchers = {}
+        self.__site_watchers = {}
+        self.__logins = 0
 
     def new(self, **kwargs):
         id = token_hex(20)
@@ -41,6 +53,9 @@ class Store(session.Store):
         state.notifylist = Notifylist()
 
         self.__m[id] = state
+        self.__keys[id] = (None, None)
+
+        self.__index__(id, state)
 
         return id
 
@@ -48,30 +63,153 @@ class Store(session.Store):
         return self.__m[id]
 
     def get_nicks(self):
-        return {k: v for k, v in self.__m.items() if v.nick}
+        return MappingProxyType(self.__named)
 
     def count_logins(self):
-        return len([s for s in self.__m.values() if s.loggedin])
+        return self.__logins
+
+    def get_members(self, group):
+        return self.__groups.get(group.lower(), frozenset())
+
+    def get_roster(self, group):
+        return self.__rosters.get(group.lower(), ())
+
+    def get_hushing(self):
+        return self.__hushing
+
+    def get_nick_watchers(self, nick):
+        return self.__nick_watchers.get(nick.lower(), frozenset())
+
+    def get_site_watchers(self, site):
+        return self.__site_watchers.get(site.lower(), frozenset())
 
     def update(self, id, **kwargs):
+        state = self.__m[id]
+
         for k, v in kwargs.items():
-            setattr(self.__m[id], k, v)
+            setattr(state, k, v)
+
+        if "nick" in kwargs or "group" in kwargs:
+            self.__index__(id, state)
+
+        if "hushlist" in kwargs:
+            self.__index_hushlist__(id, state)
+
+        if "notifylist" in kwargs:
+            self.__index_notifylist__(id, state)
 
     def set(self, id, state):
         self.__m[id] = state
+        self.__keys.setdefault(id, (None, None))
+
+        self.__index__(id, state)
+        self.__index_hushlist__(id, state)
+        self.__index_notifylist__(id, state)
 
     def delete(self, id):
+        self.__unindex__(id)
+        self.__hushing.discard(id)
+        self.__unindex_notifylist__(id)
+
+        del self.__keys[id]
         del self.__m[id]
 
     def find_nick(self, nick):
-        session_id = None
+        return self.__nicks.get(nick.lower())
 
-        for k, v in self.__m.items():
-            if v.nick and v.nick.lower() == nick.lower():
-                session_id = k
-                break
+    def __index__(self, id, state):
+        nick = state.nick.lower() if state.nick else None
+        group = state.group.lower() if state.group else None
+
+        if self.__keys[id] != (nick, group):
+            self.__unindex__(id)
+
+            if nick:
+                self.__nicks[nick] = id
+                self.__named[id] = state
+
+            if group:
+                self.__groups.setdefault(group, set()).add(id)
+
+            if nick and group:
+                insort(self.__rosters.setdefault(group, []), (nick, id))
+
+                self.__logins += 1
+
+            self.__keys[id] = (nick, group)
+        elif nick:
+            self.__named[id] = state
+
+    def __index_hushlist__(self, id, state):
+        if state.hushlist and not state.hushlist.empty():
+            self.__hushing.add(id)
+        else:
+            self.__hushing.discard(id)
+
+    def __index_notifylist__(self, id, state):
+        nicks, sites = frozenset(), frozenset()
+
+        if state.notifylist:
+            nicks, sites = state.notifylist.watched_nicks, state.notifylist.watched_sites
+
+        old_nicks, old_sites = self.__watches.get(id, (frozenset(), frozenset()))
+
+        if nicks != old_nicks or sites != old_sites:
+            self.__reindex_watchers__(self.__nick_watchers, id, old_nicks, nicks)
+            self.__reindex_watchers__(self.__site_watchers, id, old_sites, sites)
+
+            if nicks or sites:
+                self.__watches[id] = (nicks, sites)
+            else:
+                self.__watches.pop(id, None)
+
+    def __unindex_notifylist__(self, id):
+        nicks, sites = self.__watches.pop(id, (frozenset(), frozenset()))
+
+        self.__reindex_watchers__(self.__nick_watchers, id, nicks, frozenset())
+        self.__reindex_watchers__(self.__site_watchers, id, sites, frozenset())
+
+    @staticmethod
+    def __reindex_watchers__(m, id, old_keys, new_keys):
+        for k in old_keys - new_keys:
+            watchers = m[k]
+
+            watchers.discard(id)
+
+            if not watchers:
+                del m[k]
+
+        for k in new_keys - old_keys:
+            m.setdefault(k, set()).add(id)
+
+    def __unindex__(self, id):
+        nick, group = self.__keys[id]
+
+        if nick:
+            if self.__nicks.get(nick) == id:
+                del self.__nicks[nick]
+
+            del self.__named[id]
+
+        if group:
+            members = self.__groups[group]
+
+            members.discard(id)
+
+            if not members:
+                del self.__groups[group]
+
+        if nick and group:
+            roster = self.__rosters[group]
+
+            del roster[bisect_left(roster, (nick, id))]
+
+            if not roster:
+                del self.__rosters[group]
+
+            self.__logins -= 1
 
-        return session_id
+        self.__keys[id] = (None, None)
 
     def __len__(self):
         return len(self.__m)
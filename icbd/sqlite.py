@@ -24,6 +24,9 @@
     OTHER DEALINGS IN THE SOFTWARE.
 """
 import sqlite3
+import threading
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
 import database
 
 class TransactionScope(database.TransactionScope):
@@ -45,24 +48,139 @@ class TransactionScope(database.TransactionScope):
         return self.__cursor
 
 class Connection(database.Connection):
-    def __init__(self, db):
+    def __init__(self, db, readers=0):
         super().__init__()
 
         self.__conn = None
         self.__db = db
+        self.__readers = readers
+        self.__lock = threading.RLock()
+        self.__jobs = None
+        self.__writer = None
+        self.__reader_pool = None
+        self.__reader_local = threading.local()
+        self.__reader_conns = []
+        self.__progress = threading.Condition()
+        self.__submitted = 0
+        self.__completed = 0
 
     def __connect__(self):
         if not self.__conn:
-            self.__conn = sqlite3.connect(self.__db)
+            self.__conn = sqlite3.connect(self.__db, check_same_thread=False)
             self.__conn.row_factory = sqlite3.Row
 
             cur = self.__conn.cursor()
 
             cur.execute("pragma foreign_keys=on")
-            cur.execute("pragma journal_mode=memory")
+            cur.execute("pragma journal_mode=%s" % ("wal" if self.__readers > 0 else "memory"))
             cur.execute("pragma synchronous=normal")
             cur.execute("pragma locking_mode=exlusive")
 
+    def enter_scope(self):
+        if self.__jobs and threading.current_thread() is not self.__writer:
+            with self.__progress:
+                barrier = self.__submitted
+
+                self.__progress.wait_for(lambda: self.__completed >= barrier)
+
+        self.__lock.acquire()
+
+        try:
+            return super().enter_scope()
+        except:
+            self.__lock.release()
+            raise
+
+    def scope_leaved(self, scope):
+        super().scope_leaved(scope)
+
+        self.__lock.release()
+
+    def submit(self, fn, readonly=False):
+        future = Future()
+
+        if readonly and self.__readers > 0:
+            if not self.__reader_pool:
+                self.__reader_pool = ThreadPoolExecutor(max_workers=self.__readers, thread_name_prefix="sqlite-reader")
+
+            with self.__progress:
+                barrier = self.__submitted
+
+            self.__reader_pool.submit(self.__read__, fn, future, barrier)
+        else:
+            if not self.__writer:
+                self.__jobs = queue.Queue()
+                self.__writer = threading.Thread(target=self.__write__, name="sqlite-writer", daemon=True)
+                self.__writer.start()
+
+            with self.__progress:
+                self.__submitted += 1
+
+            self.__jobs.put((fn, future))
+
+        return future
+
+    def __write__(self):
+        while True:
+            job = self.__jobs.get()
+
+            try:
+                if not job:
+                    break
+
+                fn, future = job
+
+                if future.set_running_or_notify_cancel():
+                    try:
+                        with self.enter_scope() as scope:
+                            result = fn(scope)
+
+                            scope.complete()
+
+                        future.set_result(result)
+                    except Exception as ex:
+                        future.set_exception(ex)
+            finally:
+                if job:
+                    with self.__progress:
+                        self.__completed += 1
+                        self.__progress.notify_all()
+
+                self.__jobs.task_done()
+
+    def __read__(self, fn, future, barrier):
+        if future.set_running_or_notify_cancel():
+            try:
+                with self.__progress:
+                    self.__progress.wait_for(lambda: self.__completed >= barrier)
+
+                scope = TransactionScope(self.__reader__())
+
+                self.__scope_created__(scope)
+
+                with scope:
+                    result = fn(scope)
+
+                future.set_result(result)
+            except Exception as ex:
+                future.set_exception(ex)
+
+    def __reader__(self):
+        conn = getattr(self.__reader_local, "conn", None)
+
+        if not conn:
+            conn = sqlite3.connect(self.__db, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+
+            conn.execute("pragma query_only=on")
+
+            self.__reader_local.conn = conn
+
+            with self.__lock:
+                self.__reader_conns.append(conn)
+
+        return conn
+
     def __create_transaction_scope__(self):
         self.__connect__()
         return TransactionScope(self)
@@ -77,5 +195,15 @@ class Connection(database.Connection):
         self.__conn.rollback()
 
     def close(self):
+        if self.__writer:
+            self.__jobs.put(None)
+            self.__writer.join()
+
+        if self.__reader_pool:
+            self.__reader_pool.shutdown()
+
+        for conn in self.__reader_conns:
+            conn.close()
+
         if self.__conn is not None:
             self.__conn.close()
@@ -47,6 +47,14 @@ class Schema(di.Injected):
 
         if revision == 3:
             self.__revision_4__(scope)
+            revision += 1
+
+        if revision == 4:
+            self.__revision_5__(scope)
+            revision += 1
+
+        if revision == 5:
+            self.__revision_6__(scope)
 
     @staticmethod
     def __get_revision__(scope):
@@ -211,3 +219,95 @@ class Schema(di.Injected):
                          primary key (Expression, Action))""")
 
         cur.execute("update Version set Revision=4")
+
+    def __revision_5__(self, scope):
+        self.log.info("Upgrading database to revision 5...")
+
+        cur = scope.get_handle()
+
+        cur.execute("""create table StatsMonth (
+                         Year int not null,
+                         Month int not null,
+                         Signons int default 0,
+                         Boots int default 0,
+                         Drops int default 0,
+                         IdleBoots int default 0,
+                         IdleMods int default 0,
+                         MaxLogins int default 0,
+                         MaxGroups int default 0,
+                         MaxIdleTime real default 0.0,
+                         MaxIdleNick varchar(16),
+                         primary key (Year, Month))""")
+
+        cur.execute("""create table StatsYear (
+                         Year int not null,
+                         Signons int default 0,
+                         Boots int default 0,
+                         Drops int default 0,
+                         IdleBoots int default 0,
+                         IdleMods int default 0,
+                         MaxLogins int default 0,
+                         MaxGroups int default 0,
+                         MaxIdleTime real default 0.0,
+                         MaxIdleNick varchar(16),
+                         primary key (Year))""")
+
+        cur.execute("""create table StatsTotal (
+                         Signons int default 0,
+                         Boots int default 0,
+                         Drops int default 0,
+                         IdleBoots int default 0,
+                         IdleMods int default 0,
+                         MaxLogins int default 0,
+                         MaxGroups int default 0,
+                         MaxIdleTime real default 0.0,
+                         MaxIdleNick varchar(16))""")
+
+        self.log.info("Building statistics rollups...")
+
+        cur.execute("""insert into StatsMonth (Year, Month, Signons, Boots, Drops, IdleBoots, IdleMods, MaxLogins, MaxGroups, MaxIdleTime)
+                         select Year, Month, sum(Signons), sum(Boots), sum(Drops), sum(IdleBoots), sum(IdleMods), max(MaxLogins),
+                         max(MaxGroups), max(coalesce(MaxIdleTime, 0.0))
+                         from Stats group by Year, Month""")
+
+        cur.execute("""update StatsMonth
+                         set MaxIdleNick=(select MaxIdleNick from Stats
+                                            where Stats.Year=StatsMonth.Year and Stats.Month=StatsMonth.Month
+                                            order by MaxIdleTime desc limit 1)""")
+
+        cur.execute("""insert into StatsYear (Year, Signons, Boots, Drops, IdleBoots, IdleMods, MaxLogins, MaxGroups, MaxIdleTime)
+                         select Year, sum(Signons), sum(Boots), sum(Drops), sum(IdleBoots), sum(IdleMods), max(MaxLogins),
+                         max(MaxGroups), max(coalesce(MaxIdleTime, 0.0))
+                         from Stats group by Year""")
+
+        cur.execute("""update StatsYear
+                         set MaxIdleNick=(select MaxIdleNick from Stats
+                                            where Stats.Year=StatsYear.Year
+                                            order by MaxIdleTime desc limit 1)""")
+
+        cur.execute("""insert into StatsTotal (Signons, Boots, Drops, IdleBoots, IdleMods, MaxLogins, MaxGroups, MaxIdleTime, MaxIdleNick)
+                         select coalesce(sum(Signons), 0), coalesce(sum(Boots), 0), coalesce(sum(Drops), 0),
+                         coalesce(sum(IdleBoots), 0), coalesce(sum(IdleMods), 0), coalesce(max(MaxLogins), 0),
+                         coalesce(max(MaxGroups), 0), coalesce(max(MaxIdleTime), 0.0),
+                         (select MaxIdleNick from Stats order by MaxIdleTime desc limit 1)
+                         from Stats""")
+
+        cur.execute("update Version set Revision=5")
+
+    def __revision_6__(self, scope):
+        self.log.info("Upgrading database to revision 6...")
+
+        cur = scope.get_handle()
+
+        cur.execute("""alter table Mail
+                         add column Lease char(32)""")
+
+        cur.execute("""alter table Mail
+                         add column LeaseExpiry int not null default 0""")
+
+        cur.execute("drop index MailSent")
+
+        cur.execute("create index MailQueue on Mail (MTAErrors asc, Timestamp asc) where Sent=0")
+        cur.execute("create index MailLease on Mail (Lease asc) where Lease is not null")
+
+        cur.execute("update Version set Revision=6")
@@ -38,6 +38,18 @@ class Stats:
     max_groups: int = 0
     max_idle: Tuple[str, float] = None
 
+def accumulate(stats, delta):
+    stats.signons += delta.signons
+    stats.boots += delta.boots
+    stats.drops += delta.drops
+    stats.idleboots += delta.idleboots
+    stats.idlemods += delta.idlemods
+    stats.max_logins = max(stats.max_logins, delta.max_logins)
+    stats.max_groups = max(stats.max_groups, delta.max_groups)
+
+    if delta.max_idle and (not stats.max_idle or delta.max_idle[0] > stats.max_idle[0]):
+        stats.max_idle = delta.max_idle
+
 Connection = NewType("Connection", database.Connection)
 
 class StatsDb:
@@ -68,6 +80,12 @@ class StatsDb:
     def set_max_idle(self, scope, idle_time, idle_nick):
         raise NotImplementedError
 
+    def merge(self, scope, date, stats):
+        raise NotImplementedError
+
+    def flush(self, scope):
+        raise NotImplementedError
+
     def start(self, scope):
         raise NotImplementedError
 
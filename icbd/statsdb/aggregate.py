@@ -0,0 +1,111 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import threading
+import dataclasses
+import statsdb
+import dateutils
+
+class StatsDb(statsdb.StatsDb):
+    def __init__(self, db):
+        self.__db = db
+        self.__lock = threading.Lock()
+        self.__running = statsdb.Stats()
+        self.__pending = {}
+
+    def setup(self, scope):
+        self.__db.setup(scope)
+
+    def add_signon(self, scope):
+        self.__aggregate__(statsdb.Stats(signons=1))
+
+    def add_boot(self, scope):
+        self.__aggregate__(statsdb.Stats(boots=1))
+
+    def add_drop(self, scope):
+        self.__aggregate__(statsdb.Stats(drops=1))
+
+    def add_idleboot(self, scope):
+        self.__aggregate__(statsdb.Stats(idleboots=1))
+
+    def add_idlemod(self, scope):
+        self.__aggregate__(statsdb.Stats(idlemods=1))
+
+    def set_max_logins(self, scope, max_logins):
+        self.__aggregate__(statsdb.Stats(max_logins=max_logins))
+
+    def set_max_groups(self, scope, max_groups):
+        self.__aggregate__(statsdb.Stats(max_groups=max_groups))
+
+    def set_max_idle(self, scope, idle_time, idle_nick):
+        self.__aggregate__(statsdb.Stats(max_idle=(idle_time, idle_nick)))
+
+    def __aggregate__(self, delta):
+        today = dateutils.now().date()
+
+        with self.__lock:
+            statsdb.accumulate(self.__running, delta)
+            statsdb.accumulate(self.__pending.setdefault(today, statsdb.Stats()), delta)
+
+    def merge(self, scope, date, stats):
+        with self.__lock:
+            statsdb.accumulate(self.__pending.setdefault(date, statsdb.Stats()), stats)
+
+    def flush(self, scope):
+        with self.__lock:
+            for date, stats in sorted(self.__pending.items()):
+                self.__db.merge(scope, date, stats)
+
+            self.__pending.clear()
+
+    def start(self, scope):
+        with self.__lock:
+            return dataclasses.replace(self.__running)
+
+    def today(self, scope):
+        now = dateutils.now()
+
+        return self.__merge_pending__(self.__db.today(scope), lambda date: date == now.date())
+
+    def month(self, scope):
+        now = dateutils.now()
+
+        return self.__merge_pending__(self.__db.month(scope), lambda date: date.year == now.year and date.month == now.month)
+
+    def year(self, scope):
+        now = dateutils.now()
+
+        return self.__merge_pending__(self.__db.year(scope), lambda date: date.year == now.year)
+
+    def all(self, scope):
+        return self.__merge_pending__(self.__db.all(scope), lambda date: True)
+
+    def __merge_pending__(self, stats, predicate):
+        with self.__lock:
+            for date, pending in self.__pending.items():
+                if predicate(date):
+                    statsdb.accumulate(stats, pending)
+
+        return stats
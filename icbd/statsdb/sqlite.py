@@ -23,138 +23,120 @@
     ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
     OTHER DEALINGS IN THE SOFTWARE.
 """
-from datetime import datetime
 import statsdb
 from sqlite_schema import Schema
 import dateutils
 
+def build_merge_statements(table, keys):
+    insert = None
+
+    if keys:
+        insert = "insert or ignore into %s (%s) values (%s)" % (table, ", ".join(keys), ", ".join("?" * len(keys)))
+
+    update = """update %s
+                  set Signons=Signons + ?,
+                  Boots=Boots + ?,
+                  Drops=Drops + ?,
+                  IdleBoots=IdleBoots + ?,
+                  IdleMods=IdleMods + ?,
+                  MaxLogins=max(MaxLogins, ?),
+                  MaxGroups=max(MaxGroups, ?),
+                  MaxIdleNick=case when ? > coalesce(MaxIdleTime, 0.0) then ? else MaxIdleNick end,
+                  MaxIdleTime=max(coalesce(MaxIdleTime, 0.0), ?)""" % table
+
+    if keys:
+        update += " where %s" % " and ".join("%s=?" % k for k in keys)
+
+    return keys, insert, update
+
+MERGE_STATEMENTS = [build_merge_statements("Stats", ("Year", "Month", "Day")),
+                    build_merge_statements("StatsMonth", ("Year", "Month")),
+                    build_merge_statements("StatsYear", ("Year",)),
+                    build_merge_statements("StatsTotal", ())]
+
 class StatsDb(statsdb.StatsDb):
     def __init__(self):
         self.__running = statsdb.Stats()
-        self.__stats = None
-        self.__date = None
 
     def setup(self, scope):
         Schema().upgrade(scope)
 
     def add_signon(self, scope):
-        self.__running.signons += 1
-        self.__get_today__(scope).signons += 1
-        self.__update_today__(scope)
+        self.__update__(scope, statsdb.Stats(signons=1))
 
     def add_boot(self, scope):
-        self.__running.boots += 1
-        self.__get_today__(scope).boots += 1
-        self.__update_today__(scope)
+        self.__update__(scope, statsdb.Stats(boots=1))
 
     def add_drop(self, scope):
-        self.__running.drops += 1
-        self.__get_today__(scope).drops += 1
-        self.__update_today__(scope)
+        self.__update__(scope, statsdb.Stats(drops=1))
 
     def add_idleboot(self, scope):
-        self.__running.idleboots += 1
-        self.__get_today__(scope).idleboots += 1
-        self.__update_today__(scope)
+        self.__update__(scope, statsdb.Stats(idleboots=1))
 
     def add_idlemod(self, scope):
-        self.__running.idlemods += 1
-        self.__get_today__(scope).idlemods += 1
-        self.__update_today__(scope)
+        self.__update__(scope, statsdb.Stats(idlemods=1))
 
     def set_max_logins(self, scope, max_logins):
-        self.__set_max_logins__(self.__running, max_logins)
-        self.__set_max_logins__(self.__get_today__(scope), max_logins)
-        self.__update_today__(scope)
-
-    @staticmethod
-    def __set_max_logins__(stats, max_logins):
-        stats.max_logins = max(stats.max_logins, max_logins)
+        self.__update__(scope, statsdb.Stats(max_logins=max_logins))
 
     def set_max_groups(self, scope, max_groups):
-        self.__set_max_groups__(self.__running, max_groups)
-        self.__set_max_groups__(self.__get_today__(scope), max_groups)
-        self.__update_today__(scope)
-
-    @staticmethod
-    def __set_max_groups__(stats, max_groups):
-        stats.max_groups = max(stats.max_groups, max_groups)
+        self.__update__(scope, statsdb.Stats(max_groups=max_groups))
 
     def set_max_idle(self, scope, idle_time, idle_nick):
-        self.__set_max_idle__(self.__running, idle_time, idle_nick)
-        self.__set_max_idle__(self.__get_today__(scope), idle_time, idle_nick)
-        self.__update_today__(scope)
-
-    @staticmethod
-    def __set_max_idle__(stats, idle_time, idle_nick):
-        max_idle = stats.max_idle[0] if stats.max_idle else 0.0
+        self.__update__(scope, statsdb.Stats(max_idle=(idle_time, idle_nick)))
 
-        if idle_time > max_idle:
-            stats.max_idle = (idle_time, idle_nick)
+    def __update__(self, scope, delta):
+        statsdb.accumulate(self.__running, delta)
 
-    def __get_today__(self, scope):
-        now = dateutils.now()
-
-        if not self.__date or (self.__date.year != now.year or self.__date.month != now.month or self.__date.day != now.day):
-            self.__date = now
-            self.__stats = None
+        self.merge(scope, dateutils.now(), delta)
 
-        if not self.__stats:
-            cur = scope.get_handle()
+    def merge(self, scope, date, stats):
+        cur = scope.get_handle()
 
-            cur.execute("select * from Stats where Year=? and Month=? and Day=?", (self.__date.year, self.__date.month, self.__date.day))
+        max_idle_time, max_idle_nick = stats.max_idle if stats.max_idle else (0.0, None)
 
-            row = cur.fetchone()
+        values = (stats.signons,
+                  stats.boots,
+                  stats.drops,
+                  stats.idleboots,
+                  stats.idlemods,
+                  stats.max_logins,
+                  stats.max_groups,
+                  max_idle_time,
+                  max_idle_nick,
+                  max_idle_time)
 
-            if row:
-                self.__stats = self.__create_stats__(row)
-            else:
-                cur.execute("insert into Stats (Year, Month, Day) values (?, ?, ?) ",
-                            (self.__date.year, self.__date.month, self.__date.day))
+        date_keys = {"Year": date.year, "Month": date.month, "Day": date.day}
 
-                self.__stats = statsdb.Stats()
+        for keys, insert, update in MERGE_STATEMENTS:
+            key = tuple(date_keys[k] for k in keys)
 
-        return self.__stats
+            if insert:
+                cur.execute(insert, key)
 
-    def __update_today__(self, scope):
-        cur = scope.get_handle()
+            cur.execute(update, values + key)
 
-        cur.execute("""update Stats
-                         set Signons=?,
-                         Boots=?,
-                         Drops=?,
-                         IdleBoots=?,
-                         IdleMods=?,
-                         MaxLogins=?,
-                         MaxGroups=?,
-                         MaxIdleTime=?,
-                         MaxIdleNick=?
-                         where Year=? and Month=? and Day=?""",
-                    (self.__stats.signons,
-                     self.__stats.boots,
-                     self.__stats.drops,
-                     self.__stats.idleboots,
-                     self.__stats.idlemods,
-                     self.__stats.max_logins,
-                     self.__stats.max_groups,
-                     self.__stats.max_idle[0] if self.__stats.max_idle else None,
-                     self.__stats.max_idle[1] if self.__stats.max_idle else None,
-                     self.__date.year,
-                     self.__date.month,
-                     self.__date.day))
+    def flush(self, scope):
+        pass
 
     def start(self, scope):
         return self.__running
 
     def today(self, scope):
-        return self.__get_today__(scope)
+        now = dateutils.now()
+
+        cur = scope.get_handle()
+
+        cur.execute("select * from Stats where Year=? and Month=? and Day=?", (now.year, now.month, now.day))
+
+        return self.__create_stats__(cur.fetchone())
 
     def month(self, scope):
         now = dateutils.now()
 
         cur = scope.get_handle()
 
-        cur.execute(self.__build_accumulate_query__("where Year=%d and Month=%d" % (now.year, now.month)))
+        cur.execute("select * from StatsMonth where Year=? and Month=?", (now.year, now.month))
 
         return self.__create_stats__(cur.fetchone())
 
@@ -163,42 +145,29 @@ class StatsDb(statsdb.StatsDb):
 
         cur = scope.get_handle()
 
-        cur.execute(self.__build_accumulate_query__("where Year=%d" % now.year))
+        cur.execute("select * from StatsYear where Year=?", (now.year,))
 
         return self.__create_stats__(cur.fetchone())
 
     def all(self, scope):
         cur = scope.get_handle()
 
-        cur.execute(self.__build_accumulate_query__())
+        cur.execute("select * from StatsTotal")
 
         return self.__create_stats__(cur.fetchone())
 
-    @staticmethod
-    def __build_accumulate_query__(where_clause=""):
-        return """select sum(Signons) as Signons,
-                         sum(Boots) as Boots,
-                         sum(Drops) as Drops,
-                         sum(IdleBoots) as IdleBoots,
-                         sum(IdleMods) as IdleMods,
-                         max(MaxLogins) as MaxLogins,
-                         max(MaxGroups) as MaxGroups,
-                         max(MaxIdleTime) as MaxIdleTime,
-                         (select (MaxIdleNick) from Stats %s order by MaxIdleTime desc limit 1) as MaxIdleNick
-                         from Stats %s""" % (where_clause, where_clause)
-
     @staticmethod
     def __create_stats__(row):
         record = statsdb.Stats()
 
         if row:
-            record.signons = row["Signons"]
-            record.boots = row["Boots"]
-            record.drops = row["Drops"]
-            record.idleboots = row["IdleBoots"]
-            record.idlemods = row["IdleMods"]
-            record.max_logins = row["MaxLogins"]
-            record.max_groups = row["MaxGroups"]
+            record.signons = row["Signons"] or 0
+            record.boots = row["Boots"] or 0
+            record.drops = row["Drops"] or 0
+            record.idleboots = row["IdleBoots"] or 0
+            record.idlemods = row["IdleMods"] or 0
+            record.max_logins = row["MaxLogins"] or 0
+            record.max_groups = row["MaxGroups"] or 0
 
             if row["MaxIdleTime"] or row["MaxIdleNick"]:
                 record.max_idle = (row["MaxIdleTime"], row["MaxIdleNick"])
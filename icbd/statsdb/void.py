@@ -0,0 +1,75 @@
+"""
+    project............: Fuchsschwanz
+    description........: ICB server
+    date...............: 05/2019
+    copyright..........: Sebastian Fedrau
+
+    Permission is hereby granted, free of charge, to any person obtaining
+    a copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+    OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+    ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+import statsdb
+
+class StatsDb(statsdb.StatsDb):
+    def setup(self, scope):
+        pass
+
+    def add_signon(self, scope):
+        pass
+
+    def add_boot(self, scope):
+        pass
+
+    def add_drop(self, scope):
+        pass
+
+    def add_idleboot(self, scope):
+        pass
+
+    def add_idlemod(self, scope):
+        pass
+
+    def set_max_logins(self, scope, max_logins):
+        pass
+
+    def set_max_groups(self, scope, max_groups):
+        pass
+
+    def set_max_idle(self, scope, idle_time, idle_nick):
+        pass
+
+    def merge(self, scope, date, stats):
+        pass
+
+    def flush(self, scope):
+        pass
+
+    def start(self, scope):
+        return statsdb.Stats()
+
+    def today(self, scope):
+        return statsdb.Stats()
+
+    def month(self, scope):
+        return statsdb.Stats()
+
+    def year(self, scope):
+        return statsdb.Stats()
+
+    def all(self, scope):
+        return statsdb.Stats()
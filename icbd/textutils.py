@@ -39,16 +39,14 @@ def tolower(argname=None, argnames=None):
     def decorator(fn):
         spec = inspect.getfullargspec(fn)
 
-        def wrapper(*args):
-            vals = []
-
-            for i in range(len(args)):
-                val = args[i]
+        indices = [i for i, arg in enumerate(spec.args) if (argname and arg == argname) or (argnames and arg in argnames)]
 
-                if (argname and spec.args[i] == argname) or (argnames and spec.args[i] in argnames):
-                    val = val.lower()
+        def wrapper(*args):
+            vals = list(args)
 
-                vals.append(val)
+            for i in indices:
+                if i < len(vals):
+                    vals[i] = vals[i].lower()
 
             return fn(*vals)
 
@@ -24,12 +24,15 @@
     OTHER DEALINGS IN THE SOFTWARE.
 """
 from timeit import default_timer as timer
+import heapq
 import dateutils
 
 class Timer:
-    def __init__(self):
+    def __init__(self, elapsed=0.0):
         self.restart()
 
+        self.__timer -= elapsed
+
     def restart(self):
         self.__timer = timer()
 
@@ -42,47 +45,158 @@ class Timer:
 class TimeoutTable:
     def __init__(self):
         self.__m = {}
+        self.__sources = {}
+        self.__heap = []
+        self.__size = 0
 
     def is_alive(self, target, source):
-        alive = False
+        deadline = self.__m.get(target, {}).get(source)
 
-        sources = self.__m.get(target, {})
+        alive = deadline is not None and timer() < deadline
 
-        t = sources.get(source, None)
+        if deadline is not None and not alive:
+            self.__remove__(target, source)
 
-        if t:
-            timer, timeout = t
+        return alive
 
-            alive = timer.elapsed() < timeout
+    def set_alive(self, target, source, timeout_seconds):
+        deadline = timer() + timeout_seconds
 
-            if not alive:
-                del sources[source]
+        sources = self.__m.setdefault(target, {})
 
-                if not sources:
-                    del self.__m[target]
+        if source not in sources:
+            self.__sources.setdefault(source, set()).add(target)
 
-        return alive
+            self.__size += 1
 
-    def set_alive(self, target, source, timeout_seconds):
-        m = self.__m.get(target, {})
+        sources[source] = deadline
 
-        m[source] = (Timer(), timeout_seconds)
+        heapq.heappush(self.__heap, (deadline, target, source))
 
-        self.__m[target] = m
+        if len(self.__heap) > 2 * self.__size + 64:
+            self.__compact__()
 
     def remove_target(self, target):
-        if target in self.__m:
-            del self.__m[target]
+        for source in self.__m.pop(target, {}):
+            self.__unlink__(source, target)
+
+            self.__size -= 1
 
     def remove_source(self, source):
-        for sources in self.__m.values():
-            if source in sources:
-                del sources[source]
+        for target in self.__sources.pop(source, set()):
+            sources = self.__m[target]
+
+            del sources[source]
+
+            if not sources:
+                del self.__m[target]
 
-        self.__m = dict(kv for kv in self.__m.items() if len(kv) > 0)
+            self.__size -= 1
 
     def remove_entry(self, target, source):
-        try:
-            del self.__m[target][source]
-        except KeyError:
-            pass
+        self.__remove__(target, source)
+
+    def expire(self):
+        now = timer()
+        count = 0
+
+        while self.__heap and self.__heap[0][0] <= now:
+            deadline, target, source = heapq.heappop(self.__heap)
+
+            if self.__m.get(target, {}).get(source) == deadline:
+                self.__remove__(target, source)
+
+                count += 1
+
+        return count
+
+    def __remove__(self, target, source):
+        sources = self.__m.get(target)
+
+        if sources and source in sources:
+            del sources[source]
+
+            if not sources:
+                del self.__m[target]
+
+            self.__unlink__(source, target)
+
+            self.__size -= 1
+
+    def __unlink__(self, source, target):
+        targets = self.__sources[source]
+
+        targets.discard(target)
+
+        if not targets:
+            del self.__sources[source]
+
+    def __compact__(self):
+        self.__heap = [(deadline, target, source)
+                       for target, sources in self.__m.items()
+                       for source, deadline in sources.items()]
+
+        heapq.heapify(self.__heap)
+
+    def __len__(self):
+        return self.__size
+
+class Scheduler:
+    def __init__(self):
+        self.__heap = []
+        self.__deadlines = {}
+
+    def schedule(self, key, delay):
+        deadline = timer() + max(delay, 0.0)
+
+        self.__deadlines[key] = deadline
+
+        heapq.heappush(self.__heap, (deadline, key))
+
+        if len(self.__heap) > 2 * len(self.__deadlines) + 64:
+            self.__compact__()
+
+    def cancel(self, key):
+        self.__deadlines.pop(key, None)
+
+    def next_deadline(self):
+        self.__discard_stale__()
+
+        return self.__heap[0][0] - timer() if self.__heap else None
+
+    def expired(self):
+        now = timer()
+        keys = []
+
+        self.__discard_stale__()
+
+        while self.__heap and self.__heap[0][0] <= now:
+            _, key = heapq.heappop(self.__heap)
+
+            del self.__deadlines[key]
+
+            keys.append(key)
+
+            self.__discard_stale__()
+
+        return keys
+
+    def __discard_stale__(self):
+        while self.__heap:
+            deadline, key = self.__heap[0]
+
+            if self.__deadlines.get(key) == deadline:
+                break
+
+            heapq.heappop(self.__heap)
+
+    def __compact__(self):
+        self.__heap = [(deadline, key) for key, deadline in self.__deadlines.items()]
+
+        heapq.heapify(self.__heap)
+
+    def __len__(self):
+        return len(self.__deadlines)
+
+    def __contains__(self, key):
+        return key in self.__deadlines
@@ -27,71 +27,33 @@ import logging
 import core
 import di
 import ltd
-import textutils
+
+ALIASES = {"?": "help", "shush": "hush"}
 
 class Transform(di.Injected):
     def inject(self, log: logging.Logger):
         self.log = log
 
-    def transform(self, type_id, payload):
-        type_id, payload = self.__private_message_to_command__(type_id, payload)
-        type_id, payload = self.__questionmark_to_help__(type_id, payload)
-        type_id, payload = self.__shush_to_hush__(type_id, payload)
-
-        return type_id, payload
-
-    def __private_message_to_command__(self, type_id, payload):
-        if type_id == "h":
-            fields = [textutils.decode(f).strip() for f in ltd.split(payload)]
-
-            if len(fields) >= 2 and fields[0] == "m":
-                args = [arg.rstrip(" \0") for arg in fields[1].split(" ", 2)]
-
-                if len(args) >= 2 and args[0] == core.NICKSERV:
-                    type_id = "h"
-
-                    payload = bytearray()
-
-                    payload.extend(args[1].encode())
-                    payload.append(1)
-
-                    if len(args) == 3:
-                        payload.extend(args[2].encode())
-
-                    payload.append(0)
-
-                    self.log.debug("Message transformed: type='%s', command='%s'", type_id, args[1])
-
-        return type_id, payload
-
-    def __questionmark_to_help__(self, type_id, payload):
-        if type_id == "h":
-            fields = [textutils.decode(f).strip() for f in ltd.split(payload)]
-
-            if len(fields) >= 2 and fields[0] == "?":
-                payload = bytearray()
-
-                payload.extend("help\1".encode())
-
-                for field in fields[1:]:
-                    payload.extend(field.encode())
+    def transform(self, message):
+        if message.type_id == "h" and len(message) >= 2:
+            if message.text[0] == "m":
+                message = self.__private_message_to_command__(message)
 
-                self.log.debug("Message transformed: type='h', command='help'")
+            alias = ALIASES.get(message.text[0])
 
-        return type_id, payload
+            if alias:
+                message = ltd.Message.from_text("h", [alias] + message.text[1:])
 
-    def __shush_to_hush__(self, type_id, payload):
-        if type_id == "h":
-            fields = [textutils.decode(f).strip() for f in ltd.split(payload)]
+                self.log.debug("Message transformed: type='h', command='%s'", alias)
 
-            if len(fields) >= 2 and fields[0] == "shush":
-                payload = bytearray()
+        return message
 
-                payload.extend("hush\1".encode())
+    def __private_message_to_command__(self, message):
+        args = [arg.rstrip(" \0") for arg in message.text[1].split(" ", 2)]
 
-                for field in fields[1:]:
-                    payload.extend(field.encode())
+        if len(args) >= 2 and args[0] == core.NICKSERV:
+            message = ltd.Message.from_text("h", [args[1], args[2] if len(args) == 3 else ""])
 
-                self.log.debug("Message transformed: type='h', command='hush'")
+            self.log.debug("Message transformed: type='h', command='%s'", args[1])
 
-        return type_id, payload
+        return message